@@ -0,0 +1,198 @@
+"""
+How many 30 fps cameras can this machine keep up with?
+
+Run from the repo root:
+    python -m benchmarks.bench_cameras [--max-cameras 8] [--workers 4]
+        [--mode threads|processes] [--seconds 10] [--size 1280x720] [--json]
+
+For N = 1, 2, ... cameras, each fed synthetic arena JPEGs at --fps, runs the
+real per-camera arena_processing_loop from core/main.py for --seconds and
+measures the frames each camera actually processed.
+
+  threads     all cameras in one process, sharing a "vision" pool of
+              --workers threads (the in-process multi-camera setup)
+  processes   one process per camera, as with system.vision_worker
+
+A count of cameras is sustained when every camera processes at least
+--sustain (default 95%) of --fps. The ramp stops at the first N that is not.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.synthetic_arena import ArenaScene, SceneConfig
+
+
+class _LoopingCam:
+    """latest_frame advances through pre-rendered JPEGs at a fixed rate, like a live camera."""
+
+    def __init__(self, frames: List[bytes], fps: float, offset: int = 0):
+        self._frames = frames
+        self._fps = float(fps)
+        self._offset = offset
+        self._t0 = time.perf_counter()
+
+    @property
+    def latest_frame(self) -> bytes:
+        i = int((time.perf_counter() - self._t0) * self._fps) + self._offset
+        return self._frames[i % len(self._frames)]
+
+
+def _render_frames(size: Tuple[int, int], count: int, seed: int) -> List[bytes]:
+    scene = ArenaScene(SceneConfig(frame_width=size[0], frame_height=size[1]), seed=seed)
+    frames = []
+    for _ in range(count):
+        scene.randomize_robots()
+        frames.append(scene.render_jpeg())
+    return frames
+
+
+async def _run_cameras(names: List[str], frames: List[bytes], fps: float, seconds: float, workers: int) -> Dict[str, Any]:
+    """Runs one arena_processing_loop per camera name; returns per-camera fps and loop latency."""
+    from core.main import _arena_config, arena_processing_loop
+    from utils import executors
+    from utils.logging import get_logger
+    from utils.metrics import REGISTRY
+    from vision.arena import ArenaProcessor
+
+    executors.configure({"vision": workers})
+    stop = asyncio.Event()
+    logger = get_logger("bench")
+    tasks = [
+        asyncio.create_task(
+            arena_processing_loop(
+                stop,
+                logger,
+                _LoopingCam(frames, fps, offset=i * 7),
+                ArenaProcessor(_arena_config({}), camera=name),
+                fps,
+                camera=name,
+            )
+        )
+        for i, name in enumerate(names)
+    ]
+    await asyncio.sleep(seconds)
+    stop.set()
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    executors.shutdown()
+
+    out = {}
+    for name in names:
+        loop_hist = REGISTRY.histogram("vision_loop_seconds", camera=name)
+        overruns = REGISTRY.counter("vision_loop_overruns_total", camera=name)
+        out[name] = {
+            "fps": loop_hist.count / seconds,
+            "loop_p50_ms": loop_hist.quantile(0.50) * 1000.0,
+            "loop_p95_ms": loop_hist.quantile(0.95) * 1000.0,
+            "overruns": overruns.value,
+        }
+    return out
+
+
+def _camera_process(name: str, frames: List[bytes], fps: float, seconds: float, start_at: float, queue) -> None:
+    # Every camera process starts its clock together, after the spawns
+    time.sleep(max(0.0, start_at - time.time()))
+    queue.put(asyncio.run(_run_cameras([name], frames, fps, seconds, workers=1)))
+
+
+def _run_processes(names: List[str], frames: List[bytes], fps: float, seconds: float) -> Dict[str, Any]:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    start_at = time.time() + 2.0 + 0.5 * len(names)
+    procs = [
+        ctx.Process(target=_camera_process, args=(name, frames, fps, seconds, start_at, queue)) for name in names
+    ]
+    for p in procs:
+        p.start()
+    out: Dict[str, Any] = {}
+    for _ in procs:
+        out.update(queue.get(timeout=start_at - time.time() + seconds + 60.0))
+    for p in procs:
+        p.join()
+    return out
+
+
+def run(args) -> Dict[str, Any]:
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    frames = _render_frames(size, args.frames, seed=1)
+    target = args.fps * args.sustain
+
+    steps = []
+    sustained = 0
+    for n in range(1, args.max_cameras + 1):
+        names = [f"n{n}-cam{i}" for i in range(n)]
+        if args.mode == "processes":
+            per_cam = _run_processes(names, frames, args.fps, args.seconds)
+        else:
+            per_cam = asyncio.run(_run_cameras(names, frames, args.fps, args.seconds, args.workers))
+        fps = [r["fps"] for r in per_cam.values()]
+        ok = min(fps) >= target
+        steps.append(
+            {
+                "cameras": n,
+                "min_fps": min(fps),
+                "mean_fps": sum(fps) / len(fps),
+                "total_fps": sum(fps),
+                "loop_p95_ms": max(r["loop_p95_ms"] for r in per_cam.values()),
+                "sustained": ok,
+            }
+        )
+        if not ok:
+            break
+        sustained = n
+
+    return {
+        "mode": args.mode,
+        "workers": args.workers if args.mode == "threads" else None,
+        "cpu_count": os.cpu_count(),
+        "frame_size": list(size),
+        "target_fps": args.fps,
+        "sustained_cameras": sustained,
+        "steps": steps,
+    }
+
+
+def _print_table(results: Dict[str, Any]) -> None:
+    workers = f", {results['workers']} vision threads" if results["workers"] else ""
+    print(
+        f"{results['mode']} on {results['cpu_count']} cores{workers}, "
+        f"{results['frame_size'][0]}x{results['frame_size'][1]} at {results['target_fps']:.0f} fps"
+    )
+    print(f"{'cameras':>8}{'min fps':>10}{'mean fps':>10}{'total fps':>11}{'loop p95':>12}  sustained")
+    for s in results["steps"]:
+        print(
+            f"{s['cameras']:>8}{s['min_fps']:>10.1f}{s['mean_fps']:>10.1f}{s['total_fps']:>11.1f}"
+            f"{s['loop_p95_ms']:>10.1f}ms"
+            f"  {'yes' if s['sustained'] else 'no'}"
+        )
+    print(f"sustained: {results['sustained_cameras']} camera(s)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--max-cameras", type=int, default=8)
+    ap.add_argument("--mode", default="threads", choices=("threads", "processes"))
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="vision threads (threads mode)")
+    ap.add_argument("--seconds", type=float, default=10.0, help="run time per camera count")
+    ap.add_argument("--fps", type=float, default=30.0, help="camera frame rate")
+    ap.add_argument("--sustain", type=float, default=0.95, help="fraction of --fps every camera must reach")
+    ap.add_argument("--size", default="1280x720", help="camera frame size")
+    ap.add_argument("--frames", type=int, default=30, help="distinct synthetic frames per camera")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Decode throughput of the ArenaCamRtpH264 pipeline per GstDecodeConfig setting,
+fed by the synthetic RTP/H.264 generator on localhost.
+
+Run from the repo root (needs gst-launch-1.0 with x264enc and an H.264 decoder):
+    python -m benchmarks.bench_decode [--decoders all] [--threads 0,1]
+        [--queues on,off] [--scale native,640x360] [--size 1280x720] [--fps 60]
+        [--seconds 8] [--print-pipelines] [--json]
+
+Every combination of the comma-separated settings is run in turn against the
+same generated stream. Per setting it reports the JPEG frames published per
+second, frames lost against frames sent, capture-to-latest_frame latency,
+and the CPU time the gst-launch process spent per published frame. That
+CPU time sets the decode ceiling: 1000 / cpu_ms_per_frame fps per core.
+Send with --fps above what the pipeline can keep up with to see where each
+setting saturates.
+
+--decoders all runs every installed decoder in
+communications.gst_pipeline.CPU_DECODERS; "auto" is the one the camera
+would pick. --print-pipelines only prints the gst-launch commands.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+from dataclasses import replace
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.bench_ingest import _analyze
+from benchmarks.rtp_generator import RtpH264Generator, add_generator_args, generator_config
+from communications.arenacam import ArenaCamConfig, ArenaCamRtpH264
+from communications.gst_pipeline import CPU_DECODERS, GstDecodeConfig, build_decode_cmd, has_element, select_decoder
+
+
+def _process_cpu_s(pid: int) -> float:
+    """utime + stime of pid, in seconds (0 if it already exited)."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+def _settings(args) -> List[Tuple[str, GstDecodeConfig]]:
+    if args.decoders == "all":
+        decoders = [d for d in CPU_DECODERS if has_element(d)] or [CPU_DECODERS[0]]
+    else:
+        decoders = [d.strip() for d in args.decoders.split(",") if d.strip()]
+
+    out = []
+    for decoder, threads, queues, scale in itertools.product(
+        decoders,
+        [int(t) for t in args.threads.split(",")],
+        [q.strip() == "on" for q in args.queues.split(",")],
+        [s.strip() for s in args.scale.split(",")],
+    ):
+        w, h = (0, 0) if scale == "native" else (int(v) for v in scale.lower().split("x"))
+        cfg = GstDecodeConfig(decoder=decoder, max_threads=threads, queues=queues, width=w, height=h)
+        name = f"{decoder} threads={threads or 'auto'} queues={'on' if queues else 'off'} {scale}"
+        out.append((name, cfg))
+    return out
+
+
+async def _run_setting(args, dec_cfg: GstDecodeConfig) -> Dict[str, Any]:
+    gen_cfg = generator_config(args)
+    cam = ArenaCamRtpH264(
+        ArenaCamConfig(mode="rtp_h264", bind_port=gen_cfg.port, rtp_payload=gen_cfg.rtp_payload, decode=dec_cfg)
+    )
+
+    arrivals: List[Tuple[float, bytes]] = []
+    publish = cam._publish
+
+    def recording_publish(jpeg: bytes, ts: Optional[float] = None) -> None:
+        arrivals.append((time.time(), jpeg))
+        publish(jpeg, ts)
+
+    cam._publish = recording_publish  # type: ignore[method-assign]
+
+    await cam.start()
+    assert cam._proc is not None
+    pid = cam._proc.pid
+    # Let udpsrc bind before the first packet (and IDR frame) is sent
+    await asyncio.sleep(1.0)
+
+    gen = RtpH264Generator(gen_cfg)
+    cpu_before = _process_cpu_s(pid)
+    gen.start()
+    started = time.perf_counter()
+    await asyncio.sleep(args.seconds)
+    gen.stop()
+    # Frames still in flight when the generator stops
+    await asyncio.sleep(1.0)
+    elapsed = time.perf_counter() - started
+    cpu_s = _process_cpu_s(pid) - cpu_before
+    await cam.stop()
+
+    result = await asyncio.to_thread(_analyze, arrivals, dict(gen.sent_at), gen.frames_sent, elapsed)
+    published = max(1.0, result["frames_published"])
+    result["cpu_ms_per_frame"] = cpu_s * 1000.0 / published
+    result["cpu_percent"] = 100.0 * cpu_s / elapsed if elapsed > 0 else 0.0
+    result["fps_per_core"] = 1000.0 / result["cpu_ms_per_frame"] if result["cpu_ms_per_frame"] > 0 else 0.0
+    return result
+
+
+async def run(args) -> Dict[str, Any]:
+    results = []
+    for name, dec_cfg in _settings(args):
+        decoder = await asyncio.to_thread(select_decoder, dec_cfg)
+        r = await _run_setting(args, replace(dec_cfg, decoder=decoder))
+        r["setting"] = name
+        r["decoder"] = decoder
+        results.append(r)
+    return {"size": args.size, "fps_sent": args.fps, "seconds": args.seconds, "settings": results}
+
+
+def _print_table(results: Dict[str, Any]) -> None:
+    print(f"{results['size']} sent at {results['fps_sent']:.0f} fps for {results['seconds']:.0f} s")
+    print(f"{'setting':<48}{'fps':>7}{'lost':>7}{'p50':>9}{'p95':>9}{'cpu/frame':>11}{'fps/core':>10}")
+    for r in results["settings"]:
+        p50 = f"{r['latency_p50_ms']:.0f}ms" if "latency_p50_ms" in r else "-"
+        p95 = f"{r['latency_p95_ms']:.0f}ms" if "latency_p95_ms" in r else "-"
+        print(
+            f"{r['setting']:<48}{r['fps_published']:>7.1f}{r['frames_dropped']:>7.0f}{p50:>9}{p95:>9}"
+            f"{r['cpu_ms_per_frame']:>9.1f}ms{r['fps_per_core']:>10.0f}"
+        )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_generator_args(ap)
+    ap.set_defaults(port=5600, fps=60.0)  # keep clear of a running vision system on 5000
+    ap.add_argument("--seconds", type=float, default=8.0, help="run time per setting")
+    ap.add_argument("--decoders", default="all", help="comma-separated decoder elements, 'auto' or 'all'")
+    ap.add_argument("--threads", default="0,1", help="comma-separated max_threads values (0 = one per core)")
+    ap.add_argument("--queues", default="on,off", help="comma-separated on/off")
+    ap.add_argument("--scale", default="native", help="comma-separated 'native' or WIDTHxHEIGHT")
+    ap.add_argument("--print-pipelines", action="store_true", help="print the gst-launch commands and exit")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    if args.print_pipelines:
+        for name, dec_cfg in _settings(args):
+            print(f"# {name}")
+            gen_cfg = generator_config(args)
+            print(" ".join(build_decode_cmd(dec_cfg, gen_cfg.port, gen_cfg.rtp_payload, select_decoder(dec_cfg))))
+        return
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,547 @@
+"""
+Load test for WifiServer: hundreds of simulated ESP robots on /ws.
+
+Run from the repo root:
+    python -m benchmarks.bench_esp_fleet [--clients 200] [--seconds 20]
+        [--mix aruco=5,print=2,ping=0.2,prediction=0.1]
+        [--mjpeg-viewers 10 [--mjpeg-stream crop] [--vision]] [--json]
+
+Each simulated ESP connects, sends begin, then behaves like the Arduino
+library: one request at a time, picking ops at random with the given
+per-client rates (per second), waiting for the reply to ping / aruco /
+prediction_request before the next op, and answering the server's own pings.
+
+By default a WifiServer is started in a separate process, wired to a fake
+pose source and a stub predictor (fixed per-batch cost, no torch model), so
+the test runs offline and server CPU / event-loop lag are measured on their
+own. --url points the fleet at an already running server instead.
+
+--mjpeg-viewers also serves the web page from the same event loop, fed by
+a synthetic 30 fps camera, with that many clients watching --mjpeg-stream
+and one UI WebSocket receiving the event broadcasts. Without --vision the
+arena transform never exists, so /crop serves the "waiting" overlay;
+--vision runs the real arena processing loop as well.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import multiprocessing as mp
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+REPLY_OPS = ("ping", "aruco", "prediction")
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0.0}
+    arr = np.asarray(samples)
+    return {
+        "count": float(arr.size),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "max_ms": float(arr.max()),
+    }
+
+
+class LoopLagSampler:
+    """Measures how late a periodic asyncio.sleep() wakes up: the event loop's scheduling lag."""
+
+    def __init__(self, interval_s: float = 0.05):
+        self.interval_s = interval_s
+        self.samples_ms: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval_s)
+            self.samples_ms.append(max(0.0, (time.perf_counter() - t0 - self.interval_s) * 1000.0))
+
+
+# -------------------- Server side --------------------
+
+
+class _StubPredictor:
+    """Stands in for Predictor: fixed cost per batch plus per request, always class 0."""
+
+    def __init__(self, batch_ms: float, item_ms: float):
+        self.batch_ms = batch_ms
+        self.item_ms = item_ms
+
+    def predict_batch(self, requests):
+        time.sleep((self.batch_ms + self.item_ms * len(requests)) / 1000.0)
+        return [0] * len(requests)
+
+    def invalidate(self, filename: str) -> None:
+        pass
+
+    def warm(self, filename: str) -> None:
+        pass
+
+    def diagnostics(self) -> Dict[str, Any]:
+        return {"runtime": "stub"}
+
+
+class _SyntheticCam:
+    """Stands in for an ArenaCam: cycles pre-rendered arena JPEGs at fps."""
+
+    def __init__(self, fps: float = 30.0, frames: int = 30):
+        from benchmarks.synthetic_arena import ArenaScene
+
+        scene = ArenaScene(seed=0)
+        self._jpegs = []
+        for _ in range(frames):
+            scene.randomize_robots()
+            self._jpegs.append(scene.render_jpeg())
+        self.fps = fps
+        self.latest_frame: Optional[bytes] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        i = 0
+        while True:
+            self.latest_frame = self._jpegs[i % len(self._jpegs)]
+            i += 1
+            await asyncio.sleep(1.0 / self.fps)
+
+
+async def _serve(port: int, args: Dict[str, Any], conn) -> None:
+    from aiohttp import web
+
+    from communications.wifi_server import WifiServer
+    from machinelearning.batcher import InferenceBatcher, InferenceConfig
+    from utils.logging import register_web_event_sink
+
+    # The UI broadcast serializes every event once; keep that cost in the measurement
+    register_web_event_sink(lambda evt: json.dumps(evt))
+
+    cam = None
+    web_runner = None
+    vision_task = None
+    vision_stop = asyncio.Event()
+    if args["web"]:
+        from core.main import arena_processing_loop
+        from frontend.webpage import create_app
+        from utils.logging import get_logger
+        from vision.arena import ArenaConfig, ArenaProcessor
+
+        cam = _SyntheticCam()
+        cam.start()
+        processor = ArenaProcessor(ArenaConfig())
+        # Registers the real UI broadcast sink in place of the one above
+        app = create_app(vision_stop, cam, processor)
+        web_runner = web.AppRunner(app, access_log=None)
+        await web_runner.setup()
+        await web.TCPSite(web_runner, "127.0.0.1", port + 1).start()
+        if args["vision"]:
+            vision_task = asyncio.create_task(
+                arena_processing_loop(vision_stop, get_logger("bench"), cam, processor, target_fps=30.0)
+            )
+
+    batcher = InferenceBatcher(_StubPredictor(args["predict_batch_ms"], args["predict_item_ms"]), InferenceConfig())
+    server = WifiServer(
+        host="127.0.0.1",
+        port=port,
+        get_marker_pose=lambda mid, arena: (1.0 + (mid % 7) * 0.3, 1.0, 0.5),
+        is_marker_seen=lambda mid, arena: True,
+        batcher=batcher,
+    )
+    await server.start()
+
+    lag = LoopLagSampler()
+    lag.start()
+    peak_connected = 0
+
+    async def track_connected():
+        nonlocal peak_connected
+        while True:
+            peak_connected = max(peak_connected, sum(1 for st in server.teams.values() if st.connected))
+            await asyncio.sleep(0.25)
+
+    tracker = asyncio.create_task(track_connected())
+    conn.send("ready")
+
+    # Wait for the driver to say the run is over, without blocking the loop
+    loop = asyncio.get_running_loop()
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    await loop.run_in_executor(None, conn.recv)
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+
+    tracker.cancel()
+    await lag.stop()
+    vision_stop.set()
+    if vision_task is not None:
+        await vision_task
+    if web_runner is not None:
+        await web_runner.cleanup()
+    if cam is not None:
+        await cam.stop()
+    result = {
+        "cpu_percent": 100.0 * cpu / wall if wall > 0 else 0.0,
+        "loop_lag": _percentiles(lag.samples_ms),
+        "peak_connected": float(peak_connected),
+        "inference": batcher.stats(),
+    }
+    await server.stop()
+    await batcher.stop()
+    conn.send(result)
+
+
+def _server_main(port: int, args: Dict[str, Any], conn) -> None:
+    asyncio.run(_serve(port, args, conn))
+
+
+# -------------------- Client side --------------------
+
+
+@dataclass
+class FleetStats:
+    attempted: int = 0
+    connected: int = 0
+    failed: int = 0
+    dropped: int = 0
+    connect_ms: List[float] = field(default_factory=list)
+    sent: Dict[str, int] = field(default_factory=dict)
+    timeouts: Dict[str, int] = field(default_factory=dict)
+    latency_ms: Dict[str, List[float]] = field(default_factory=dict)
+
+
+def _parse_mix(spec: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        op, _, rate = part.partition("=")
+        op = op.strip()
+        if op not in ("print",) + REPLY_OPS:
+            raise SystemExit(f"unknown op {op!r} in --mix")
+        mix[op] = float(rate)
+    return mix
+
+
+def _prediction_frame_b64(size=(320, 240)) -> str:
+    from benchmarks.synthetic_arena import ArenaScene, SceneConfig
+
+    bgr = ArenaScene(SceneConfig(frame_width=size[0], frame_height=size[1], robots=2)).render()
+    ok, buf = cv2.imencode(".jpg", bgr, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+    assert ok
+    return base64.b64encode(buf.tobytes()).decode("ascii")
+
+
+async def _esp_client(
+    i: int,
+    url: str,
+    http,
+    mix: Dict[str, float],
+    stats: FleetStats,
+    frame_b64: str,
+    stop_at: float,
+    timeout_s: float,
+) -> None:
+    import aiohttp
+
+    name = f"sim{i:04d}"
+    rng = random.Random(i)
+    ops = list(mix.keys())
+    weights = [mix[o] for o in ops]
+    total_rate = sum(weights)
+
+    stats.attempted += 1
+    t0 = time.perf_counter()
+    try:
+        ws = await http.ws_connect(url, heartbeat=None, timeout=aiohttp.ClientWSTimeout(ws_close=2.0))
+    except Exception:
+        stats.failed += 1
+        return
+    stats.connected += 1
+    stats.connect_ms.append((time.perf_counter() - t0) * 1000.0)
+
+    replies: Dict[str, asyncio.Queue] = {op: asyncio.Queue() for op in REPLY_OPS}
+    stopping = False
+
+    async def reader():
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            try:
+                data = json.loads(msg.data)
+            except ValueError:
+                continue
+            op = data.get("op")
+            if op == "ping" and data.get("status") == "ping":
+                # Server keepalive; the real ESP answers with pong
+                await ws.send_str(json.dumps({"op": "ping", "teamName": name, "status": "pong"}))
+            elif op in replies:
+                replies[op].put_nowait(time.perf_counter())
+
+    reader_task = asyncio.create_task(reader())
+    try:
+        await ws.send_str(json.dumps({"op": "begin", "teamName": name, "aruco": 100 + i, "teamType": "sim"}))
+
+        while time.perf_counter() < stop_at and not reader_task.done():
+            await asyncio.sleep(rng.expovariate(total_rate) if total_rate > 0 else 1.0)
+            if total_rate <= 0:
+                continue
+            op = rng.choices(ops, weights)[0]
+            stats.sent[op] = stats.sent.get(op, 0) + 1
+
+            if op == "print":
+                await ws.send_str(json.dumps({"op": "print", "teamName": name, "message": f"tick {time.time():.3f}"}))
+                continue
+
+            q = replies[op]
+            while not q.empty():
+                q.get_nowait()  # late reply to an earlier, timed-out request
+
+            if op == "ping":
+                msg = {"op": "ping", "teamName": name, "status": "ping"}
+            elif op == "aruco":
+                msg = {"op": "aruco", "teamName": name}
+            else:
+                msg = {"op": "prediction_request", "teamName": name, "index": 0, "frame": frame_b64}
+
+            sent = time.perf_counter()
+            await ws.send_str(json.dumps(msg))
+            try:
+                got = await asyncio.wait_for(q.get(), timeout=timeout_s)
+                stats.latency_ms.setdefault(op, []).append((got - sent) * 1000.0)
+            except asyncio.TimeoutError:
+                stats.timeouts[op] = stats.timeouts.get(op, 0) + 1
+
+        stopping = True
+    except Exception:
+        pass
+    finally:
+        if not stopping:
+            stats.dropped += 1
+        reader_task.cancel()
+        try:
+            await ws.close()
+        except Exception:
+            pass
+
+
+async def _mjpeg_viewer(url: str, http, frames: List[int], stop_at: float) -> None:
+    """Reads an MJPEG stream until stop_at, appending the number of parts received."""
+    count = 0
+    try:
+        async with http.get(url) as resp:
+            while time.perf_counter() < stop_at:
+                chunk = await resp.content.readany()
+                if not chunk:
+                    break
+                count += chunk.count(b"--frame\r\n")
+    except Exception:
+        pass
+    frames.append(count)
+
+
+async def _ui_socket(url: str, http, received: List[int], stop_at: float) -> None:
+    count = 0
+    try:
+        async with http.ws_connect(url) as ws:
+            while time.perf_counter() < stop_at:
+                try:
+                    await ws.receive(timeout=max(0.01, stop_at - time.perf_counter()))
+                except asyncio.TimeoutError:
+                    break
+                count += 1
+    except Exception:
+        pass
+    received.append(count)
+
+
+async def _run_fleet(url: str, args) -> Dict[str, Any]:
+    import aiohttp
+
+    mix = _parse_mix(args.mix)
+    frame_b64 = _prediction_frame_b64() if mix.get("prediction") else ""
+    stats = FleetStats()
+    lag = LoopLagSampler()
+    lag.start()
+
+    stop_at = time.perf_counter() + args.ramp + args.seconds
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        viewer_frames: List[int] = []
+        ui_events: List[int] = []
+        tasks = []
+        if args.mjpeg_viewers and not args.url:
+            web_url = f"http://127.0.0.1:{args.port + 1}"
+            tasks.append(asyncio.create_task(_ui_socket(web_url + "/ws", http, ui_events, stop_at)))
+            for _ in range(args.mjpeg_viewers):
+                tasks.append(
+                    asyncio.create_task(
+                        _mjpeg_viewer(f"{web_url}/{args.mjpeg_stream}", http, viewer_frames, stop_at)
+                    )
+                )
+        for i in range(args.clients):
+            tasks.append(
+                asyncio.create_task(_esp_client(i, url, http, mix, stats, frame_b64, stop_at, args.timeout))
+            )
+            # Spread connects over the ramp so begin storms don't dominate
+            if args.ramp > 0:
+                await asyncio.sleep(args.ramp / args.clients)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    await lag.stop()
+    duration = args.ramp + args.seconds
+    ops = {}
+    for op in sorted(set(stats.sent) | set(stats.latency_ms)):
+        ops[op] = {
+            "sent": float(stats.sent.get(op, 0)),
+            "timeouts": float(stats.timeouts.get(op, 0)),
+            **({} if op == "print" else _percentiles(stats.latency_ms.get(op, []))),
+        }
+    return {
+        "connections": {
+            "attempted": float(stats.attempted),
+            "connected": float(stats.connected),
+            "failed": float(stats.failed),
+            "dropped": float(stats.dropped),
+            "connect": _percentiles(stats.connect_ms),
+        },
+        "ops": ops,
+        "mjpeg": {
+            "viewers": float(len(viewer_frames)),
+            "fps_per_viewer": (sum(viewer_frames) / len(viewer_frames) / duration) if viewer_frames else 0.0,
+            "ui_events": float(sum(ui_events)),
+        },
+        "client_loop_lag": _percentiles(lag.samples_ms),
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "config": {
+            "clients": args.clients,
+            "seconds": args.seconds,
+            "ramp": args.ramp,
+            "mix": _parse_mix(args.mix),
+            "timeout_s": args.timeout,
+            "mjpeg_viewers": args.mjpeg_viewers,
+            "mjpeg_stream": args.mjpeg_stream,
+            "vision": args.vision,
+        }
+    }
+
+    if args.url:
+        results.update(asyncio.run(_run_fleet(args.url, args)))
+        return results
+
+    server_args = {
+        "predict_batch_ms": args.predict_batch_ms,
+        "predict_item_ms": args.predict_item_ms,
+        "web": args.mjpeg_viewers > 0,
+        "vision": args.vision,
+    }
+    ctx = mp.get_context("spawn")
+    parent, child = ctx.Pipe()
+    proc = ctx.Process(target=_server_main, args=(args.port, server_args, child), daemon=True)
+    proc.start()
+    try:
+        if not parent.poll(60.0) or parent.recv() != "ready":
+            raise SystemExit("WifiServer process did not start")
+        results.update(asyncio.run(_run_fleet(f"ws://127.0.0.1:{args.port}/ws", args)))
+        parent.send("done")
+        results["server"] = parent.recv() if parent.poll(30.0) else None
+    finally:
+        proc.join(10.0)
+        if proc.is_alive():
+            proc.kill()
+    return results
+
+
+def _print_table(results: Dict[str, Any]) -> None:
+    c = results["connections"]
+    print(
+        f"connections: {c['connected']:.0f}/{c['attempted']:.0f} connected, "
+        f"{c['failed']:.0f} failed, {c['dropped']:.0f} dropped"
+    )
+    print(f"{'op':<12}{'sent':>8}{'timeouts':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for op, r in results["ops"].items():
+        if "p50_ms" in r:
+            print(
+                f"{op:<12}{r['sent']:>8.0f}{r['timeouts']:>10.0f}{r['p50_ms']:>8.1f}ms"
+                f"{r['p95_ms']:>8.1f}ms{r['p99_ms']:>8.1f}ms{r['max_ms']:>8.1f}ms"
+            )
+        else:
+            print(f"{op:<12}{r['sent']:>8.0f}{r['timeouts']:>10.0f}")
+
+    m = results["mjpeg"]
+    if m["viewers"]:
+        print(
+            f"mjpeg: {m['viewers']:.0f} viewers at {m['fps_per_viewer']:.1f} fps each, "
+            f"{m['ui_events']:.0f} UI events received"
+        )
+
+    server = results.get("server")
+    if server:
+        lag = server["loop_lag"]
+        print(
+            f"server: {server['cpu_percent']:.0f}% CPU, loop lag p50 {lag.get('p50_ms', math.nan):.1f} ms / "
+            f"p99 {lag.get('p99_ms', math.nan):.1f} ms / max {lag.get('max_ms', math.nan):.1f} ms, "
+            f"peak {server['peak_connected']:.0f} connected, "
+            f"{server['inference'].get('rejected', 0)} inference rejections"
+        )
+    lag = results["client_loop_lag"]
+    print(f"client loop lag p99 {lag.get('p99_ms', math.nan):.1f} ms (high values mean the driver itself is saturated)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clients", type=int, default=200)
+    ap.add_argument("--seconds", type=float, default=20.0, help="steady-state duration after the ramp")
+    ap.add_argument("--ramp", type=float, default=5.0, help="seconds over which clients connect")
+    ap.add_argument("--mix", default="aruco=5,print=2,ping=0.2,prediction=0.1", help="op=rate-per-second-per-client")
+    ap.add_argument("--timeout", type=float, default=5.0, help="reply timeout per request (s)")
+    ap.add_argument("--url", default="", help="ws:// URL of a running server (skips the local server)")
+    ap.add_argument("--port", type=int, default=7855, help="port for the local server")
+    ap.add_argument("--predict-batch-ms", type=float, default=40.0, help="stub predictor cost per batch")
+    ap.add_argument("--predict-item-ms", type=float, default=5.0, help="stub predictor cost per request")
+    ap.add_argument("--mjpeg-viewers", type=int, default=0, help="MJPEG clients on the web page (same loop)")
+    ap.add_argument("--mjpeg-stream", default="crop", choices=("video", "overlay", "crop"))
+    ap.add_argument("--vision", action="store_true", help="also run the arena processing loop")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+
+
+if __name__ == "__main__":
+    main()
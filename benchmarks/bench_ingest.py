@@ -0,0 +1,160 @@
+"""
+Capture-to-latest_frame latency and frame loss of ArenaCamRtpH264, fed by the
+synthetic RTP/H.264 generator on localhost.
+
+Run from the repo root (needs gst-launch-1.0 with x264enc and avdec_h264):
+    python -m benchmarks.bench_ingest [--seconds 10] [--size 1280x720] [--fps 30]
+        [--loss 0.01] [--jitter-ms 5] [--jitterbuffer-ms 50] [--json]
+
+Latency is measured from the moment a frame enters the encoder to the moment
+the ingest path publishes its JPEG, matched by the frame-id barcode, so it
+covers encode, packetization, the network impairments, depay/decode and
+the JPEG re-encode + extraction.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from benchmarks.rtp_generator import (
+    FRAME_ID_BITS,
+    RtpH264Generator,
+    add_generator_args,
+    generator_config,
+    read_frame_id,
+)
+from communications.arenacam import ArenaCamConfig, ArenaCamRtpH264
+from communications.gst_pipeline import GstDecodeConfig
+
+
+def _analyze(
+    arrivals: List[Tuple[float, bytes]],
+    sent_at: Dict[int, float],
+    frames_sent: int,
+    seconds: float,
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    seen = set()
+    duplicates = 0
+    unreadable = 0
+    for arrived, jpeg in arrivals:
+        gray = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            unreadable += 1
+            continue
+        frame_id = read_frame_id(gray)
+        sent = sent_at.get(frame_id)
+        if sent is None or arrived < sent:
+            unreadable += 1
+            continue
+        if frame_id in seen:
+            duplicates += 1
+            continue
+        seen.add(frame_id)
+        latencies.append((arrived - sent) * 1000.0)
+
+    result: Dict[str, Any] = {
+        "frames_sent": float(frames_sent),
+        "frames_published": float(len(arrivals)),
+        "frames_unique": float(len(seen)),
+        "frames_dropped": float(max(0, min(frames_sent, 1 << FRAME_ID_BITS) - len(seen))),
+        "duplicates": float(duplicates),
+        "unreadable": float(unreadable),
+        "fps_published": len(arrivals) / seconds if seconds > 0 else 0.0,
+    }
+    if latencies:
+        arr = np.asarray(latencies)
+        result.update(
+            {
+                "latency_p50_ms": float(np.percentile(arr, 50)),
+                "latency_p95_ms": float(np.percentile(arr, 95)),
+                "latency_p99_ms": float(np.percentile(arr, 99)),
+                "latency_max_ms": float(arr.max()),
+            }
+        )
+    return result
+
+
+async def run(args) -> Dict[str, Any]:
+    gen_cfg = generator_config(args)
+    cam_cfg = ArenaCamConfig(
+        mode="rtp_h264",
+        bind_port=gen_cfg.port,
+        rtp_payload=gen_cfg.rtp_payload,
+        decode=GstDecodeConfig(jitterbuffer_ms=args.jitterbuffer_ms),
+    )
+    cam = ArenaCamRtpH264(cam_cfg)
+
+    arrivals: List[Tuple[float, bytes]] = []
+    publish = cam._publish
+
+    def recording_publish(jpeg: bytes, ts: Optional[float] = None) -> None:
+        arrivals.append((time.time(), jpeg))
+        publish(jpeg, ts)
+
+    cam._publish = recording_publish  # type: ignore[method-assign]
+
+    await cam.start()
+    # Let udpsrc bind before the first packet (and IDR frame) is sent
+    await asyncio.sleep(1.0)
+
+    gen = RtpH264Generator(gen_cfg)
+    gen.start()
+    started = time.perf_counter()
+    await asyncio.sleep(args.seconds)
+    gen.stop()
+    sent_at = dict(gen.sent_at)
+    frames_sent = gen.frames_sent
+    # Frames still in flight when the generator stops
+    await asyncio.sleep(1.0)
+    elapsed = time.perf_counter() - started
+    await cam.stop()
+
+    result = await asyncio.to_thread(_analyze, arrivals, sent_at, frames_sent, elapsed)
+    result["packets_sent"] = float(gen.packets_sent)
+    result["packets_dropped"] = float(gen.packets_dropped)
+    result["config"] = {
+        "size": f"{gen_cfg.width}x{gen_cfg.height}",
+        "fps": gen_cfg.fps,
+        "bitrate_kbps": gen_cfg.bitrate_kbps,
+        "loss": gen_cfg.loss,
+        "jitter_ms": gen_cfg.jitter_ms,
+        "jitterbuffer_ms": args.jitterbuffer_ms,
+        "seconds": args.seconds,
+    }
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_generator_args(ap)
+    ap.set_defaults(port=5600)  # keep clear of a running vision system on 5000
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--jitterbuffer-ms", type=int, default=0, help="insert rtpjitterbuffer with this latency")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(
+        f"sent {results['frames_sent']:.0f} frames, published {results['frames_published']:.0f} "
+        f"({results['fps_published']:.1f} fps), unique {results['frames_unique']:.0f}, "
+        f"dropped {results['frames_dropped']:.0f}, unreadable {results['unreadable']:.0f}"
+    )
+    print(f"RTP packets sent {results['packets_sent']:.0f}, dropped by impairment {results['packets_dropped']:.0f}")
+    if "latency_p50_ms" in results:
+        print(
+            f"capture->latest_frame: p50 {results['latency_p50_ms']:.1f} ms, p95 {results['latency_p95_ms']:.1f} ms, "
+            f"p99 {results['latency_p99_ms']:.1f} ms, max {results['latency_max_ms']:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Preprocessing latency per ML request: legacy PIL path vs the fused path.
+
+Run from the repo root:
+    python -m benchmarks.bench_preprocess [--input-size 224x224] [--iters 200]
+
+Each "request" starts from JPEG bytes, as a prediction_request frame does.
+"""
+import argparse
+import time
+from typing import Callable, Dict, List, Tuple
+
+import cv2
+import numpy as np
+import PIL.Image
+import torch
+import torchvision.transforms as transforms
+
+from machinelearning.jpeg import decode_jpeg_bgr
+from machinelearning.util import preprocess
+
+# Common ESP32-CAM frame sizes (width, height)
+ESP32_CAM_SIZES = {
+    "QQVGA": (160, 120),
+    "QVGA": (320, 240),
+    "VGA": (640, 480),
+    "SVGA": (800, 600),
+    "XGA": (1024, 768),
+    "UXGA": (1600, 1200),
+}
+
+_mean = torch.Tensor([0.485, 0.456, 0.406])
+_std = torch.Tensor([0.229, 0.224, 0.225])
+
+
+def _legacy(jpeg: bytes) -> torch.Tensor:
+    """The pre-change path: full decode, BGR->RGB view, PIL, to_tensor, normalize."""
+    bgr = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    image = PIL.Image.fromarray(bgr[:, :, ::-1])
+    t = transforms.functional.to_tensor(image)
+    t.sub_(_mean[:, None, None]).div_(_std[:, None, None])
+    return t[None, ...]
+
+
+def _synthetic_jpeg(width: int, height: int) -> bytes:
+    rng = np.random.default_rng(0)
+    # Smooth gradients + a little noise compress like a real camera frame
+    yy, xx = np.mgrid[0:height, 0:width]
+    img = np.stack(
+        [(xx * 255 // max(1, width - 1)), (yy * 255 // max(1, height - 1)), ((xx + yy) % 256)],
+        axis=-1,
+    ).astype(np.uint8)
+    img = cv2.add(img, rng.integers(0, 24, img.shape, dtype=np.uint8))
+    ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+    assert ok
+    return buf.tobytes()
+
+
+def _time_ms(fn: Callable[[], object], iters: int) -> List[float]:
+    for _ in range(min(10, iters)):
+        fn()
+    out = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000.0)
+    return out
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    arr = np.asarray(samples)
+    return {
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+    }
+
+
+def run(input_size: Tuple[int, int], iters: int) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for name, (w, h) in ESP32_CAM_SIZES.items():
+        jpeg = _synthetic_jpeg(w, h)
+
+        def fast():
+            bgr = decode_jpeg_bgr(jpeg, min_size=input_size)
+            return preprocess(bgr, input_size)
+
+        def fast_native():
+            bgr = decode_jpeg_bgr(jpeg)
+            return preprocess(bgr)
+
+        results[f"{name} {w}x{h}"] = {
+            "legacy": _summary(_time_ms(lambda: _legacy(jpeg), iters)),
+            "fused_native": _summary(_time_ms(fast_native, iters)),
+            "fused_resized": _summary(_time_ms(fast, iters)),
+        }
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--input-size", default="224x224", help="WIDTHxHEIGHT for the resized path")
+    ap.add_argument("--iters", type=int, default=200)
+    args = ap.parse_args()
+
+    w, h = (int(v) for v in args.input_size.lower().split("x"))
+    torch.set_num_threads(1)
+
+    results = run((w, h), args.iters)
+
+    print(f"{'frame':<18}{'legacy p50':>12}{'native p50':>12}{'resized p50':>13}{'speedup':>9}")
+    for frame, r in results.items():
+        legacy = r["legacy"]["p50_ms"]
+        native = r["fused_native"]["p50_ms"]
+        resized = r["fused_resized"]["p50_ms"]
+        print(f"{frame:<18}{legacy:>10.2f}ms{native:>10.2f}ms{resized:>11.2f}ms{legacy / max(resized, 1e-9):>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
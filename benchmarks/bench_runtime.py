@@ -0,0 +1,100 @@
+"""
+Latency and accuracy drift of the backbone runtimes (eager / torchscript / int8).
+
+Run from the repo root:
+    python -m benchmarks.bench_runtime [--input-size 224x224] [--random-weights]
+
+"Accuracy drift" is measured against eager fp32 on a synthetic dataset: each
+frame is scored by a few random team heads and we report how often the argmax
+matches eager, plus the largest logit difference.
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from machinelearning.runtime import BACKENDS, compile_backbone, eager_backbone, synthetic_calibration_batch
+
+
+def _latency_ms(module: torch.nn.Module, x: torch.Tensor, iters: int) -> Dict[str, float]:
+    with torch.inference_mode():
+        for _ in range(3):
+            module(x)
+        samples: List[float] = []
+        for _ in range(iters):
+            t0 = time.perf_counter()
+            module(x)
+            samples.append((time.perf_counter() - t0) * 1000.0)
+    arr = np.asarray(samples)
+    return {"p50_ms": float(np.percentile(arr, 50)), "p95_ms": float(np.percentile(arr, 95))}
+
+
+def run(input_size, iters: int, n_frames: int, n_heads: int, weights) -> Dict[str, Dict[str, float]]:
+    torch.manual_seed(0)
+    base = eager_backbone(weights=weights)
+
+    calibration = synthetic_calibration_batch(32, input_size=input_size, seed=1)
+    dataset = synthetic_calibration_batch(n_frames, input_size=input_size, seed=2)
+    heads = [(torch.randn(4, 512) * 0.05, torch.zeros(4)) for _ in range(n_heads)]
+
+    with torch.inference_mode():
+        ref_feats = base(dataset)
+    ref_logits = [F.linear(ref_feats, w, b) for (w, b) in heads]
+
+    results: Dict[str, Dict[str, float]] = {}
+    for backend in BACKENDS:
+        t0 = time.perf_counter()
+        module = compile_backbone(base, backend, input_size=input_size, calibration=calibration)
+        build_s = time.perf_counter() - t0
+
+        with torch.inference_mode():
+            feats = torch.cat([module(chunk) for chunk in dataset.split(8)], dim=0)
+
+        agree = []
+        max_diff = 0.0
+        for (w, b), ref in zip(heads, ref_logits):
+            logits = F.linear(feats, w, b)
+            agree.append(float((logits.argmax(1) == ref.argmax(1)).float().mean()))
+            max_diff = max(max_diff, float((logits - ref).abs().max()))
+
+        results[backend] = {
+            "build_s": build_s,
+            "top1_agreement": float(np.mean(agree)),
+            "max_logit_diff": max_diff,
+            **{f"batch1_{k}": v for k, v in _latency_ms(module, dataset[:1], iters).items()},
+            **{f"batch8_{k}": v for k, v in _latency_ms(module, dataset[:8], max(1, iters // 4)).items()},
+        }
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--input-size", default="224x224", help="WIDTHxHEIGHT")
+    ap.add_argument("--iters", type=int, default=40)
+    ap.add_argument("--frames", type=int, default=64, help="synthetic dataset size")
+    ap.add_argument("--heads", type=int, default=5, help="random team heads to score with")
+    ap.add_argument("--random-weights", action="store_true", help="skip the ImageNet weight download")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    w, h = (int(v) for v in args.input_size.lower().split("x"))
+    results = run((w, h), args.iters, args.frames, args.heads, None if args.random_weights else "IMAGENET1K_V1")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'backend':<13}{'build':>8}{'b1 p50':>10}{'b8 p50':>10}{'top1 agree':>12}{'max dlogit':>12}")
+    for backend, r in results.items():
+        print(
+            f"{backend:<13}{r['build_s']:>7.1f}s{r['batch1_p50_ms']:>8.1f}ms{r['batch8_p50_ms']:>8.1f}ms"
+            f"{r['top1_agreement'] * 100:>11.1f}%{r['max_logit_diff']:>12.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
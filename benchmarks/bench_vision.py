@@ -0,0 +1,315 @@
+"""
+End-to-end vision benchmark on synthetic arena frames (no camera, no network).
+
+Run from the repo root:
+    python -m benchmarks.bench_vision [--frames 60] [--size 1280x720]
+        [--working-width 640] [--json]
+
+Stages:
+  aruco      ArucoDetector.detect on a full frame
+  arena      ArenaProcessor.process_bgr (detect + poses + overlay/crop JPEGs),
+             with pose accuracy against the rendered ground truth; at
+             ArenaConfig.working_width when --working-width is given
+  extract    ArenaCamRtpH264._extract_jpegs_from_buffer on a 4 KiB-chunked stream
+  mjpeg      WebPage.mjpeg_stream fan-out to --clients local HTTP clients
+  predict    Predictor.predict with a random backbone and one team head
+
+Every stage reports latency percentiles, frames/sec and the process RSS
+before/after, so the JSON output can be diffed between commits.
+"""
+import argparse
+import asyncio
+import json
+import resource
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic_arena import ArenaScene, SceneConfig, pose_errors
+from communications.arenacam import ArenaCamRtpH264
+from vision.arena import ArenaConfig, ArenaProcessor
+from vision.aruco import ArucoDetector
+
+STAGES = ("aruco", "arena", "extract", "mjpeg", "predict")
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / (1024.0 * 1024.0)
+    except (OSError, ValueError, IndexError):
+        return float("nan")
+
+
+def _latency(samples_ms: List[float]) -> Dict[str, float]:
+    arr = np.asarray(samples_ms)
+    return {
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "fps": float(1000.0 / arr.mean()) if arr.mean() > 0 else float("inf"),
+    }
+
+
+def _time_each(items: List[Any], fn: Callable[[Any], object], warmup: int = 3) -> List[float]:
+    for item in items[:warmup]:
+        fn(item)
+    out = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        out.append((time.perf_counter() - t0) * 1000.0)
+    return out
+
+
+def _render_frames(scene: ArenaScene, n: int) -> List[Dict[str, Any]]:
+    frames = []
+    for _ in range(n):
+        scene.randomize_robots()
+        truth = {mid: scene.poses[mid] for mid in scene.robot_ids}
+        frames.append({"bgr": scene.render(), "truth": truth})
+    return frames
+
+
+# -------------------- Stages --------------------
+
+
+def bench_aruco(frames: List[Dict[str, Any]]) -> Dict[str, Any]:
+    detector = ArucoDetector(dict_name="DICT_4X4_1000")
+    expected = len(frames[0]["truth"]) + 4
+    found: List[int] = []
+
+    def run(f):
+        found.append(len(detector.detect(f["bgr"])))
+
+    result = _latency(_time_each(frames, run, warmup=0))
+    result["markers_found_mean"] = float(np.mean(found))
+    result["markers_expected"] = float(expected)
+    return result
+
+
+def bench_arena(frames: List[Dict[str, Any]], working_width: int = 0) -> Dict[str, Any]:
+    processor = ArenaProcessor(ArenaConfig(working_width=working_width))
+    errors: List[Dict[str, float]] = []
+
+    def run(f):
+        processor.process_bgr(f["bgr"])
+        errors.append(pose_errors(f["truth"], processor.poses_arena))
+
+    # First frame computes the crop/arena homography; time the steady state
+    processor.process_bgr(frames[0]["bgr"])
+    result = _latency(_time_each(frames, run, warmup=0))
+
+    keys = errors[0].keys()
+    accuracy = {k: float(np.nanmean([e[k] for e in errors])) for k in keys}
+    accuracy["pos_err_max_m"] = float(np.nanmax([e["pos_err_max_m"] for e in errors]))
+    accuracy["theta_err_max_rad"] = float(np.nanmax([e["theta_err_max_rad"] for e in errors]))
+    result["accuracy"] = accuracy
+    return result
+
+
+def bench_extract(jpegs: List[bytes], chunk: int = 4096) -> Dict[str, Any]:
+    stream = b"".join(jpegs)
+    chunks = [stream[i:i + chunk] for i in range(0, len(stream), chunk)]
+
+    def run_once() -> int:
+        buf = bytearray()
+        n = 0
+        for c in chunks:
+            buf.extend(c)
+            n += len(ArenaCamRtpH264._extract_jpegs_from_buffer(buf))
+        return n
+
+    run_once()
+    t0 = time.perf_counter()
+    extracted = run_once()
+    elapsed = time.perf_counter() - t0
+    return {
+        "frames": float(extracted),
+        "expected_frames": float(len(jpegs)),
+        "per_frame_ms": elapsed * 1000.0 / max(1, extracted),
+        "fps": extracted / elapsed if elapsed > 0 else float("inf"),
+        "mb_per_s": len(stream) / 1e6 / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+async def _bench_mjpeg(jpeg: bytes, clients: int, seconds: float) -> Dict[str, Any]:
+    import aiohttp
+    from aiohttp import web
+
+    from frontend.webpage import create_app
+
+    stop_event = asyncio.Event()
+    cam = SimpleNamespace(latest_frame=jpeg)
+    arena = SimpleNamespace(latest_overlay_jpeg=jpeg, latest_cropped_jpeg=jpeg)
+    app = create_app(stop_event, cam, arena)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+
+    counts = [0] * clients
+    nbytes = [0] * clients
+
+    async def client(i: int, http: aiohttp.ClientSession):
+        async with http.get(f"http://127.0.0.1:{port}/overlay") as r:
+            async for chunk in r.content.iter_any():
+                counts[i] += chunk.count(b"--frame\r\n")
+                nbytes[i] += len(chunk)
+
+    cpu0 = time.process_time()
+    async with aiohttp.ClientSession() as http:
+        tasks = [asyncio.create_task(client(i, http)) for i in range(clients)]
+        await asyncio.sleep(seconds)
+        stop_event.set()
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    cpu = time.process_time() - cpu0
+    await runner.cleanup()
+
+    per_client = np.asarray(counts, dtype=np.float64) / seconds
+    return {
+        "clients": float(clients),
+        "fps_per_client_mean": float(per_client.mean()),
+        "fps_per_client_min": float(per_client.min()),
+        "mb_per_s_total": float(sum(nbytes) / 1e6 / seconds),
+        # Includes the clients, which run on the same loop
+        "cpu_percent": float(100.0 * cpu / seconds),
+    }
+
+
+def bench_mjpeg(jpeg: bytes, clients: int, seconds: float) -> Dict[str, Any]:
+    return asyncio.run(_bench_mjpeg(jpeg, clients, seconds))
+
+
+def bench_predict(frames: List[Dict[str, Any]], input_size: Optional[str]) -> Dict[str, Any]:
+    import torch
+    import torchvision
+
+    from machinelearning.predictor import Predictor
+
+    with tempfile.TemporaryDirectory() as models_dir:
+        # Random weights: latency does not depend on them and nothing is downloaded
+        torch.manual_seed(0)
+        weights = Path(models_dir) / "backbone.pth"
+        torch.save(torchvision.models.resnet18(weights=None).state_dict(), str(weights))
+        torch.save(
+            {"fc.weight": torch.randn(3, 512) * 0.05, "fc.bias": torch.zeros(3)},
+            str(Path(models_dir) / "bench_0_3.pth"),
+        )
+
+        size = tuple(int(v) for v in input_size.lower().split("x")) if input_size else None
+        t0 = time.perf_counter()
+        predictor = Predictor(models_dir, input_size=size, backbone_weights=str(weights))
+        load_ms = (time.perf_counter() - t0) * 1000.0
+
+        # ESP32-CAM sized crops of the arena frames
+        crops = [cv2.resize(f["bgr"], (320, 240), interpolation=cv2.INTER_AREA) for f in frames]
+        result = _latency(_time_each(crops, lambda img: predictor.predict(img, "bench", 0)))
+        result["load_ms"] = load_ms
+        return result
+
+
+# -------------------- Driver --------------------
+
+
+def run(args) -> Dict[str, Any]:
+    w, h = (int(v) for v in args.size.lower().split("x"))
+    scene = ArenaScene(SceneConfig(frame_width=w, frame_height=h, robots=args.robots), seed=args.seed)
+    frames = _render_frames(scene, args.frames)
+    jpegs = [cv2.imencode(".jpg", f["bgr"], [int(cv2.IMWRITE_JPEG_QUALITY), 85])[1].tobytes() for f in frames]
+
+    stages = [s for s in args.stages.split(",") if s] if args.stages else list(STAGES)
+    results: Dict[str, Any] = {
+        "config": {
+            "frames": args.frames,
+            "size": f"{w}x{h}",
+            "robots": args.robots,
+            "seed": args.seed,
+            "working_width": args.working_width,
+            "opencv": cv2.__version__,
+            "cv_threads": cv2.getNumThreads(),
+        },
+        "stages": {},
+    }
+
+    for stage in stages:
+        rss_before = _rss_mb()
+        if stage == "aruco":
+            r = bench_aruco(frames)
+        elif stage == "arena":
+            r = bench_arena(frames, args.working_width)
+        elif stage == "extract":
+            r = bench_extract(jpegs)
+        elif stage == "mjpeg":
+            r = bench_mjpeg(jpegs[0], args.clients, args.seconds)
+        elif stage == "predict":
+            r = bench_predict(frames, args.input_size)
+        else:
+            raise SystemExit(f"unknown stage {stage!r} (choose from {', '.join(STAGES)})")
+        r["rss_before_mb"] = rss_before
+        r["rss_after_mb"] = _rss_mb()
+        results["stages"][stage] = r
+
+    # ru_maxrss is KiB on Linux; all memory figures are MiB
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return results
+
+
+def _print_table(results: Dict[str, Any]) -> None:
+    print(f"{'stage':<10}{'p50':>10}{'p95':>10}{'p99':>10}{'fps':>10}{'rss':>10}")
+    for stage, r in results["stages"].items():
+        if "p50_ms" in r:
+            print(
+                f"{stage:<10}{r['p50_ms']:>8.2f}ms{r['p95_ms']:>8.2f}ms{r['p99_ms']:>8.2f}ms"
+                f"{r['fps']:>10.1f}{r['rss_after_mb']:>8.0f}MB"
+            )
+        elif stage == "extract":
+            print(f"{stage:<10}{r['per_frame_ms']:>8.3f}ms{'':>20}{r['fps']:>10.0f}{r['rss_after_mb']:>8.0f}MB")
+        elif stage == "mjpeg":
+            print(
+                f"{stage:<10}{r['clients']:.0f} clients: {r['fps_per_client_mean']:.1f} fps each "
+                f"(min {r['fps_per_client_min']:.1f}), {r['mb_per_s_total']:.1f} MB/s, {r['cpu_percent']:.0f}% CPU"
+            )
+
+    acc = results["stages"].get("arena", {}).get("accuracy")
+    if acc:
+        print(
+            f"pose error: {acc['pos_err_mean_m'] * 1000:.1f} mm mean / {acc['pos_err_max_m'] * 1000:.1f} mm max, "
+            f"{np.degrees(acc['theta_err_mean_rad']):.2f} deg mean, {acc['missing']:.2f} missed per frame"
+        )
+    print(f"peak RSS: {results['peak_rss_mb']:.0f} MB")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--frames", type=int, default=60)
+    ap.add_argument("--size", default="1280x720", help="WIDTHxHEIGHT of the synthetic camera frames")
+    ap.add_argument("--robots", type=int, default=8, help="robot markers per frame (plus the 4 corners)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--working-width", type=int, default=0, help="ArenaProcessor working width (0 = frame size)")
+    ap.add_argument("--stages", default="", help=f"comma-separated subset of {','.join(STAGES)}")
+    ap.add_argument("--clients", type=int, default=8, help="MJPEG clients for the fan-out stage")
+    ap.add_argument("--seconds", type=float, default=3.0, help="duration of the fan-out stage")
+    ap.add_argument("--input-size", default=None, help="predictor WIDTHxHEIGHT (default: native)")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Checks that many in-process rtp_h264 cameras all get frames at once.
+
+Run from the repo root:
+    python -m benchmarks.check_cameras [--cameras 6] [--offline 2] [--io N]
+        [--timeout 10] [--json]
+
+Starts --cameras ArenaCamRtpH264 instances whose GStreamer pipeline is
+replaced by a small Python process that writes a JPEG to stdout every 33 ms
+and, like gst-launch -q, nothing to stderr, plus --offline ones whose
+pipeline writes nothing at all (no RTP arriving), so their readers block for
+good. The "io" pool is sized the way core/main.py run() sizes it for all of
+them, unless --io is given (--io 4 shows what a fixed pool does). Every live
+camera has to publish a frame within --timeout seconds.
+
+Exits non-zero if any live camera got no frame.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, List
+
+from communications.arenacam import ArenaCamConfig, ArenaCamRtpH264
+from core.main import _executor_sizes
+from utils import executors
+
+_FAKE_GST = r"""
+import sys, time
+jpeg = b"\xff\xd8" + bytes(2000) + b"\xff\xd9"
+live = sys.argv[1] == "live"
+while True:
+    if live:
+        sys.stdout.buffer.write(jpeg)
+        sys.stdout.buffer.flush()
+    time.sleep(0.033)
+"""
+
+
+class _FakeGstCam(ArenaCamRtpH264):
+    def __init__(self, cfg: ArenaCamConfig, live: bool):
+        super().__init__(cfg)
+        self.live = live
+
+    def _gst_cmd(self) -> list[str]:
+        return [sys.executable, "-c", _FAKE_GST, "live" if self.live else "offline"]
+
+
+async def _run(cameras: int, offline: int, timeout_s: float) -> Dict[str, Any]:
+    # Offline cameras start first, so their readers are the ones already holding io threads
+    dead = [_FakeGstCam(ArenaCamConfig(bind_port=6000 + i), live=False) for i in range(offline)]
+    cams = [_FakeGstCam(ArenaCamConfig(bind_port=5000 + i), live=True) for i in range(cameras)]
+    t0 = time.perf_counter()
+    first: List[float] = [-1.0] * cameras
+    try:
+        # start() probes the pipeline on the io pool too; a starved pool hangs right here
+        await asyncio.wait_for(asyncio.gather(*(cam.start() for cam in dead + cams)), timeout=timeout_s)
+        while time.perf_counter() - t0 < timeout_s and min(first) < 0:
+            for i, cam in enumerate(cams):
+                if first[i] < 0 and cam.latest_frame is not None:
+                    first[i] = time.perf_counter() - t0
+            await asyncio.sleep(0.02)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await asyncio.gather(*(cam.stop() for cam in dead + cams), return_exceptions=True)
+    return {
+        "ok": min(first) >= 0,
+        "cameras_with_frames": sum(1 for t in first if t >= 0),
+        "first_frame_ms": [round(t * 1000.0) if t >= 0 else None for t in first],
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--cameras", type=int, default=6)
+    ap.add_argument("--offline", type=int, default=2, help="cameras whose pipeline never outputs a frame")
+    ap.add_argument("--io", type=int, default=0, help="io pool size (default: sized like run())")
+    ap.add_argument("--timeout", type=float, default=10.0)
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    sizes = _executor_sizes({}, [{}] * (args.cameras + args.offline))
+    if args.io > 0:
+        sizes["io"] = args.io
+    executors.configure(sizes)
+
+    result = asyncio.run(_run(args.cameras, args.offline, args.timeout))
+    result["io_threads"] = sizes["io"]
+    executors.shutdown()
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{'ok' if result['ok'] else 'FAIL'}: {result['cameras_with_frames']}/{args.cameras} cameras got frames")
+        print(f"io threads {sizes['io']}, first frame after (ms): {result['first_frame_ms']}")
+    sys.exit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
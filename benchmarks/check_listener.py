@@ -0,0 +1,266 @@
+"""
+End-to-end checks of the ML listener against the local Firebase stand-ins
+(benchmarks/firebase_stub.py), no network needed.
+
+Run from the repo root:
+    python -m benchmarks.check_listener [--json]
+
+Scenarios, each against a fresh models directory:
+  initial     every object is downloaded and recorded in the manifest
+  unchanged   a second check downloads nothing (skipped via the manifest)
+  changed     an overwritten object is downloaded again, the others are not
+  bad_md5     a download whose bytes don't match md5Hash is rejected: the
+              check fails, the old local file is kept, and the object is
+              retried (and accepted) once the stub serves it intact
+  paginated   listings spanning several pages are followed to the end
+
+Watcher scenarios run run_listener() against the RTDB SSE stand-in too:
+  watch_initial     the snapshot sent on connect triggers a full sync
+  watch_scoped      a put under a synced team's key lists only that team
+  watch_unknown     a put under a key that isn't a synced team (a push ID)
+                    falls back to a full check, so a new team's upload lands
+  watch_reconnect   after the stream drops, the listener reconnects and the
+                    new snapshot picks up uploads made while it was away
+
+Exits non-zero if any scenario fails.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from benchmarks.firebase_stub import RtdbStub, StorageStub
+from machinelearning import listener
+
+TEAMS = ("Alpha", "Bravo", "Charlie")
+
+
+def _name(team: str, index: int = 0) -> str:
+    return f"{listener.REMOTE_PREFIX}{team}_{index}_3.pth"
+
+
+def _read(models_dir: str, team: str, index: int = 0) -> bytes:
+    with open(os.path.join(models_dir, f"{team}_{index}_3.pth"), "rb") as f:
+        return f.read()
+
+
+def _seed(stub: StorageStub) -> None:
+    for team in TEAMS:
+        stub.put(_name(team), f"weights of {team} v1".encode("utf-8"))
+
+
+def check_initial(stub: StorageStub, models_dir: str) -> Dict[str, Any]:
+    _seed(stub)
+    listener.check_once(models_dir)
+    manifest = listener.load_manifest(models_dir)
+    ok = all(_read(models_dir, t) == f"weights of {t} v1".encode() for t in TEAMS)
+    ok = ok and set(manifest) == {_name(t) for t in TEAMS}
+    return {"ok": ok, "downloads": sum(stub.downloads(_name(t)) for t in TEAMS)}
+
+
+def check_unchanged(stub: StorageStub, models_dir: str) -> Dict[str, Any]:
+    _seed(stub)
+    listener.check_once(models_dir)
+    before = {t: stub.downloads(_name(t)) for t in TEAMS}
+    listener.check_once(models_dir)
+    after = {t: stub.downloads(_name(t)) for t in TEAMS}
+    return {"ok": before == after, "downloads_second_check": sum(after.values()) - sum(before.values())}
+
+
+def check_changed(stub: StorageStub, models_dir: str) -> Dict[str, Any]:
+    _seed(stub)
+    listener.check_once(models_dir)
+    stub.put(_name("Bravo"), b"weights of Bravo v2")
+    before = {t: stub.downloads(_name(t)) for t in TEAMS}
+    listener.check_once(models_dir)
+    delta = {t: stub.downloads(_name(t)) - before[t] for t in TEAMS}
+    ok = delta == {"Alpha": 0, "Bravo": 1, "Charlie": 0} and _read(models_dir, "Bravo") == b"weights of Bravo v2"
+    return {"ok": ok, "downloads": delta}
+
+
+def check_bad_md5(stub: StorageStub, models_dir: str) -> Dict[str, Any]:
+    _seed(stub)
+    listener.check_once(models_dir)
+    stub.put(_name("Alpha"), b"weights of Alpha v2")
+    stub.corrupt.add(_name("Alpha"))
+
+    rejected = False
+    try:
+        listener.check_once(models_dir)
+    except RuntimeError:
+        rejected = True
+    kept_old = _read(models_dir, "Alpha") == b"weights of Alpha v1"
+    no_tmp = not any(f.endswith(".tmp") for f in os.listdir(models_dir))
+
+    stub.corrupt.clear()
+    listener.check_once(models_dir)
+    recovered = _read(models_dir, "Alpha") == b"weights of Alpha v2"
+    return {
+        "ok": rejected and kept_old and no_tmp and recovered,
+        "rejected": rejected,
+        "kept_old": kept_old,
+        "recovered": recovered,
+    }
+
+
+def check_paginated(stub: StorageStub, models_dir: str) -> Dict[str, Any]:
+    stub.page_size = 2
+    for i in range(7):
+        stub.put(_name("Delta", i), f"weights {i}".encode("utf-8"))
+    lists_before = stub.hits["list"]
+    listener.check_once(models_dir)
+    ok = all(_read(models_dir, "Delta", i) == f"weights {i}".encode() for i in range(7))
+    return {"ok": ok, "list_requests": stub.hits["list"] - lists_before}
+
+
+async def _until(cond: Callable[[], bool], timeout_s: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        await asyncio.sleep(0.05)
+    return cond()
+
+
+def _has(models_dir: str, team: str, data: bytes) -> Callable[[], bool]:
+    def cond() -> bool:
+        try:
+            return _read(models_dir, team) == data
+        except OSError:
+            return False
+
+    return cond
+
+
+async def watch_initial(storage: StorageStub, rtdb: RtdbStub, models_dir: str) -> Dict[str, Any]:
+    ok = all([await _until(_has(models_dir, t, f"weights of {t} v1".encode())) for t in TEAMS])
+    return {"ok": ok, "list_prefixes": list(storage.list_prefixes)}
+
+
+async def watch_scoped(storage: StorageStub, rtdb: RtdbStub, models_dir: str) -> Dict[str, Any]:
+    before = {t: storage.downloads(_name(t)) for t in TEAMS}
+    storage.list_prefixes.clear()
+    storage.put(_name("Bravo"), b"weights of Bravo v2")
+    rtdb.send("put", "/Bravo", {"updated": time.time()})
+    synced = await _until(_has(models_dir, "Bravo", b"weights of Bravo v2"))
+    delta = {t: storage.downloads(_name(t)) - before[t] for t in TEAMS}
+    prefixes = list(storage.list_prefixes)
+    ok = synced and prefixes == [f"{listener.REMOTE_PREFIX}Bravo_"] and delta == {"Alpha": 0, "Bravo": 1, "Charlie": 0}
+    return {"ok": ok, "list_prefixes": prefixes, "downloads": delta}
+
+
+async def watch_unknown(storage: StorageStub, rtdb: RtdbStub, models_dir: str) -> Dict[str, Any]:
+    storage.list_prefixes.clear()
+    storage.put(_name("Echo"), b"weights of Echo v1")
+    rtdb.send("put", "/-NxQ3pushIdA1", {"team": "Echo"})
+    synced = await _until(_has(models_dir, "Echo", b"weights of Echo v1"))
+    prefixes = list(storage.list_prefixes)
+    return {"ok": synced and listener.REMOTE_PREFIX in prefixes, "list_prefixes": prefixes}
+
+
+async def watch_reconnect(storage: StorageStub, rtdb: RtdbStub, models_dir: str) -> Dict[str, Any]:
+    rtdb.drop()
+    storage.put(_name("Charlie"), b"weights of Charlie v2")
+    synced = await _until(_has(models_dir, "Charlie", b"weights of Charlie v2"), timeout_s=15.0)
+    return {"ok": synced and rtdb.connections >= 2, "connections": rtdb.connections}
+
+
+async def _run_watcher(
+    scenario: Callable[[StorageStub, RtdbStub, str], Awaitable[Dict[str, Any]]],
+    storage: StorageStub,
+    rtdb: RtdbStub,
+    models_dir: str,
+) -> Dict[str, Any]:
+    _seed(storage)
+    stop = asyncio.Event()
+    task = asyncio.create_task(listener.run_listener(models_dir, stop, rtdb_url=rtdb.url))
+    try:
+        # Every scenario starts from a completed initial sync
+        synced = all([await _until(_has(models_dir, t, f"weights of {t} v1".encode())) for t in TEAMS])
+        if not synced:
+            return {"ok": False, "error": "initial sync did not finish"}
+        await asyncio.sleep(0.5)  # let the initial check's trailing bookkeeping settle
+        return await scenario(storage, rtdb, models_dir)
+    finally:
+        stop.set()
+        rtdb.drop()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+SCENARIOS: Dict[str, Callable[[StorageStub, str], Dict[str, Any]]] = {
+    "initial": check_initial,
+    "unchanged": check_unchanged,
+    "changed": check_changed,
+    "bad_md5": check_bad_md5,
+    "paginated": check_paginated,
+}
+
+WATCH_SCENARIOS: Dict[str, Callable[[StorageStub, RtdbStub, str], Awaitable[Dict[str, Any]]]] = {
+    "watch_initial": watch_initial,
+    "watch_scoped": watch_scoped,
+    "watch_unknown": watch_unknown,
+    "watch_reconnect": watch_reconnect,
+}
+
+
+def run() -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, scenario in SCENARIOS.items():
+        stub = StorageStub()
+        stub.start()
+        os.environ["VISION_ML_STORAGE_URL"] = stub.url
+        try:
+            with tempfile.TemporaryDirectory() as models_dir:
+                results[name] = scenario(stub, models_dir)
+        except Exception as e:
+            results[name] = {"ok": False, "error": repr(e)}
+        finally:
+            stub.stop()
+
+    for name, watch in WATCH_SCENARIOS.items():
+        storage, rtdb = StorageStub(), RtdbStub()
+        storage.start()
+        rtdb.start()
+        os.environ["VISION_ML_STORAGE_URL"] = storage.url
+        try:
+            with tempfile.TemporaryDirectory() as models_dir:
+                results[name] = asyncio.run(_run_watcher(watch, storage, rtdb, models_dir))
+        except Exception as e:
+            results[name] = {"ok": False, "error": repr(e)}
+        finally:
+            rtdb.stop()
+            storage.stop()
+    return results
+
+
+def _print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    for name, r in results.items():
+        detail = ", ".join(f"{k}={v}" for k, v in r.items() if k != "ok")
+        print(f"{name:<18}{'ok' if r['ok'] else 'FAIL':<6}{detail}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    # The listener logs every step to stdout; keep the report readable
+    listener.log = lambda _msg: None  # type: ignore[assignment]
+    listener.set_event_sink(lambda _evt: None)
+
+    results = run()
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+    failed: List[str] = [n for n, r in results.items() if not r["ok"]]
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Checks that a soft restart with a bad config.json keeps the vision system up.
+
+Run from the repo root:
+    python -m benchmarks.check_restart [--json]
+
+Starts core/main.py run_sessions() with one replay camera ("north", fed a
+synthetic arena recording) and then soft-restarts it with each reloaded
+config in turn:
+
+  bad_name      a camera name the camera list rejects
+  start_fails   a camera whose recording does not exist, so start() raises
+  port_taken    a web port something else is already listening on
+  good          a valid config that renames the camera to "south"
+
+After each of the bad ones the previous camera has to be serving frames
+again, with the web app up; after "good" the new one does.
+
+Exits non-zero if any step fails.
+"""
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import socket
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from benchmarks.synthetic_arena import ArenaScene
+from communications.recording import FrameRecorder
+from core.main import VisionSession, run_sessions
+from machinelearning.batcher import InferenceBatcher, InferenceConfig
+from utils.logging import get_logger
+from utils.timeline import StartupTimeline
+
+
+class _NoModels:
+    def predict_batch(self, requests):
+        return [0 for _ in requests]
+
+    def diagnostics(self) -> Dict[str, Any]:
+        return {}
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _record(path: str) -> None:
+    scene = ArenaScene(seed=1)
+    rec = FrameRecorder(path)
+    rec.start()
+    for i in range(10):
+        scene.randomize_robots()
+        rec.write(scene.render_jpeg(), i / 30.0)
+    rec.close()
+
+
+def _config(camera: str, recording: str, web_port: int, ws_port: int) -> Dict[str, Any]:
+    return {
+        "system": {"log_level": "WARNING"},
+        "cameras": [{"name": camera, "mode": "replay", "replay_path": recording}],
+        "frontend": {"host": "127.0.0.1", "port": web_port},
+        "communications": {"ws_port": ws_port},
+    }
+
+
+async def _serving(session: VisionSession, web_port: int, timeout_s: float = 10.0) -> Dict[str, Any]:
+    """Camera names the web app reports, and whether every camera has a frame."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout_s
+    while loop.time() < deadline and not all(c.arenacam.latest_frame for c in session.cameras.values()):
+        await asyncio.sleep(0.05)
+    async with aiohttp.ClientSession() as http:
+        async with http.get(f"http://127.0.0.1:{web_port}/api/cameras") as resp:
+            names = [c["name"] for c in (await resp.json())["cameras"]]
+    return {"cameras": names, "frames": all(c.arenacam.latest_frame for c in session.cameras.values())}
+
+
+async def _run(recording: str) -> Dict[str, Dict[str, Any]]:
+    logger = get_logger("check_restart", level=logging.CRITICAL)
+    web_port, ws_port = _free_port(), _free_port()
+    base = _config("north", recording, web_port, ws_port)
+
+    bad_name = copy.deepcopy(base)
+    bad_name["cameras"][0]["name"] = "no good!"
+    start_fails = copy.deepcopy(base)
+    start_fails["cameras"][0]["replay_path"] = recording + "-missing"
+    blocker = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    blocker.bind(("127.0.0.1", 0))
+    blocker.listen(1)
+    port_taken = copy.deepcopy(base)
+    port_taken["frontend"]["port"] = blocker.getsockname()[1]
+    good = _config("south", recording, web_port, ws_port)
+    steps = [
+        ("bad_name", bad_name, "north"),
+        ("start_fails", start_fails, "north"),
+        ("port_taken", port_taken, "north"),
+        ("good", good, "south"),
+    ]
+
+    pending: List[Dict[str, Any]] = []
+    current: Dict[str, Optional[VisionSession]] = {"session": None}
+    started = asyncio.Event()
+
+    def _on_session(session: VisionSession) -> None:
+        current["session"] = session
+        started.set()
+
+    stop_event, restart_event = asyncio.Event(), asyncio.Event()
+    batcher = InferenceBatcher(_NoModels(), InferenceConfig())
+    task = asyncio.create_task(
+        run_sessions(
+            base,
+            lambda: pending.pop(0),
+            logger,
+            batcher,
+            StartupTimeline("check", logger=logger),
+            stop_event,
+            restart_event,
+            on_restart=restart_event.set,
+            on_session=_on_session,
+        )
+    )
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        await asyncio.wait_for(started.wait(), timeout=30.0)
+        r = await _serving(current["session"], web_port)
+        results["baseline"] = {"ok": r["cameras"] == ["north"] and r["frames"], **r}
+        for name, config, expected in steps:
+            started.clear()
+            pending.append(config)
+            restart_event.set()
+            try:
+                await asyncio.wait_for(started.wait(), timeout=60.0)
+            except asyncio.TimeoutError:
+                results[name] = {"ok": False, "error": "no session came back up"}
+                break
+            r = await _serving(current["session"], web_port)
+            results[name] = {"ok": r["cameras"] == [expected] and r["frames"] and not task.done(), **r}
+    finally:
+        blocker.close()
+        stop_event.set()
+        await asyncio.wait_for(asyncio.gather(task, return_exceptions=True), timeout=30.0)
+    return results
+
+
+def _print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    for name, r in results.items():
+        detail = ", ".join(f"{k}={v}" for k, v in r.items() if k != "ok")
+        print(f"{name:<12}{'ok' if r['ok'] else 'FAIL':<6}{detail}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    # Expected failures log at ERROR/FATAL; keep the report readable
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        recording = os.path.join(tmp, "arena")
+        _record(recording)
+        results = asyncio.run(_run(recording))
+    logging.disable(logging.NOTSET)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+    sys.exit(0 if results and all(r["ok"] for r in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
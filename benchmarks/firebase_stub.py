@@ -0,0 +1,232 @@
+"""
+Local stand-ins for the Firebase endpoints the ML listener uses, so
+machinelearning/listener.py can be exercised offline.
+
+StorageStub replaces Firebase Storage:
+
+    stub = StorageStub()
+    stub.start()
+    os.environ["VISION_ML_STORAGE_URL"] = stub.url
+    stub.put("studentmodels/TeamA_0_3.pth", b"...")
+    check_once(output_dir)
+    stub.stop()
+
+Serves GET /v0/b/<bucket>/o?prefix=... (listing, with generation, md5Hash,
+size, updated and downloadTokens like the real API, paginated by page_size)
+and GET /v0/b/<bucket>/o/<name>?alt=media (the object). Objects in
+stub.corrupt are served with one byte flipped, so their md5Hash no longer
+matches. stub.hits counts listings and downloads per object name, and
+stub.list_prefixes records the prefix of every listing.
+
+RtdbStub replaces the RTDB REST streaming endpoint (VISION_ML_RTDB_URL):
+every connection first gets the root "put" snapshot, like Firebase sends on
+each (re)connect, then whatever stub.send() broadcasts, with keep-alive
+events in between. stub.drop() closes every open stream.
+"""
+import base64
+import hashlib
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class StorageStub:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, page_size: int = 100):
+        self.host = host
+        self.port = port
+        self.page_size = max(1, int(page_size))
+
+        self._lock = threading.Lock()
+        # object name -> (data, generation, updated)
+        self._objects: Dict[str, Tuple[bytes, str, str]] = {}
+        self.corrupt: Set[str] = set()
+        self.hits: Dict[str, int] = {"list": 0}
+        self.list_prefixes: List[str] = []
+
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def put(self, name: str, data: bytes) -> None:
+        """Creates or overwrites an object; like Firebase, every write gets a new generation."""
+        now = time.time()
+        updated = datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+        with self._lock:
+            self._objects[name] = (bytes(data), str(time.time_ns()), updated)
+
+    def delete(self, name: str) -> None:
+        with self._lock:
+            self._objects.pop(name, None)
+
+    def downloads(self, name: str) -> int:
+        return self.hits.get(name, 0)
+
+    def _listing(self, prefix: str, page_token: str) -> Dict:
+        with self._lock:
+            names = sorted(n for n in self._objects if n.startswith(prefix))
+            start = int(page_token or 0)
+            page = names[start : start + self.page_size]
+            items = []
+            for n in page:
+                data, gen, updated = self._objects[n]
+                items.append(
+                    {
+                        "name": n,
+                        "generation": gen,
+                        "size": str(len(data)),
+                        "updated": updated,
+                        "md5Hash": base64.b64encode(hashlib.md5(data).digest()).decode("ascii"),
+                        "downloadTokens": "stub-token",
+                    }
+                )
+        out: Dict = {"items": items}
+        if start + self.page_size < len(names):
+            out["nextPageToken"] = str(start + self.page_size)
+        return out
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *_args) -> None:
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                u = urlparse(self.path)
+                q = parse_qs(u.query)
+                if u.path.endswith("/o"):
+                    stub.hits["list"] += 1
+                    stub.list_prefixes.append(q.get("prefix", [""])[0])
+                    listing = stub._listing(q.get("prefix", [""])[0], q.get("pageToken", [""])[0])
+                    self._send(200, json.dumps(listing).encode("utf-8"), "application/json")
+                    return
+
+                if "/o/" not in u.path:
+                    self._send(404, b"", "text/plain")
+                    return
+                name = unquote(u.path.rsplit("/o/", 1)[1])
+                with stub._lock:
+                    obj = stub._objects.get(name)
+                if obj is None:
+                    self._send(404, b"", "text/plain")
+                    return
+                stub.hits[name] = stub.hits.get(name, 0) + 1
+                body = obj[0]
+                if name in stub.corrupt and body:
+                    body = body[:-1] + bytes([body[-1] ^ 0xFF])
+                self._send(200, body, "application/octet-stream")
+
+        return Handler
+
+    def start(self) -> None:
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="storage-stub", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class RtdbStub:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, keepalive_s: float = 1.0):
+        self.host = host
+        self.port = port
+        self.keepalive_s = float(keepalive_s)
+        # Root snapshot sent to every new connection
+        self.snapshot: Any = None
+
+        self._lock = threading.Lock()
+        self._clients: List["queue.Queue[Optional[bytes]]"] = []
+        self.connections = 0
+
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/.json"
+
+    @staticmethod
+    def _event(name: str, data: Any) -> bytes:
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+    def send(self, event: str, path: str, data: Any) -> None:
+        """Broadcasts a put/patch of data at path to every open stream."""
+        msg = self._event(event, {"path": path, "data": data})
+        with self._lock:
+            for q in self._clients:
+                q.put(msg)
+
+    def drop(self) -> None:
+        """Closes every open stream; the listener has to reconnect."""
+        with self._lock:
+            for q in self._clients:
+                q.put(None)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.0"
+
+            def log_message(self, *_args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                q: "queue.Queue[Optional[bytes]]" = queue.Queue()
+                with stub._lock:
+                    stub._clients.append(q)
+                    stub.connections += 1
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.end_headers()
+                    self.wfile.write(stub._event("put", {"path": "/", "data": stub.snapshot}))
+                    self.wfile.flush()
+                    while True:
+                        try:
+                            msg = q.get(timeout=stub.keepalive_s)
+                        except queue.Empty:
+                            msg = stub._event("keep-alive", None)
+                        if msg is None:
+                            return
+                        self.wfile.write(msg)
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                finally:
+                    with stub._lock:
+                        stub._clients.remove(q)
+
+        return Handler
+
+    def start(self) -> None:
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="rtdb-stub", daemon=True).start()
+
+    def stop(self) -> None:
+        self.drop()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
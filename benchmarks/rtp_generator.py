@@ -0,0 +1,328 @@
+"""
+Synthetic RTP/H.264 camera: encodes arena frames and sends them over UDP the
+way the Raspberry Pi does, so ArenaCamRtpH264 can be exercised without one.
+
+Run from the repo root (needs gst-launch-1.0 with x264enc):
+    python -m benchmarks.rtp_generator [--port 5000] [--size 1280x720] [--fps 30]
+        [--bitrate 2500] [--loss 0.01] [--jitter-ms 5] [--recording recordings/run1]
+
+Frames come from benchmarks.synthetic_arena (a 30-frame loop of random robot
+poses) or from a recording made with camera.record_path. Every frame carries
+its sequence number as a block barcode in the top-left corner, which survives
+H.264 + JPEG, so a receiver can match what it decoded to what was sent.
+
+GStreamer only encodes and packetizes; its RTP packets come back over stdout
+(RFC 4571 length-prefixed) and Python sends them, which is where packet loss
+and jitter are injected.
+"""
+import argparse
+import heapq
+import random
+import socket
+import struct
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+FRAME_ID_BITS = 16
+FRAME_ID_CELL = 16  # px; large enough to survive 4:2:0 chroma + quantization
+
+
+def stamp_frame_id(bgr: np.ndarray, frame_id: int, cell: int = FRAME_ID_CELL) -> None:
+    """Draw frame_id (mod 2**16) as a row of black/white cells, framed by white guard cells."""
+    value = int(frame_id) % (1 << FRAME_ID_BITS)
+    n = FRAME_ID_BITS + 2
+    bgr[0:cell * 3, 0:cell * (n + 2)] = 255
+    for i in range(FRAME_ID_BITS):
+        if (value >> (FRAME_ID_BITS - 1 - i)) & 1:
+            x = cell * (i + 2)
+            bgr[cell:cell * 2, x:x + cell] = 0
+
+
+def read_frame_id(img: np.ndarray, cell: int = FRAME_ID_CELL) -> int:
+    """Inverse of stamp_frame_id; img may be BGR or grayscale, at full resolution."""
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    value = 0
+    half = cell // 2
+    for i in range(FRAME_ID_BITS):
+        x = cell * (i + 2) + half
+        patch = gray[cell + half // 2:cell * 2 - half // 2, x - half // 2:x + half // 2]
+        value = (value << 1) | (1 if float(patch.mean()) < 128.0 else 0)
+    return value
+
+
+@dataclass
+class GeneratorConfig:
+    host: str = "127.0.0.1"
+    port: int = 5000
+    width: int = 1280
+    height: int = 720
+    fps: float = 30.0
+    bitrate_kbps: int = 2500
+    key_int: int = 60  # frames between IDR frames
+    rtp_payload: int = 96
+    mtu: int = 1400
+    loss: float = 0.0  # probability of dropping each RTP packet
+    jitter_ms: float = 0.0  # each packet is delayed uniformly in [0, jitter_ms]
+    recording: str = ""  # replay this recording instead of synthetic frames
+    seed: int = 0
+
+
+class RtpH264Generator:
+    """
+    Paces frames into a gst-launch x264 encoder at cfg.fps and sends the
+    resulting RTP packets to cfg.host:cfg.port with optional loss/jitter.
+
+    sent_at[frame_id] is the time.time() at which each frame entered the
+    encoder, i.e. the simulated capture time.
+    """
+
+    def __init__(self, cfg: GeneratorConfig):
+        self.cfg = cfg
+        self.sent_at: Dict[int, float] = {}
+        self.frames_sent = 0
+        self.packets_sent = 0
+        self.packets_dropped = 0
+
+        self._rng = random.Random(cfg.seed)
+        self._proc: Optional[subprocess.Popen] = None
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._heap: List[Tuple[float, int, bytes]] = []
+        self._heap_cv = threading.Condition()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _encoder_cmd(self) -> List[str]:
+        c = self.cfg
+        return [
+            "gst-launch-1.0",
+            "-q",
+            "fdsrc",
+            "fd=0",
+            "!",
+            "rawvideoparse",
+            f"width={int(c.width)}",
+            f"height={int(c.height)}",
+            "format=bgr",
+            f"framerate={int(round(c.fps))}/1",
+            "!",
+            "videoconvert",
+            "!",
+            "x264enc",
+            "tune=zerolatency",
+            "speed-preset=ultrafast",
+            f"bitrate={int(c.bitrate_kbps)}",
+            f"key-int-max={int(c.key_int)}",
+            "!",
+            "video/x-h264,profile=baseline",
+            "!",
+            "rtph264pay",
+            "config-interval=1",
+            f"pt={int(c.rtp_payload)}",
+            f"mtu={int(c.mtu)}",
+            "!",
+            "rtpstreampay",
+            "!",
+            "fdsink",
+            "fd=1",
+        ]
+
+    def _frames(self) -> Iterator[np.ndarray]:
+        size = (int(self.cfg.width), int(self.cfg.height))
+        if self.cfg.recording:
+            from communications.recording import FrameRecording
+
+            with FrameRecording(self.cfg.recording) as rec:
+                if len(rec) == 0:
+                    raise ValueError(f"Recording {self.cfg.recording} has no frames")
+                while True:
+                    for jpeg, _ts in rec:
+                        bgr = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                        if bgr is None:
+                            continue
+                        if (bgr.shape[1], bgr.shape[0]) != size:
+                            bgr = cv2.resize(bgr, size, interpolation=cv2.INTER_AREA)
+                        yield bgr
+
+        from benchmarks.synthetic_arena import ArenaScene, SceneConfig
+
+        scene = ArenaScene(SceneConfig(frame_width=size[0], frame_height=size[1]), seed=self.cfg.seed)
+        # Pre-render a short loop; rendering is slower than real time at high resolutions
+        loop = []
+        for _ in range(30):
+            scene.randomize_robots()
+            loop.append(scene.render())
+        while True:
+            yield from loop
+
+    def start(self) -> None:
+        if self._proc is not None:
+            return
+        self._proc = subprocess.Popen(
+            self._encoder_cmd(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0,
+        )
+        for target, name in (
+            (self._feed_loop, "rtpgen-feed"),
+            (self._packet_loop, "rtpgen-packets"),
+            (self._send_loop, "rtpgen-send"),
+        ):
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._heap_cv:
+            self._heap_cv.notify_all()
+        if self._proc is not None:
+            try:
+                self._proc.terminate()
+                self._proc.wait(2.0)
+            except Exception:
+                self._proc.kill()
+            self._proc = None
+        for t in self._threads:
+            t.join(2.0)
+        self._threads = []
+        self._sock.close()
+
+    def _feed_loop(self) -> None:
+        assert self._proc is not None and self._proc.stdin is not None
+        stdin = self._proc.stdin  # stop() clears self._proc
+        period = 1.0 / max(1e-3, float(self.cfg.fps))
+        next_due = time.perf_counter()
+        for frame_id, bgr in enumerate(self._frames()):
+            if self._stop.is_set():
+                break
+            delay = next_due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_due += period
+
+            # Stamping in place is fine: the barcode area is fully redrawn every frame
+            frame = np.ascontiguousarray(bgr)
+            stamp_frame_id(frame, frame_id)
+            self.sent_at[frame_id % (1 << FRAME_ID_BITS)] = time.time()
+            try:
+                stdin.write(frame.tobytes())
+            except (OSError, ValueError):
+                break
+            self.frames_sent += 1
+
+    @staticmethod
+    def _read_exact(stream, n: int) -> Optional[bytes]:
+        out = b""
+        while len(out) < n:
+            chunk = stream.read(n - len(out))
+            if not chunk:
+                return None
+            out += chunk
+        return out
+
+    def _packet_loop(self) -> None:
+        assert self._proc is not None and self._proc.stdout is not None
+        stdout = self._proc.stdout
+        seq = 0
+        jitter_s = max(0.0, float(self.cfg.jitter_ms)) / 1000.0
+        while not self._stop.is_set():
+            header = self._read_exact(stdout, 2)
+            if header is None:
+                break
+            packet = self._read_exact(stdout, struct.unpack(">H", header)[0])
+            if packet is None:
+                break
+
+            if self.cfg.loss > 0 and self._rng.random() < self.cfg.loss:
+                self.packets_dropped += 1
+                continue
+            due = time.perf_counter() + (self._rng.uniform(0.0, jitter_s) if jitter_s else 0.0)
+            with self._heap_cv:
+                heapq.heappush(self._heap, (due, seq, packet))
+                self._heap_cv.notify()
+            seq += 1
+
+    def _send_loop(self) -> None:
+        addr = (self.cfg.host, int(self.cfg.port))
+        while True:
+            with self._heap_cv:
+                while not self._heap and not self._stop.is_set():
+                    self._heap_cv.wait()
+                if self._stop.is_set():
+                    return
+                due, _seq, packet = self._heap[0]
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    # A packet with an earlier due time may arrive meanwhile
+                    self._heap_cv.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+            try:
+                self._sock.sendto(packet, addr)
+                self.packets_sent += 1
+            except OSError:
+                pass
+
+
+def add_generator_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5000)
+    ap.add_argument("--size", default="1280x720", help="WIDTHxHEIGHT")
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--bitrate", type=int, default=2500, help="kbit/s")
+    ap.add_argument("--key-int", type=int, default=60, help="frames between IDR frames")
+    ap.add_argument("--loss", type=float, default=0.0, help="RTP packet loss probability (0..1)")
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--recording", default="", help="replay a recording instead of synthetic frames")
+    ap.add_argument("--seed", type=int, default=0)
+
+
+def generator_config(args: argparse.Namespace) -> GeneratorConfig:
+    w, h = (int(v) for v in args.size.lower().split("x"))
+    return GeneratorConfig(
+        host=args.host,
+        port=args.port,
+        width=w,
+        height=h,
+        fps=args.fps,
+        bitrate_kbps=args.bitrate,
+        key_int=args.key_int,
+        loss=args.loss,
+        jitter_ms=args.jitter_ms,
+        recording=args.recording,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_generator_args(ap)
+    ap.add_argument("--seconds", type=float, default=0.0, help="stop after this long (0 = until Ctrl+C)")
+    args = ap.parse_args()
+
+    gen = RtpH264Generator(generator_config(args))
+    gen.start()
+    started = time.perf_counter()
+    try:
+        while not args.seconds or time.perf_counter() - started < args.seconds:
+            time.sleep(1.0)
+            print(
+                f"frames {gen.frames_sent}  packets {gen.packets_sent}  dropped {gen.packets_dropped}",
+                flush=True,
+            )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gen.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Synthetic arena frames with known marker poses, for benchmarks that must run
+without a camera.
+
+The arena is drawn top-down (corner markers 0-3 placed like ArenaConfig's
+defaults, robot markers at random poses), then warped through a tilted-camera
+homography so detection and cropping see realistic perspective.
+
+    scene = ArenaScene(seed=0)
+    frame = scene.render()          # BGR image
+    scene.poses                     # marker id -> (x, y, theta) ground truth
+"""
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from vision.arena import ArenaConfig
+
+Pose = Tuple[float, float, float]
+
+
+@dataclass
+class SceneConfig:
+    frame_width: int = 1280
+    frame_height: int = 720
+    robots: int = 8
+    marker_size_m: float = 0.15
+    px_per_m: float = 300.0  # top-down canvas resolution before the camera warp
+    margin_m: float = 0.3
+    # Camera tilt: the far (top) edge of the arena is this much narrower than the near edge
+    keystone: float = 0.18
+    noise_sigma: float = 4.0
+    blur: bool = True
+    arena: ArenaConfig = field(default_factory=ArenaConfig)
+
+
+def _marker_corners_arena(pose: Pose, size: float) -> np.ndarray:
+    """Arena-space corners (TL, TR, BR, BL) of a marker whose origin (BL) is at pose."""
+    x, y, theta = pose
+    up = np.array([math.cos(theta), math.sin(theta)])
+    right = np.array([math.sin(theta), -math.cos(theta)])
+    bl = np.array([x, y])
+    tl = bl + size * up
+    return np.array([tl, tl + size * right, bl + size * right, bl], dtype=np.float32)
+
+
+class ArenaScene:
+    def __init__(self, cfg: Optional[SceneConfig] = None, seed: int = 0):
+        self.cfg = cfg or SceneConfig()
+        self.rng = np.random.default_rng(seed)
+        self.dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_1000)
+
+        a = self.cfg.arena
+        self.x_max = float(a.arena_tr[0])
+        self.y_max = float(a.arena_tr[1])
+        self.poses: Dict[int, Pose] = {
+            a.id_bl: (a.arena_bl[0], a.arena_bl[1], math.pi / 2),
+            a.id_tl: (a.arena_tl[0], a.arena_tl[1], math.pi / 2),
+            a.id_tr: (a.arena_tr[0], a.arena_tr[1], math.pi / 2),
+            a.id_br: (a.arena_br[0], a.arena_br[1], math.pi / 2),
+        }
+        # Corner markers sit outside the arena bounds except for their origin
+        self.corner_ids = set(self.poses.keys())
+
+        ids = self.rng.choice(np.arange(4, 1000), size=self.cfg.robots, replace=False)
+        self.robot_ids: List[int] = [int(i) for i in ids]
+        self.randomize_robots()
+
+        self._H_cam = self._camera_homography()
+        self._background = self._render_background()
+
+    # -------------------- Geometry --------------------
+
+    def _canvas_size(self) -> Tuple[int, int]:
+        c = self.cfg
+        w = int(round((self.x_max + 2 * c.margin_m) * c.px_per_m))
+        h = int(round((self.y_max + 2 * c.margin_m) * c.px_per_m))
+        return w, h
+
+    def _arena_to_canvas(self, pts: np.ndarray) -> np.ndarray:
+        c = self.cfg
+        out = np.empty_like(pts, dtype=np.float32)
+        out[:, 0] = (pts[:, 0] + c.margin_m) * c.px_per_m
+        out[:, 1] = (self.y_max + c.margin_m - pts[:, 1]) * c.px_per_m
+        return out
+
+    def _camera_homography(self) -> np.ndarray:
+        cw, ch = self._canvas_size()
+        fw, fh = self.cfg.frame_width, self.cfg.frame_height
+        k = float(self.cfg.keystone)
+
+        # Fit the canvas into the frame (keeping aspect), then pull the top edge in
+        scale = min(fw / cw, fh / ch) * 0.95
+        w, h = cw * scale, ch * scale
+        x0, y0 = (fw - w) / 2.0, (fh - h) / 2.0
+        src = np.array([[0, 0], [cw, 0], [cw, ch], [0, ch]], dtype=np.float32)
+        dst = np.array(
+            [[x0 + w * k / 2, y0], [x0 + w * (1 - k / 2), y0], [x0 + w, y0 + h], [x0, y0 + h]],
+            dtype=np.float32,
+        )
+        return cv2.getPerspectiveTransform(src, dst)
+
+    def randomize_robots(self) -> None:
+        """New random, non-overlapping poses for the robot markers (corner markers stay put)."""
+        s = self.cfg.marker_size_m
+        placed: List[np.ndarray] = []
+        for mid in self.robot_ids:
+            for _ in range(200):
+                x = float(self.rng.uniform(s * 1.5, self.x_max - s * 1.5))
+                y = float(self.rng.uniform(s * 1.5, self.y_max - s * 1.5))
+                if all(np.hypot(*(p - (x, y))) > s * 2.2 for p in placed):
+                    break
+            theta = float(self.rng.uniform(-math.pi, math.pi))
+            placed.append(np.array([x, y]))
+            self.poses[mid] = (x, y, theta)
+
+    # -------------------- Rendering --------------------
+
+    def _render_background(self) -> np.ndarray:
+        cw, ch = self._canvas_size()
+        yy, xx = np.mgrid[0:ch, 0:cw]
+        floor = (150 + 30 * np.sin(xx / 97.0) * np.cos(yy / 71.0)).astype(np.uint8)
+        canvas = cv2.merge([floor, floor, (floor.astype(np.int16) - 10).clip(0, 255).astype(np.uint8)])
+        outline = np.array([[0, 0], [0, self.y_max], [self.x_max, self.y_max], [self.x_max, 0]], dtype=np.float32)
+        border = self._arena_to_canvas(outline)
+        cv2.polylines(canvas, [border.astype(np.int32)], True, (60, 60, 60), 3)
+        return canvas
+
+    def _marker_image(self, marker_id: int, px: int) -> np.ndarray:
+        # One-cell white quiet zone around the 6x6 (4x4 + border) marker
+        inner = cv2.aruco.generateImageMarker(self.dictionary, marker_id, px * 6 // 8)
+        lo = (px - inner.shape[0]) // 2
+        hi = px - inner.shape[0] - lo
+        img = cv2.copyMakeBorder(inner, lo, hi, lo, hi, cv2.BORDER_CONSTANT, value=255)
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+
+    def render(self) -> np.ndarray:
+        """BGR camera frame of the current poses."""
+        c = self.cfg
+        canvas = self._background.copy()
+        px = max(16, int(round(c.marker_size_m * c.px_per_m * 8 / 6)))
+        quiet = c.marker_size_m / 6.0  # the quiet zone extends past the marker's own corners
+
+        for mid, pose in self.poses.items():
+            marker = self._marker_image(mid, px)
+            x, y, theta = pose
+            up = np.array([math.cos(theta), math.sin(theta)])
+            right = np.array([math.sin(theta), -math.cos(theta)])
+            # Shift the origin so the black marker (not the quiet zone) lands on pose
+            origin = np.array([x, y]) - quiet * (up + right)
+            quad = _marker_corners_arena((origin[0], origin[1], theta), c.marker_size_m + 2 * quiet)
+            corners = self._arena_to_canvas(quad)
+            # Warp into the marker's bounding box only, not the whole canvas
+            x0, y0 = np.floor(corners.min(axis=0)).astype(int)
+            x1, y1 = np.ceil(corners.max(axis=0)).astype(int) + 1
+            x0, y0 = max(0, x0), max(0, y0)
+            x1, y1 = min(canvas.shape[1], x1), min(canvas.shape[0], y1)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            src = np.array([[0, 0], [px, 0], [px, px], [0, px]], dtype=np.float32)
+            M = cv2.getPerspectiveTransform(src, corners - np.array([x0, y0], dtype=np.float32))
+            roi = canvas[y0:y1, x0:x1]
+            cv2.warpPerspective(marker, M, (x1 - x0, y1 - y0), dst=roi, borderMode=cv2.BORDER_TRANSPARENT)
+
+        frame = cv2.warpPerspective(canvas, self._H_cam, (c.frame_width, c.frame_height), borderValue=(40, 40, 40))
+        if c.blur:
+            frame = cv2.GaussianBlur(frame, (3, 3), 0)
+        if c.noise_sigma > 0:
+            noise = self.rng.normal(0.0, c.noise_sigma, frame.shape)
+            frame = np.clip(frame.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+        return frame
+
+    def render_jpeg(self, quality: int = 85) -> bytes:
+        ok, buf = cv2.imencode(".jpg", self.render(), [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+        assert ok
+        return buf.tobytes()
+
+
+def pose_errors(truth: Dict[int, Pose], measured: Dict[int, Pose]) -> Dict[str, float]:
+    """Position (m) and heading (rad) error of measured robot poses vs ground truth."""
+    pos: List[float] = []
+    ang: List[float] = []
+    missing = 0
+    for mid, (x, y, theta) in truth.items():
+        got = measured.get(mid)
+        if got is None or got == (-1.0, -1.0, -1.0):
+            missing += 1
+            continue
+        pos.append(math.hypot(got[0] - x, got[1] - y))
+        ang.append(abs((got[2] - theta + math.pi) % (2 * math.pi) - math.pi))
+    return {
+        "detected": float(len(pos)),
+        "missing": float(missing),
+        "pos_err_mean_m": float(np.mean(pos)) if pos else float("nan"),
+        "pos_err_max_m": float(np.max(pos)) if pos else float("nan"),
+        "theta_err_mean_rad": float(np.mean(ang)) if ang else float("nan"),
+        "theta_err_max_rad": float(np.max(ang)) if ang else float("nan"),
+    }
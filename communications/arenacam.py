@@ -1,27 +1,78 @@
 import asyncio
 import subprocess
-from dataclasses import dataclass
-from typing import Optional
-
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from communications.gst_pipeline import GstDecodeConfig, build_decode_cmd, select_decoder
+from communications.recording import FrameRecorder, FrameRecording
+from utils.executors import run_blocking
 from utils.logging import get_logger
+from utils.metrics import counter, gauge, histogram
+
+_M_EXTRACT = histogram("arenacam_jpeg_extract_seconds", "Time to split decoder output into JPEG frames, per read")
+
+# Per read from the decoder pipe; 64 KiB covers most of a 720p JPEG in one executor hop
+READ_CHUNK_BYTES = 65536
 
 
 @dataclass
 class ArenaCamConfig:
-    mode: str = "rtp_h264"  # "rtp_h264" or "udp_jpeg"
+    mode: str = "rtp_h264"  # "rtp_h264", "udp_jpeg" or "replay"
     bind_ip: str = "0.0.0.0"
     bind_port: int = 5000
     rtp_payload: int = 96
+    record_path: str = ""  # when set, live frames are also appended to this recording
+    replay_path: str = ""  # recording played back in "replay" mode
+    replay_speed: str = "realtime"  # "realtime", "max" or "step"
+    replay_rate: float = 1.0  # realtime playback speed multiplier
+    replay_loop: bool = True
+    decode: GstDecodeConfig = field(default_factory=GstDecodeConfig)  # rtp_h264 pipeline
 
 
 class ArenaCamBase:
     def __init__(self):
         self._latest_frame: Optional[bytes] = None
+        self._latest_frame_ts: Optional[float] = None
+        self._recorder: Optional[FrameRecorder] = None
+        self._frame_listeners: List[Callable[[bytes, float], None]] = []
+        self._m_frames = counter("arenacam_frames_total", "Frames received from the camera", source=type(self).__name__)
+        self._m_frame_bytes = gauge("arenacam_frame_bytes", "Size of the latest camera JPEG", source=type(self).__name__)
 
     @property
     def latest_frame(self) -> Optional[bytes]:
         return self._latest_frame
 
+    @property
+    def latest_frame_ts(self) -> Optional[float]:
+        """Capture time (time.time()) of latest_frame."""
+        return self._latest_frame_ts
+
+    def _publish(self, jpeg: bytes, ts: Optional[float] = None) -> None:
+        self._latest_frame = jpeg
+        self._latest_frame_ts = time.time() if ts is None else ts
+        self._m_frames.inc()
+        self._m_frame_bytes.set(len(jpeg))
+        if self._recorder is not None:
+            self._recorder.write(jpeg, self._latest_frame_ts)
+        for listener in self._frame_listeners:
+            listener(jpeg, self._latest_frame_ts)
+
+    def add_frame_listener(self, listener: Callable[[bytes, float], None]) -> None:
+        """Call listener(jpeg, ts) on the event loop for every new frame."""
+        self._frame_listeners.append(listener)
+
+    def _start_recorder(self, path: str) -> None:
+        if path and self._recorder is None:
+            self._recorder = FrameRecorder(path)
+            self._recorder.start()
+
+    def _stop_recorder(self) -> None:
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+
     async def start(self) -> None:
         raise NotImplementedError
 
@@ -60,13 +111,14 @@ class ArenaCamUDPJPEG(ArenaCamBase):
 
         def on_datagram(data: bytes, addr):
             if self._looks_like_jpeg(data):
-                self._latest_frame = data
+                self._publish(data)
 
         class _Proto(asyncio.DatagramProtocol):
             def datagram_received(self, data: bytes, addr):
                 on_datagram(data, addr)
 
         self._logger.info(f"Starting UDP-JPEG receiver on {self.cfg.bind_ip}:{self.cfg.bind_port}")
+        self._start_recorder(self.cfg.record_path)
         transport, _ = await loop.create_datagram_endpoint(
             lambda: _Proto(),
             local_addr=(self.cfg.bind_ip, self.cfg.bind_port),
@@ -79,6 +131,7 @@ class ArenaCamUDPJPEG(ArenaCamBase):
             return
         self._transport.close()
         self._transport = None
+        self._stop_recorder()
         self._logger.info("UDP-JPEG receiver stopped")
 
 
@@ -86,8 +139,8 @@ class ArenaCamRtpH264(ArenaCamBase):
     """
     Receives RTP/H.264 over UDP and decodes into JPEG frames using a GStreamer subprocess.
 
-    Pipeline (conceptually):
-      udpsrc ! application/x-rtp(H264) ! rtph264depay ! avdec_h264 ! jpegenc ! fdsink
+    Pipeline (conceptually; built by communications/gst_pipeline.py from cfg.decode):
+      udpsrc ! application/x-rtp(H264) ! rtph264depay ! <decoder> ! [scale] ! jpegenc ! fdsink
 
     Python reads concatenated JPEGs from stdout and extracts frames by SOI/EOI markers.
     """
@@ -101,31 +154,10 @@ class ArenaCamRtpH264(ArenaCamBase):
         self._running = False
 
     def _gst_cmd(self) -> list[str]:
-        caps = (
-            f"application/x-rtp,media=video,encoding-name=H264,payload={int(self.cfg.rtp_payload)}"
-        )
-
+        # Probes installed elements with gst-inspect-1.0; start() runs this on the io pool
+        decoder = select_decoder(self.cfg.decode)
         # Note: bind_ip is not strictly required for udpsrc; port is key.
-        # We keep it simple and bind to the port.
-        return [
-            "gst-launch-1.0",
-            "-q",
-            "udpsrc",
-            f"port={int(self.cfg.bind_port)}",
-            f"caps={caps}",
-            "!",
-            "rtph264depay",
-            "!",
-            "h264parse",
-            "!",
-            "avdec_h264",
-            "!",
-            "videoconvert",
-            "!",
-            "jpegenc",
-            "!",
-            "fdsink",
-        ]
+        return build_decode_cmd(self.cfg.decode, self.cfg.bind_port, self.cfg.rtp_payload, decoder)
 
     @staticmethod
     def _extract_jpegs_from_buffer(buf: bytearray) -> list[bytes]:
@@ -160,7 +192,7 @@ class ArenaCamRtpH264(ArenaCamBase):
             self._logger.warn("Already started")
             return
 
-        cmd = self._gst_cmd()
+        cmd = await run_blocking("io", self._gst_cmd)
         self._logger.info("Starting GStreamer decode pipeline for RTP/H264")
         self._logger.info("GStreamer cmd: " + " ".join(cmd))
 
@@ -179,44 +211,52 @@ class ArenaCamRtpH264(ArenaCamBase):
             raise RuntimeError("Failed to open stdout from gstreamer process")
 
         self._running = True
+        self._start_recorder(self.cfg.record_path)
         self._task = asyncio.create_task(self._reader_loop())
 
-        # Also watch stderr to help debugging if pipeline fails
-        asyncio.create_task(self._stderr_watcher())
+        # Also watch stderr to help debugging if pipeline fails. Its own thread, not the io pool:
+        # gst-launch -q is usually silent, so this read blocks for the pipeline's whole life
+        threading.Thread(target=self._drain_stderr, args=(self._proc.stderr,), name="gst-stderr", daemon=True).start()
 
         self._logger.info("ArenaCam RTP/H264 started")
 
-    async def _stderr_watcher(self) -> None:
-        if self._proc is None or self._proc.stderr is None:
+    def _drain_stderr(self, stderr) -> None:
+        if stderr is None:
             return
-
-        loop = asyncio.get_running_loop()
-        while self._running and self._proc.poll() is None:
-            line = await loop.run_in_executor(None, self._proc.stderr.readline)
-            if not line:
-                await asyncio.sleep(0.05)
-                continue
-            # Only show in DEBUG unless user raised log level
-            self._logger.debug("GST: " + line.decode("utf-8", errors="replace").rstrip())
+        try:
+            for line in iter(stderr.readline, b""):
+                # Only show in DEBUG unless user raised log level
+                self._logger.debug("GST: " + line.decode("utf-8", errors="replace").rstrip())
+        except (OSError, ValueError):
+            pass  # pipe closed by stop()
+
+    @classmethod
+    def _read_jpegs(cls, stdout, buf: bytearray) -> Optional[list[bytes]]:
+        """One read from the pipe plus JPEG extraction, on the io pool; None when nothing was read."""
+        # Unbuffered pipe: returns whatever is available, up to a whole frame or two
+        chunk = stdout.read(READ_CHUNK_BYTES)
+        if not chunk:
+            return None
+        buf.extend(chunk)
+        with _M_EXTRACT.time():
+            return cls._extract_jpegs_from_buffer(buf)
 
     async def _reader_loop(self) -> None:
         assert self._proc is not None
         assert self._proc.stdout is not None
 
-        loop = asyncio.get_running_loop()
+        stdout = self._proc.stdout
         buf = bytearray()
         frames = 0
 
         while self._running and self._proc.poll() is None:
-            chunk = await loop.run_in_executor(None, self._proc.stdout.read, 4096)
-            if not chunk:
+            extracted = await run_blocking("io", self._read_jpegs, stdout, buf)
+            if extracted is None:
                 await asyncio.sleep(0.001)
                 continue
 
-            buf.extend(chunk)
-            extracted = self._extract_jpegs_from_buffer(buf)
             for jpg in extracted:
-                self._latest_frame = jpg
+                self._publish(jpg)
                 frames += 1
                 if frames % 60 == 0:
                     self._logger.debug(f"Decoded {frames} JPEG frames")
@@ -235,18 +275,130 @@ class ArenaCamRtpH264(ArenaCamBase):
 
         if self._proc is not None:
             self._logger.info("Stopping GStreamer pipeline")
+            proc = self._proc
             try:
-                self._proc.terminate()
+                proc.terminate()
             except Exception:
                 pass
+            # Wait for exit so udpsrc releases the port (a soft restart rebinds it right away)
+            try:
+                await asyncio.to_thread(proc.wait, 1.5)
+            except Exception:
+                try:
+                    proc.kill()
+                except Exception:
+                    pass
             self._proc = None
 
+        self._stop_recorder()
         self._logger.info("ArenaCam RTP/H264 stopped")
 
 
+class ArenaCamReplay(ArenaCamBase):
+    """
+    Plays back a recording made with record_path, for reproducing problems and
+    benchmarking without a camera.
+
+    replay_speed:
+      - "realtime": frames are published with their recorded spacing (/ replay_rate)
+      - "max": frames are published back to back, yielding to the loop in between
+      - "step": a frame is published only when step() is called
+    """
+
+    def __init__(self, cfg: ArenaCamConfig):
+        super().__init__()
+        self.cfg = cfg
+        self._logger = get_logger("ArenaCamReplay")
+        self._recording: Optional[FrameRecording] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pos = 0
+        self.frames_published = 0
+        self.finished = False
+
+    async def start(self) -> None:
+        if self._recording is not None:
+            self._logger.warn("Already started")
+            return
+        if not self.cfg.replay_path:
+            raise ValueError("replay mode requires camera.replay_path")
+
+        self._recording = FrameRecording(self.cfg.replay_path)
+        if len(self._recording) == 0:
+            raise ValueError(f"Recording {self.cfg.replay_path} has no frames")
+
+        speed = (self.cfg.replay_speed or "realtime").strip().lower()
+        self._logger.info(
+            f"Replaying {len(self._recording)} frames ({self._recording.duration:.1f}s) "
+            f"from {self.cfg.replay_path} [{speed}]"
+        )
+        if speed != "step":
+            self._task = asyncio.create_task(self._play_loop(speed == "max"))
+
+    def step(self, n: int = 1) -> bool:
+        """Publish the next n frames; False once the recording is exhausted (and not looping)."""
+        for _ in range(max(1, int(n))):
+            if not self._advance():
+                return False
+        return True
+
+    def _advance(self) -> bool:
+        assert self._recording is not None
+        if self._pos >= len(self._recording):
+            if not self.cfg.replay_loop:
+                self.finished = True
+                return False
+            self._pos = 0
+        jpeg, ts = self._recording[self._pos]
+        self._pos += 1
+        # Frames carry their recorded capture time so latency math matches the original run
+        self._publish(jpeg, ts)
+        self.frames_published += 1
+        return True
+
+    async def _play_loop(self, max_speed: bool) -> None:
+        assert self._recording is not None
+        rate = max(1e-3, float(self.cfg.replay_rate))
+        try:
+            while True:
+                start_pos = self._pos
+                t0 = time.perf_counter()
+                ts0 = float(self._recording.index["ts"][start_pos])
+                while self._pos < len(self._recording):
+                    if not max_speed:
+                        due = t0 + (float(self._recording.index["ts"][self._pos]) - ts0) / rate
+                        delay = due - time.perf_counter()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    self._advance()
+                    if max_speed:
+                        await asyncio.sleep(0)
+                if not self.cfg.replay_loop:
+                    self.finished = True
+                    self._logger.info("Replay finished")
+                    return
+                self._pos = 0
+        except asyncio.CancelledError:
+            return
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._recording is not None:
+            self._recording.close()
+            self._recording = None
+        self._logger.info("ArenaCam replay stopped")
+
+
 def create_arenacam(cfg: ArenaCamConfig) -> ArenaCamBase:
     mode = (cfg.mode or "").strip().lower()
     if mode == "udp_jpeg":
         return ArenaCamUDPJPEG(cfg)
+    if mode == "replay":
+        return ArenaCamReplay(cfg)
     # default
     return ArenaCamRtpH264(cfg)
@@ -0,0 +1,143 @@
+"""
+Builds the gst-launch command ArenaCamRtpH264 decodes with, from a
+GstDecodeConfig (camera.decode in config.json):
+
+    udpsrc ! rtp caps [! rtpjitterbuffer] ! rtph264depay ! h264parse
+      [! queue] ! <decoder> [! queue] [! videorate ! caps] [! videoscale ! caps]
+      ! videoconvert ! [queue !] jpegenc ! fdsink
+
+Each queue starts a new streaming thread, so depay, decode and
+convert + encode run in parallel instead of one after the other. The queue
+after the decoder is leaky by default: when conversion falls behind, old
+decoded frames are dropped rather than adding latency. The one in front of
+the decoder never is, since a dropped H.264 frame corrupts every frame that
+references it until the next keyframe. Rate and size are reduced before
+videoconvert, so conversion and JPEG encode only handle the pixels the
+vision loop uses.
+
+decoder="auto" probes which H.264 decoders are installed (gst-inspect-1.0)
+and takes the first of CPU_DECODERS. Hardware decoders (vah264dec,
+v4l2h264dec, nvh264dec, ...) can be named explicitly.
+"""
+import functools
+import os
+import shutil
+import subprocess
+from dataclasses import dataclass
+from typing import List, Optional
+
+from utils.logging import get_logger
+
+# Software H.264 decoders, fastest first: libav decodes with frame/slice
+# threads, openh264 on a single thread
+CPU_DECODERS = ("avdec_h264", "openh264dec")
+
+QUEUE_LEAKY = ("no", "upstream", "downstream")
+
+
+@dataclass
+class GstDecodeConfig:
+    decoder: str = "auto"  # "auto" or a GStreamer element name
+    max_threads: int = 0  # decoder / videoconvert threads; 0 = one per core
+    queues: bool = True  # queue elements between stages
+    queue_leaky: str = "downstream"  # "no", "upstream" or "downstream"
+    queue_max_buffers: int = 2
+    width: int = 0  # scale to this size before conversion; 0 = camera size
+    height: int = 0  # 0 with a width set = keep the camera's aspect ratio
+    framerate: int = 0  # drop to this rate before conversion; 0 = camera rate
+    jpeg_quality: int = 85
+    jitterbuffer_ms: int = 0  # rtpjitterbuffer latency; 0 = no jitter buffer
+
+
+@functools.lru_cache(maxsize=None)
+def _inspect(element: str) -> Optional[str]:
+    """gst-inspect-1.0 output for element, or None if it (or GStreamer) is not installed."""
+    if shutil.which("gst-inspect-1.0") is None:
+        return None
+    try:
+        out = subprocess.run(
+            ["gst-inspect-1.0", element],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=10.0,
+            check=False,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if out.returncode != 0:
+        return None
+    return out.stdout.decode("utf-8", errors="replace")
+
+
+def has_element(element: str) -> bool:
+    return _inspect(element) is not None
+
+
+def has_property(element: str, prop: str) -> bool:
+    text = _inspect(element)
+    if text is None:
+        return False
+    # Properties are listed as "  name  : description"
+    return any(line.strip().startswith(prop + " ") or line.strip().startswith(prop + ":") for line in text.splitlines())
+
+
+def select_decoder(cfg: GstDecodeConfig) -> str:
+    """
+    The decoder element to use. Probes with gst-inspect-1.0, so call it off
+    the event loop; results are cached for the life of the process.
+    """
+    logger = get_logger("gst_pipeline")
+    if cfg.decoder and cfg.decoder != "auto":
+        if not has_element(cfg.decoder):
+            logger.warn(f"Decoder {cfg.decoder} not found by gst-inspect-1.0; trying it anyway")
+        return cfg.decoder
+
+    for element in CPU_DECODERS:
+        if has_element(element):
+            return element
+    logger.warn(f"None of {', '.join(CPU_DECODERS)} found by gst-inspect-1.0; falling back to {CPU_DECODERS[0]}")
+    return CPU_DECODERS[0]
+
+
+def _threads(cfg: GstDecodeConfig) -> int:
+    return int(cfg.max_threads) if cfg.max_threads > 0 else (os.cpu_count() or 1)
+
+
+def _queue(cfg: GstDecodeConfig, leaky: bool) -> List[str]:
+    if not cfg.queues:
+        return []
+    out = ["queue", f"max-size-buffers={max(1, int(cfg.queue_max_buffers))}", "max-size-bytes=0", "max-size-time=0"]
+    if leaky and cfg.queue_leaky in QUEUE_LEAKY and cfg.queue_leaky != "no":
+        out.append(f"leaky={cfg.queue_leaky}")
+    return out + ["!"]
+
+
+def build_decode_cmd(cfg: GstDecodeConfig, bind_port: int, rtp_payload: int, decoder: str) -> List[str]:
+    """gst-launch-1.0 argv for RTP/H.264 on bind_port -> concatenated JPEGs on stdout."""
+    caps = f"application/x-rtp,media=video,encoding-name=H264,payload={int(rtp_payload)}"
+    cmd = ["gst-launch-1.0", "-q", "udpsrc", f"port={int(bind_port)}", f"caps={caps}", "!"]
+    if cfg.jitterbuffer_ms > 0:
+        cmd += ["rtpjitterbuffer", f"latency={int(cfg.jitterbuffer_ms)}", "!"]
+    cmd += ["rtph264depay", "!", "h264parse", "!"]
+
+    cmd += _queue(cfg, leaky=False)
+    cmd.append(decoder)
+    # avdec_h264 defaults to libav's own choice; 0 there means "auto" as well
+    if decoder.startswith("avdec_") and cfg.max_threads > 0:
+        cmd.append(f"max-threads={int(cfg.max_threads)}")
+    cmd.append("!")
+    cmd += _queue(cfg, leaky=True)
+
+    if cfg.framerate > 0:
+        cmd += ["videorate", "drop-only=true", "!", f"video/x-raw,framerate={int(cfg.framerate)}/1", "!"]
+    if cfg.width > 0:
+        size = f"width={int(cfg.width)}" + (f",height={int(cfg.height)}" if cfg.height > 0 else "")
+        cmd += ["videoscale", "!", f"video/x-raw,{size}", "!"]
+
+    cmd.append("videoconvert")
+    if has_property("videoconvert", "n-threads"):
+        cmd.append(f"n-threads={_threads(cfg)}")
+    cmd.append("!")
+    cmd += _queue(cfg, leaky=False)
+    cmd += ["jpegenc", f"quality={int(cfg.jpeg_quality)}", "!", "fdsink"]
+    return cmd
@@ -0,0 +1,158 @@
+import mmap
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from utils.logging import get_logger
+
+
+# A recording "run1" is two files:
+#   run1.jpgs  concatenated JPEG frames, exactly as received
+#   run1.idx   INDEX_MAGIC followed by one INDEX_DTYPE record per frame
+DATA_SUFFIX = ".jpgs"
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"VSREC\x00\x01\x00"
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4"), ("ts", "<f8")])
+
+
+def recording_paths(path: Union[str, Path]) -> Tuple[Path, Path]:
+    """(data, index) file paths for a recording base path (suffix optional)."""
+    base = Path(path)
+    if base.suffix in (DATA_SUFFIX, INDEX_SUFFIX):
+        base = base.with_suffix("")
+    return base.with_name(base.name + DATA_SUFFIX), base.with_name(base.name + INDEX_SUFFIX)
+
+
+class FrameRecorder:
+    """
+    Appends received JPEG frames and their capture timestamps to a recording.
+
+    write() is called from the ingest path and only enqueues; a background
+    thread does the file I/O. If the disk falls behind, frames are dropped
+    (and counted) rather than stalling ingest.
+    """
+
+    def __init__(self, path: Union[str, Path], max_queue: int = 256):
+        self.data_path, self.index_path = recording_paths(path)
+        self._logger = get_logger("FrameRecorder")
+        self._queue: "queue.Queue[Optional[Tuple[bytes, float]]]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._thread: Optional[threading.Thread] = None
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.bytes_written = 0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self.data_path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._writer, name="frame-recorder", daemon=True)
+        self._thread.start()
+        self._logger.info(f"Recording frames to {self.data_path}")
+
+    def write(self, jpeg: bytes, ts: Optional[float] = None) -> None:
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait((jpeg, time.time() if ts is None else float(ts)))
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        thread, self._thread = self._thread, None
+        self._queue.put(None)
+        thread.join(timeout)
+        self._logger.info(
+            f"Recording closed: {self.frames_written} frames, {self.bytes_written / 1e6:.1f} MB, "
+            f"{self.frames_dropped} dropped"
+        )
+
+    def _writer(self) -> None:
+        # Both files are opened for append so a recording can be extended across runs
+        with open(self.data_path, "ab") as data, open(self.index_path, "ab") as index:
+            if index.tell() == 0:
+                index.write(INDEX_MAGIC)
+            offset = data.tell()
+            record = np.zeros(1, dtype=INDEX_DTYPE)
+
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                jpeg, ts = item
+                data.write(jpeg)
+                record["offset"], record["length"], record["ts"] = offset, len(jpeg), ts
+                index.write(record.tobytes())
+                offset += len(jpeg)
+                self.frames_written += 1
+                self.bytes_written += len(jpeg)
+                # Flush when idle so a crash loses at most the frames still queued
+                if self._queue.empty():
+                    data.flush()
+                    index.flush()
+
+
+class FrameRecording:
+    """
+    Read-only view of a recording. Both files are memory-mapped, so opening a
+    long recording is instant and frames are paged in only when read.
+
+        with FrameRecording("recordings/run1") as rec:
+            jpeg, ts = rec[0]
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.data_path, self.index_path = recording_paths(path)
+
+        with open(self.index_path, "rb") as f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError(f"{self.index_path} is not a frame recording index")
+
+        self._data_file = open(self.data_path, "rb")
+        data_size = os.fstat(self._data_file.fileno()).st_size
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ) if data_size else b""
+
+        count = (self.index_path.stat().st_size - len(INDEX_MAGIC)) // INDEX_DTYPE.itemsize
+        if count:
+            index = np.memmap(self.index_path, dtype=INDEX_DTYPE, mode="r", offset=len(INDEX_MAGIC), shape=(count,))
+        else:
+            index = np.zeros(0, dtype=INDEX_DTYPE)
+
+        # A recording cut short by a crash may index bytes that never reached the data file
+        valid = int(np.searchsorted(index["offset"] + index["length"], data_size, side="right"))
+        self.index = index[:valid]
+
+    def __len__(self) -> int:
+        return int(self.index.shape[0])
+
+    def __getitem__(self, i: int) -> Tuple[bytes, float]:
+        rec = self.index[i]
+        start = int(rec["offset"])
+        return bytes(self._data[start:start + int(rec["length"])]), float(rec["ts"])
+
+    def __iter__(self) -> Iterator[Tuple[bytes, float]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def duration(self) -> float:
+        if len(self) < 2:
+            return 0.0
+        return float(self.index["ts"][-1] - self.index["ts"][0])
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data_file.close()
+
+    def __enter__(self) -> "FrameRecording":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -7,12 +7,23 @@ from typing import Dict, Optional, Tuple, Any, Callable, List
 from collections import deque
 from pathlib import Path
 
-import cv2
 import numpy as np
 from aiohttp import web, WSMsgType
 
+from utils.executors import run_blocking
 from utils.logging import web_info, web_warn, web_error, team_raw, emit_team_roster, emit_team_ml_image
-from machinelearning.predictor import Predictor
+from utils.metrics import counter, gauge, histogram
+from machinelearning.batcher import InferenceBatcher, InferenceConfig, InferenceRejected, create_batcher
+from machinelearning.jpeg import decode_jpeg_bgr
+
+_KNOWN_OPS = ("begin", "print", "ping", "aruco", "prediction_request")
+# Unknown ops share one label so a misbehaving client can't grow the registry
+_M_WS_SECONDS = {
+    op: histogram("ws_message_seconds", "ESP message handling time, including the reply", op=op)
+    for op in _KNOWN_OPS + ("other",)
+}
+_M_WS_MESSAGES = {op: counter("ws_messages_total", "ESP messages handled", op=op) for op in _KNOWN_OPS + ("other",)}
+_M_TEAMS = gauge("ws_connected_teams", "ESP teams currently connected")
 
 
 @dataclass
@@ -21,6 +32,8 @@ class TeamState:
     connected: bool = False
     team_type: str = ""
     aruco_id: int = -1
+    # Camera whose ArenaProcessor this team's marker is looked up in
+    arena: str = ""
 
     x: float = -1.0
     y: float = -1.0
@@ -31,6 +44,8 @@ class TeamState:
 
     missed_pongs: int = 0
     last_seen_monotonic: float = field(default_factory=time.monotonic)
+    # Last "aruco" request; 0 = never
+    last_pose_request_monotonic: float = 0.0
 
 
 class WifiServer:
@@ -38,7 +53,7 @@ class WifiServer:
     ESP <-> Vision system WebSocket server.
 
     Ops supported (incoming):
-      - begin: {op:"begin", teamName, aruco:int, teamType:str}
+      - begin: {op:"begin", teamName, aruco:int, teamType:str, arena?:str}
       - print: {op:"print", teamName, message:str}
       - ping:  {op:"ping", teamName, status:"ping"|"pong"}
       - aruco: {op:"aruco", teamName}
@@ -48,20 +63,34 @@ class WifiServer:
       - ping: {op:"ping", teamName, status:"pong"} when ESP pings
       - aruco: {op:"aruco", x,y,theta,is_visible}
       - prediction: {op:"prediction", prediction:int}
+
+    With several cameras, each team is routed to one arena: the "arena" it
+    names in begin, else its entry in team_arenas, else default_arena. When
+    arenas (the configured camera names) is given, a begin that names any
+    other arena is warned about and routed as if it named none. Marker
+    lookups go to get_marker_pose(marker_id, arena) / is_marker_seen(marker_id, arena).
     """
 
     def __init__(
         self,
         host: str,
         port: int,
-        get_marker_pose: Callable[[int], Tuple[float, float, float]],
-        is_marker_seen: Callable[[int], bool],
+        get_marker_pose: Callable[[int, str], Tuple[float, float, float]],
+        is_marker_seen: Callable[[int, str], bool],
         models_dir: Optional[str] = None,
+        ml_config: Optional[InferenceConfig] = None,
+        batcher: Optional[InferenceBatcher] = None,
+        team_arenas: Optional[Dict[str, str]] = None,
+        default_arena: str = "",
+        arenas: Optional[List[str]] = None,
     ):
         self.host = host
         self.port = port
         self.get_marker_pose = get_marker_pose
         self.is_marker_seen = is_marker_seen
+        self.team_arenas = dict(team_arenas or {})
+        self.default_arena = default_arena
+        self.arenas = set(arenas or [])
 
         self._app = web.Application()
         self._runner: Optional[web.AppRunner] = None
@@ -74,9 +103,16 @@ class WifiServer:
 
         self._ping_task: Optional[asyncio.Task] = None
         self._roster_task: Optional[asyncio.Task] = None
+        self._last_roster: Optional[List[Dict[str, Any]]] = None
+        self._last_roster_monotonic = 0.0
 
-        # ML Predictor
-        self._predictor = Predictor(models_dir=models_dir)
+        # ML Predictor: built in the background once the server is listening
+        # (see InferenceBatcher); requests arriving earlier wait for it.
+        # A batcher passed in is shared (e.g. kept warm across soft restarts)
+        # and is left running by stop().
+        self._owns_batcher = batcher is None
+        self._batcher = batcher or create_batcher(models_dir, ml_config)
+        self._ml_input_size = self._batcher.cfg.input_size
 
         self._app.router.add_get("/", self._health)
         self._app.router.add_get("/ws", self._ws_handler)
@@ -90,6 +126,9 @@ class WifiServer:
         self._ping_task = asyncio.create_task(self._ping_loop())
         self._roster_task = asyncio.create_task(self._roster_loop())
 
+        # Starts loading the predictor in the background
+        await self._batcher.start()
+
         web_info(f"ESP WiFi Server running on ws://{self.host}:{self.port}/ws")
 
     async def stop(self) -> None:
@@ -110,6 +149,9 @@ class WifiServer:
                 except Exception:
                     pass
 
+        if self._owns_batcher:
+            await self._batcher.stop()
+
         if self._site:
             try:
                 await self._site.stop()
@@ -125,12 +167,24 @@ class WifiServer:
     async def _health(self, _request: web.Request) -> web.Response:
         return web.Response(text="OK")
 
+    def ml_stats(self) -> Dict[str, Any]:
+        return self._batcher.stats()
+
+    def pose_subscribers(self, arena: str, window_s: float = 2.0) -> int:
+        """Connected teams in arena that sent an aruco request in the last window_s seconds."""
+        cutoff = time.monotonic() - float(window_s)
+        return sum(
+            1
+            for st in list(self.teams.values())
+            if st.connected and st.arena == arena and st.last_pose_request_monotonic >= cutoff
+        )
+
     def _update_team_pose_and_history(self, st: TeamState) -> None:
         x, y, th = (-1.0, -1.0, -1.0)
 
         if st.connected and st.aruco_id >= 0:
-            if self.is_marker_seen(st.aruco_id):
-                x, y, th = self.get_marker_pose(st.aruco_id)
+            if self.is_marker_seen(st.aruco_id, st.arena):
+                x, y, th = self.get_marker_pose(st.aruco_id, st.arena)
             else:
                 x, y, th = (-1.0, -1.0, -1.0)
 
@@ -150,6 +204,7 @@ class WifiServer:
                     "connected": bool(st.connected),
                     "teamType": st.team_type,
                     "aruco": int(st.aruco_id),
+                    "arena": st.arena,
                     "visible": bool(visible),
                     "x": float(st.x),
                     "y": float(st.y),
@@ -158,13 +213,21 @@ class WifiServer:
             )
         return out
 
-    def _push_roster_to_ui(self) -> None:
-        emit_team_roster(self._snapshot_roster())
+    def _push_roster_to_ui(self, only_if_changed: bool = False) -> None:
+        _M_TEAMS.set(sum(1 for st in self.teams.values() if st.connected))
+        roster = self._snapshot_roster()
+        now = time.monotonic()
+        # Unchanged rosters are still resent now and then for UI clients that just connected
+        if only_if_changed and roster == self._last_roster and now - self._last_roster_monotonic < 2.0:
+            return
+        self._last_roster = roster
+        self._last_roster_monotonic = now
+        emit_team_roster(roster)
 
     async def _roster_loop(self) -> None:
         try:
             while not self._stop.is_set():
-                self._push_roster_to_ui()
+                self._push_roster_to_ui(only_if_changed=True)
                 await asyncio.sleep(0.2)
         except asyncio.CancelledError:
             return
@@ -213,12 +276,11 @@ class WifiServer:
         return -1.0, -1.0, -1.0, False
 
     @staticmethod
-    def _decode_base64_jpeg_to_bgr(frame_b64: str) -> Optional[np.ndarray]:
+    def _decode_base64_jpeg_to_bgr(frame_b64: str, min_size: Optional[Tuple[int, int]] = None) -> Optional[np.ndarray]:
         try:
             raw = base64.b64decode(frame_b64.encode())
-            arr = np.frombuffer(raw, np.uint8)
-            img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-            return img
+            # Decodes at reduced scale when the model input is smaller than the frame
+            return decode_jpeg_bgr(raw, min_size=min_size)
         except Exception:
             return None
 
@@ -253,82 +315,99 @@ class WifiServer:
 
                 st.last_seen_monotonic = time.monotonic()
 
-                if op == "begin":
-                    st.connected = True
-                    st.team_type = str(data.get("teamType", "")).strip()
-                    try:
-                        st.aruco_id = int(data.get("aruco", -1))
-                    except Exception:
-                        st.aruco_id = -1
-                    st.missed_pongs = 0
-
-                    self._sockets[tname] = ws
-                    web_info(f"{tname} has connected")
-                    self._push_roster_to_ui()
-
-                elif op == "print":
-                    # ESP prints: show exactly as sent (no [INFO])
-                    message = str(data.get("message", ""))
-                    team_raw(tname, message)
-
-                elif op == "ping":
-                    status = str(data.get("status", "")).strip().lower()
-                    if status == "ping":
-                        st.missed_pongs = 0
+                m_op = op if op in _KNOWN_OPS else "other"
+                t_op = time.perf_counter()
+                try:
+                    if op == "begin":
+                        st.connected = True
+                        st.team_type = str(data.get("teamType", "")).strip()
                         try:
-                            await ws.send_str(json.dumps({"op": "ping", "teamName": tname, "status": "pong"}))
+                            st.aruco_id = int(data.get("aruco", -1))
                         except Exception:
-                            await self._mark_disconnected(tname)
-                    elif status == "pong":
+                            st.aruco_id = -1
                         st.missed_pongs = 0
-
-                elif op == "aruco":
-                    x, y, th, vis = self._best_recent_pose(st)
-                    try:
-                        await ws.send_str(
-                            json.dumps(
-                                {"op": "aruco", "x": float(x), "y": float(y), "theta": float(th), "is_visible": bool(vis)}
+                        asked = str(data.get("arena") or "").strip()
+                        st.arena = asked or self.team_arenas.get(tname) or self.default_arena
+                        if asked and self.arenas and asked not in self.arenas:
+                            st.arena = self.team_arenas.get(tname) or self.default_arena
+                            web_warn(f"{tname} asked for unknown arena {asked!r}; using {st.arena!r}")
+
+                        self._sockets[tname] = ws
+                        web_info(f"{tname} has connected" + (f" (arena {st.arena})" if st.arena else ""))
+                        self._push_roster_to_ui()
+
+                    elif op == "print":
+                        # ESP prints: show exactly as sent (no [INFO])
+                        message = str(data.get("message", ""))
+                        team_raw(tname, message)
+
+                    elif op == "ping":
+                        status = str(data.get("status", "")).strip().lower()
+                        if status == "ping":
+                            st.missed_pongs = 0
+                            try:
+                                await ws.send_str(json.dumps({"op": "ping", "teamName": tname, "status": "pong"}))
+                            except Exception:
+                                await self._mark_disconnected(tname)
+                        elif status == "pong":
+                            st.missed_pongs = 0
+
+                    elif op == "aruco":
+                        st.last_pose_request_monotonic = time.monotonic()
+                        x, y, th, vis = self._best_recent_pose(st)
+                        try:
+                            await ws.send_str(
+                                json.dumps(
+                                    {"op": "aruco", "x": float(x), "y": float(y), "theta": float(th), "is_visible": bool(vis)}
+                                )
                             )
-                        )
-                    except Exception:
-                        await self._mark_disconnected(tname)
+                        except Exception:
+                            await self._mark_disconnected(tname)
 
-                elif op == "prediction_request":
-                    # Required fields: index:int, frame:str(base64 jpeg)
-                    try:
-                        model_index = int(data.get("index"))
-                    except Exception:
-                        model_index = -1
+                    elif op == "prediction_request":
+                        # Required fields: index:int, frame:str(base64 jpeg)
+                        try:
+                            model_index = int(data.get("index"))
+                        except Exception:
+                            model_index = -1
 
-                    frame_b64 = data.get("frame")
-                    if not isinstance(frame_b64, str) or len(frame_b64) < 8:
-                        web_error(f"ML request from {tname} missing/invalid frame")
-                        continue
+                        frame_b64 = data.get("frame")
+                        if not isinstance(frame_b64, str) or len(frame_b64) < 8:
+                            web_error(f"ML request from {tname} missing/invalid frame")
+                            continue
 
-                    img = self._decode_base64_jpeg_to_bgr(frame_b64)
-                    if img is None:
-                        web_error(f"ML request from {tname} had undecodable frame")
-                        continue
+                        img = await run_blocking(
+                            "image", self._decode_base64_jpeg_to_bgr, frame_b64, self._ml_input_size
+                        )
+                        if img is None:
+                            web_error(f"ML request from {tname} had undecodable frame")
+                            continue
 
-                    # Push the request image to the UI for that team
-                    # UI expects a data URL
-                    emit_team_ml_image(tname, "data:image/jpeg;base64," + frame_b64)
+                        # Push the request image to the UI for that team
+                        # UI expects a data URL
+                        emit_team_ml_image(tname, "data:image/jpeg;base64," + frame_b64)
 
-                    # Run prediction in a thread to avoid blocking the asyncio loop
-                    try:
-                        pred = await asyncio.to_thread(self._predictor.predict, img, tname, model_index)
-                    except Exception as e:
-                        web_error(f"ML prediction failed for {tname} idx={model_index}: {e}")
-                        continue
-
-                    # Reply to ESP
-                    try:
-                        await ws.send_str(json.dumps({"op": "prediction", "prediction": int(pred)}))
-                    except Exception:
-                        await self._mark_disconnected(tname)
+                        # Batched with other teams' requests; inference runs off the asyncio loop
+                        try:
+                            pred = await self._batcher.predict(img, tname, model_index)
+                        except InferenceRejected as e:
+                            web_warn(f"ML request from {tname} dropped: {e}")
+                            continue
+                        except Exception as e:
+                            web_error(f"ML prediction failed for {tname} idx={model_index}: {e}")
+                            continue
+
+                        # Reply to ESP
+                        try:
+                            await ws.send_str(json.dumps({"op": "prediction", "prediction": int(pred)}))
+                        except Exception:
+                            await self._mark_disconnected(tname)
 
-                else:
-                    pass
+                    else:
+                        pass
+                finally:
+                    _M_WS_SECONDS[m_op].observe(time.perf_counter() - t_op)
+                    _M_WS_MESSAGES[m_op].inc()
 
         except asyncio.CancelledError:
             pass
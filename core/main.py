@@ -2,25 +2,53 @@ import asyncio
 import json
 import logging
 import os
+import re
 import signal
 import socket
 import sys
 import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
 from aiohttp import web
 
-from utils.logging import get_logger, parse_level
+from utils import executors
+from utils.executors import run_blocking
+from utils.logging import get_logger, parse_level, web_error
+from utils.loop_monitor import LoopMonitor, LoopMonitorConfig
+from utils.metrics import counter, histogram
 from utils.port_guard import ensure_ports_available
+from utils.timeline import StartupTimeline
 from communications.arenacam import ArenaCamConfig, create_arenacam
+from communications.gst_pipeline import GstDecodeConfig
 from communications.wifi_server import WifiServer
+from machinelearning.batcher import InferenceBatcher, InferenceConfig, create_batcher
+from machinelearning.listener import DEFAULT_OUTPUT_DIR as LISTENER_DEFAULT_OUTPUT_DIR
+from machinelearning.listener import EVENT_PREFIX as LISTENER_EVENT_PREFIX
+from machinelearning.listener import run_listener, set_event_sink
 from vision.arena import ArenaConfig, ArenaProcessor
+from vision.governor import MIN_LOOP_SLEEP_S, FrameRateGovernor, GovernorConfig
+from vision.worker import VisionWorker, VisionWorkerConfig
 from frontend.webpage import create_app
 
 
+# Debouncer.stats() key (sent with each listener check_done event) -> counter
+_M_LISTENER = {
+    "events_received": counter("listener_events_total", "RTDB change events received by the ML listener"),
+    "events_coalesced": counter("listener_events_coalesced_total", "RTDB events folded into an already owed check"),
+    "checks_run": counter("listener_checks_total", "Model sync checks run by the ML listener"),
+    "checks_failed": counter("listener_check_failures_total", "Model sync checks that failed"),
+}
+_listener_last_stats: Dict[str, int] = {}
+
+# Name of the camera built from a lone "camera" block (and of the default arena)
+DEFAULT_CAMERA_NAME = "main"
+_CAMERA_NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
 def load_config(path: Path) -> dict:
     with path.open("r") as f:
         return json.load(f)
@@ -31,6 +59,13 @@ def _decode_jpeg_to_bgr(jpeg_bytes: bytes) -> Optional[np.ndarray]:
     return cv2.imdecode(arr, cv2.IMREAD_COLOR)
 
 
+def _process_jpeg(arena_processor: ArenaProcessor, jpeg: bytes, m_decode) -> None:
+    with m_decode.time():
+        bgr = _decode_jpeg_to_bgr(jpeg)
+    if bgr is not None:
+        arena_processor.process_bgr(bgr)
+
+
 def _get_best_local_ip() -> str:
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -49,7 +84,15 @@ async def arena_processing_loop(
     arenacam,
     arena_processor: ArenaProcessor,
     target_fps: float = 30.0,
+    camera: str = DEFAULT_CAMERA_NAME,
+    governor: Optional[FrameRateGovernor] = None,
 ):
+    """Processes the camera's latest frame at target_fps, or at the rate the governor picks."""
+    m_loop = histogram("vision_loop_seconds", "Decode + process time per arena loop iteration", camera=camera)
+    m_decode = histogram("vision_stage_seconds", "ArenaProcessor time per frame by stage", camera=camera, stage="decode")
+    m_overrun = counter(
+        "vision_loop_overruns_total", "Arena loop iterations that took longer than the frame period", camera=camera
+    )
     frame_period = 1.0 / max(1.0, float(target_fps))
     try:
         while not stop_event.is_set():
@@ -57,23 +100,59 @@ async def arena_processing_loop(
 
             jpeg = arenacam.latest_frame
             if jpeg is not None:
-                bgr = _decode_jpeg_to_bgr(jpeg)
-                if bgr is not None:
-                    await asyncio.to_thread(arena_processor.process_bgr, bgr)
+                # Decode and process in one hop so the loop never touches pixels
+                await run_blocking("vision", _process_jpeg, arena_processor, jpeg, m_decode)
 
             elapsed = time.perf_counter() - start
+            if jpeg is not None:
+                m_loop.observe(elapsed)
+                if governor is not None:
+                    governor.observe(elapsed)
+            if governor is not None:
+                frame_period = 1.0 / max(1.0, governor.target_fps)
             sleep_time = frame_period - elapsed
-            if sleep_time > 0:
-                await asyncio.sleep(sleep_time)
-            else:
-                await asyncio.sleep(0)
+            if sleep_time <= 0:
+                m_overrun.inc()
+            await asyncio.sleep(max(MIN_LOOP_SLEEP_S, sleep_time))
     except asyncio.CancelledError:
         return
 
 
-async def _start_ml_listener(config: dict, logger):
+def _listener_models_dir(ml_cfg: dict) -> Optional[str]:
+    models_dir = ml_cfg.get("models_dir")
+    if not models_dir:
+        return None
+    repo_root = Path(__file__).resolve().parents[1]
+    return str((repo_root / models_dir).resolve() if not Path(models_dir).is_absolute() else models_dir)
+
+
+def _export_listener_stats(evt: dict) -> None:
+    """Advances the listener_* counters by the change in the listener's cumulative Debouncer stats."""
+    for key, metric in _M_LISTENER.items():
+        value = int(evt.get(key, 0) or 0)
+        last = _listener_last_stats.get(key, 0)
+        # A restarted listener counts from zero again
+        metric.inc(value - last if value >= last else value)
+        _listener_last_stats[key] = value
+
+
+def _dispatch_listener_event(evt: dict, logger, on_event: Optional[Callable[[dict], None]]) -> None:
+    logger.debug(f"[ml] Listener event: {evt}")
+    if evt.get("type") == "check_done":
+        _export_listener_stats(evt)
+    if on_event is not None:
+        try:
+            on_event(evt)
+        except Exception as e:
+            logger.error(f"[ml] Listener event handler failed: {e}")
+
+
+async def _start_ml_listener(config: dict, logger, on_event: Optional[Callable[[dict], None]] = None):
     """
     Starts the legacy ML listener process (machinelearning/listener.py) in a subprocess.
+
+    Structured event lines (EVENT_PREFIX + JSON) on its stdout are passed to
+    on_event instead of being logged.
     """
     ml_cfg = config.get("machinelearning", {})
     if not ml_cfg.get("enabled", True):
@@ -83,11 +162,9 @@ async def _start_ml_listener(config: dict, logger):
     listener_path = repo_root / "machinelearning" / "listener.py"
 
     env = os.environ.copy()
-    models_dir = ml_cfg.get("models_dir")
+    models_dir = _listener_models_dir(ml_cfg)
     if models_dir:
-        env["VISION_ML_MODELS_DIR"] = str(
-            (repo_root / models_dir).resolve() if not Path(models_dir).is_absolute() else models_dir
-        )
+        env["VISION_ML_MODELS_DIR"] = models_dir
 
     try:
         proc = await asyncio.create_subprocess_exec(
@@ -106,7 +183,16 @@ async def _start_ml_listener(config: dict, logger):
                 line = await proc.stdout.readline()
                 if not line:
                     break
-                logger.info(line.decode("utf-8", errors="replace").rstrip("\n"))
+                text = line.decode("utf-8", errors="replace").rstrip("\n")
+                if text.startswith(LISTENER_EVENT_PREFIX):
+                    try:
+                        evt = json.loads(text[len(LISTENER_EVENT_PREFIX):])
+                    except ValueError:
+                        logger.warning(f"[ml] Malformed listener event: {text}")
+                        continue
+                    _dispatch_listener_event(evt, logger, on_event)
+                    continue
+                logger.info(text)
 
         stdout_task = asyncio.create_task(_stdout_pump())
         logger.info("[ml] Listener started")
@@ -116,33 +202,567 @@ async def _start_ml_listener(config: dict, logger):
         return None, None
 
 
-async def run():
-    config = load_config(Path(__file__).parent / "config.json")
+def _start_ml_listener_inprocess(config: dict, logger, on_event: Optional[Callable[[dict], None]] = None):
+    """
+    Runs the ML listener as a task on this event loop instead of a subprocess.
+    Events raised on its check threads are handed back to the loop.
+    """
+    ml_cfg = config.get("machinelearning", {})
+    if not ml_cfg.get("enabled", True):
+        return None
 
-    level = parse_level(config.get("system", {}).get("log_level", "INFO"), default=logging.INFO)
-    logger = get_logger("main", level=level)
+    loop = asyncio.get_running_loop()
+    # The listener logs through this logger while in-process; show its lines at the configured level
+    get_logger("MLListener", level=logger.getEffectiveLevel())
+    set_event_sink(lambda evt: loop.call_soon_threadsafe(_dispatch_listener_event, evt, logger, on_event))
+
+    models_dir = _listener_models_dir(ml_cfg) or LISTENER_DEFAULT_OUTPUT_DIR
+    task = asyncio.create_task(run_listener(models_dir))
+    logger.info("[ml] Listener started (in-process)")
+    return task
+
+
+def _inference_config(ml_cfg: dict) -> InferenceConfig:
+    ml_input_size = ml_cfg.get("input_size")
+    return InferenceConfig(
+        input_size=tuple(ml_input_size) if ml_input_size else None,
+        runtime=str(ml_cfg.get("runtime", "eager")),
+        backbone_weights=ml_cfg.get("backbone_weights"),
+        batch_max_size=int(ml_cfg.get("batch_max_size", 8)),
+        batch_max_wait_ms=float(ml_cfg.get("batch_max_wait_ms", 5.0)),
+        workers=int(ml_cfg.get("inference_workers", 1)),
+        intra_op_threads=int(ml_cfg.get("intra_op_threads", 2)),
+        max_queue_depth=int(ml_cfg.get("max_queue_depth", 32)),
+        max_pending_per_team=int(ml_cfg.get("max_pending_per_team", 2)),
+        process=bool(ml_cfg.get("inference_process", False)),
+    )
 
-    cam_cfg = config.get("camera", {})
-    fe_cfg = config.get("frontend", {})
 
-    udp_host = cam_cfg.get("bind_ip", "0.0.0.0")
-    udp_port = int(cam_cfg.get("bind_port", 5000))
+def _gst_decode_config(dec_cfg: dict) -> GstDecodeConfig:
+    return GstDecodeConfig(
+        decoder=str(dec_cfg.get("decoder") or "auto"),
+        max_threads=int(dec_cfg.get("max_threads", 0)),
+        queues=bool(dec_cfg.get("queues", True)),
+        queue_leaky=str(dec_cfg.get("queue_leaky", "downstream")),
+        queue_max_buffers=int(dec_cfg.get("queue_max_buffers", 2)),
+        width=int(dec_cfg.get("width", 0)),
+        height=int(dec_cfg.get("height", 0)),
+        framerate=int(dec_cfg.get("framerate", 0)),
+        jpeg_quality=int(dec_cfg.get("jpeg_quality", 85)),
+        jitterbuffer_ms=int(dec_cfg.get("jitterbuffer_ms", 0)),
+    )
+
+
+def _arenacam_config(cam_cfg: dict) -> ArenaCamConfig:
+    decode = _gst_decode_config(cam_cfg.get("decode") or {})
+    working_width = int(cam_cfg.get("working_width", 0))
+    if working_width > 0 and decode.width <= 0:
+        # Scale in the pipeline, so the JPEG re-encode and decode are cheaper too
+        decode.width, decode.height = working_width, 0
+    return ArenaCamConfig(
+        mode=cam_cfg.get("mode", "rtp_h264"),
+        bind_ip=cam_cfg.get("bind_ip", "0.0.0.0"),
+        bind_port=int(cam_cfg.get("bind_port", 5000)),
+        rtp_payload=int(cam_cfg.get("rtp_payload", 96)),
+        record_path=str(cam_cfg.get("record_path") or ""),
+        replay_path=str(cam_cfg.get("replay_path") or ""),
+        replay_speed=str(cam_cfg.get("replay_speed", "realtime")),
+        replay_rate=float(cam_cfg.get("replay_rate", 1.0)),
+        replay_loop=bool(cam_cfg.get("replay_loop", True)),
+        decode=decode,
+    )
+
+
+def _camera_configs(config: dict) -> List[dict]:
+    """
+    The "cameras" list from config.json, each a camera block plus "name" and
+    an optional "teams" list. Without one, the "camera" block is a single
+    camera named "main".
+    """
+    cameras = config.get("cameras")
+    if not cameras:
+        return [{**config.get("camera", {}), "name": DEFAULT_CAMERA_NAME}]
+
+    out = []
+    udp_ports: Dict[int, str] = {}
+    for i, cam_cfg in enumerate(cameras):
+        name = str(cam_cfg.get("name") or f"cam{i}").strip()
+        if not _CAMERA_NAME_RE.match(name):
+            raise ValueError(f"Camera name {name!r} must be letters, digits, '-' or '_'")
+        if any(c["name"] == name for c in out):
+            raise ValueError(f"Duplicate camera name {name!r}")
+        if cam_cfg.get("mode", "rtp_h264") != "replay":
+            port = int(cam_cfg.get("bind_port", 5000))
+            if port in udp_ports:
+                raise ValueError(f"Cameras {udp_ports[port]!r} and {name!r} both bind UDP port {port}")
+            udp_ports[port] = name
+        out.append({**cam_cfg, "name": name})
+    return out
+
+
+def _team_arenas(cameras: List[dict]) -> Dict[str, str]:
+    """team name -> camera name, from each camera's "teams" list."""
+    out: Dict[str, str] = {}
+    for cam_cfg in cameras:
+        for team in cam_cfg.get("teams") or []:
+            out[str(team).strip()] = cam_cfg["name"]
+    return out
+
+
+def _arena_config(cam_cfg: dict) -> ArenaConfig:
+    return ArenaConfig(
+        id_bl=0,
+        id_tl=1,
+        id_tr=2,
+        id_br=3,
+        output_width=1000,
+        output_height=500,
+        working_width=int(cam_cfg.get("working_width", 0)),
+        crop_refresh_seconds=600,
+        border_marker_fraction=0.5,
+        vertical_padding_fraction=0.01,
+        crop_jpeg_quality=75,
+        overlay_jpeg_quality=80,
+    )
+
+
+def _governor_config(sys_cfg: dict) -> GovernorConfig:
+    gov_cfg = sys_cfg.get("vision_governor", {})
+    return GovernorConfig(
+        enabled=bool(gov_cfg.get("enabled", False)),
+        min_fps=float(gov_cfg.get("min_fps", 5.0)),
+        max_fps=float(gov_cfg.get("max_fps", 30.0)),
+        idle_fps=float(gov_cfg.get("idle_fps", 10.0)),
+        cpu_budget=float(gov_cfg.get("cpu_budget", 0.8)),
+        pose_latency_slo_ms=float(gov_cfg.get("pose_latency_slo_ms", 100.0)),
+        working_widths=tuple(int(w) for w in gov_cfg.get("working_widths", [0, 960, 640])),
+        subscriber_window_s=float(gov_cfg.get("subscriber_window_s", 2.0)),
+        mode_hold_s=float(gov_cfg.get("mode_hold_s", 5.0)),
+        cost_ttl_s=float(gov_cfg.get("cost_ttl_s", 60.0)),
+    )
+
+
+def _vision_worker_config(sys_cfg: dict) -> VisionWorkerConfig:
+    vw_cfg = sys_cfg.get("vision_worker", {})
+    gov_cfg = _governor_config(sys_cfg)
+    return VisionWorkerConfig(
+        slots=int(vw_cfg.get("slots", 4)),
+        slot_bytes=int(vw_cfg.get("slot_bytes", 2 << 20)),
+        governor=gov_cfg if gov_cfg.enabled else None,
+    )
+
+
+def _loop_monitor_config(sys_cfg: dict) -> LoopMonitorConfig:
+    lm_cfg = sys_cfg.get("loop_monitor", {})
+    return LoopMonitorConfig(
+        enabled=bool(lm_cfg.get("enabled", True)),
+        sample_interval_ms=float(lm_cfg.get("sample_interval_ms", 50.0)),
+        lag_warn_ms=float(lm_cfg.get("lag_warn_ms", 100.0)),
+        slow_callback_ms=float(lm_cfg.get("slow_callback_ms", 50.0)),
+        report_interval_s=float(lm_cfg.get("report_interval_s", 30.0)),
+    )
+
+
+@dataclass
+class CameraInstance:
+    """One arena: its camera, ArenaProcessor and whatever runs them."""
+
+    name: str
+    arenacam: object = None
+    processor: Optional[ArenaProcessor] = None
+    vision_worker: Optional[VisionWorker] = None
+    proc_task: Optional[asyncio.Task] = None
 
-    tcp_host = fe_cfg.get("host", "0.0.0.0")
-    tcp_port = int(fe_cfg.get("port", 8080))
 
-    ws_host = config.get("communications", {}).get("ws_host", tcp_host)
-    ws_port = int(config.get("communications", {}).get("ws_port", 7755))
+class VisionSession:
+    """
+    One start/stop cycle of the vision components: an arenacam, ArenaProcessor
+    and loop per configured camera, the ESP WebSocket server and the web app.
+
+    A soft restart stops the current session and starts a new one in the same
+    process, so Python, OpenCV, torch and the loaded ML models stay warm and
+    the ML listener subprocess keeps running.
+    """
+
+    def __init__(self, config: dict, logger, batcher: InferenceBatcher, on_restart=None):
+        self.config = config
+        self.logger = logger
+        self.batcher = batcher
+        self.on_restart = on_restart
+
+        # Session-scoped: set on both shutdown and soft restart
+        self.stop_event = asyncio.Event()
+
+        # Ordered as in config.json; the first camera also serves /video, /overlay and /crop
+        self.cameras: Dict[str, CameraInstance] = {}
+        self.arenacam = None
+        self.arena_processor: Optional[ArenaProcessor] = None
+        self.wifi_server: Optional[WifiServer] = None
+        self.runner: Optional[web.AppRunner] = None
+        self.site: Optional[web.TCPSite] = None
+        self._first_frame_task: Optional[asyncio.Task] = None
+
+    async def _start_camera(self, cam_cfg: dict, timeline: StartupTimeline, suffix: str) -> CameraInstance:
+        cam = CameraInstance(name=cam_cfg["name"])
+        # Registered before starting so stop() cleans up a camera that fails halfway
+        self.cameras[cam.name] = cam
+
+        sys_cfg = self.config.get("system", {})
+        gov_cfg = _governor_config(sys_cfg)
+
+        def _pose_subscribers() -> int:
+            # The ESP server starts after the cameras
+            if self.wifi_server is None:
+                return 0
+            return self.wifi_server.pose_subscribers(cam.name, gov_cfg.subscriber_window_s)
+
+        if sys_cfg.get("vision_worker", {}).get("enabled", False):
+            # Camera and ArenaProcessor run in their own process; this one only reads their results
+            with timeline.phase(f"vision_worker{suffix}"):
+                cam.vision_worker = VisionWorker(
+                    _arenacam_config(cam_cfg), _arena_config(cam_cfg), _vision_worker_config(sys_cfg), camera=cam.name
+                )
+                cam.vision_worker.pose_subscribers = _pose_subscribers
+                await cam.vision_worker.start()
+                cam.arenacam = cam.vision_worker.camera
+                cam.processor = cam.vision_worker.processor
+        else:
+            with timeline.phase(f"arenacam{suffix}"):
+                cam.arenacam = create_arenacam(_arenacam_config(cam_cfg))
+                await cam.arenacam.start()
+
+            with timeline.phase(f"arena_processor{suffix}"):
+                cam.processor = ArenaProcessor(_arena_config(cam_cfg), camera=cam.name)
+                governor = None
+                if gov_cfg.enabled:
+                    governor = FrameRateGovernor(gov_cfg, cam.processor, cam.name, pose_subscribers=_pose_subscribers)
+                cam.proc_task = asyncio.create_task(
+                    arena_processing_loop(
+                        self.stop_event,
+                        self.logger,
+                        cam.arenacam,
+                        cam.processor,
+                        target_fps=30.0,
+                        camera=cam.name,
+                        governor=governor,
+                    )
+                )
+        return cam
+
+    async def start(self, timeline: StartupTimeline) -> None:
+        config = self.config
+        fe_cfg = config.get("frontend", {})
+
+        tcp_host = fe_cfg.get("host", "0.0.0.0")
+        tcp_port = int(fe_cfg.get("port", 8080))
+        ws_host = config.get("communications", {}).get("ws_host", tcp_host)
+        ws_port = int(config.get("communications", {}).get("ws_port", 7755))
+
+        camera_cfgs = _camera_configs(config)
+        for cam_cfg in camera_cfgs:
+            await self._start_camera(cam_cfg, timeline, f"[{cam_cfg['name']}]" if len(camera_cfgs) > 1 else "")
+
+        default = next(iter(self.cameras.values()))
+        self.arenacam = default.arenacam
+        self.arena_processor = default.processor
+        if len(self.cameras) > 1:
+            self.logger.info(f"Cameras: {', '.join(self.cameras)} (default {default.name})")
+
+        # ---- ESP WS SERVER ----
+        def _processor(arena: str):
+            cam = self.cameras.get(arena) or default
+            return cam.processor
+
+        def _get_pose(marker_id: int, arena: str):
+            return _processor(arena).poses_arena.get(marker_id, (-1.0, -1.0, -1.0))
+
+        def _is_seen(marker_id: int, arena: str) -> bool:
+            # ArenaProcessor.seen_ids is a @property returning a set.
+            # But tolerate older versions where it might be a method.
+            seen_obj = _processor(arena).seen_ids
+            seen = seen_obj() if callable(seen_obj) else seen_obj
+            return marker_id in seen
+
+        with timeline.phase("wifi_server"):
+            self.wifi_server = WifiServer(
+                host=ws_host,
+                port=ws_port,
+                get_marker_pose=_get_pose,
+                is_marker_seen=_is_seen,
+                batcher=self.batcher,
+                team_arenas=_team_arenas(camera_cfgs),
+                default_arena=default.name,
+                arenas=[c["name"] for c in camera_cfgs],
+            )
+            await self.wifi_server.start()
+        self.logger.info(f"ESP WebSocket server listening on ws://{_get_best_local_ip()}:{ws_port}/ws")
+        # -----------------------
+
+        with timeline.phase("web_app"):
+            restart_password = str(fe_cfg.get("restart_password", "")).strip()
+            app = create_app(
+                self.stop_event,
+                self.arenacam,
+                self.arena_processor,
+                cameras={name: (cam.arenacam, cam.processor) for name, cam in self.cameras.items()},
+                restart_password=restart_password,
+                on_restart=self.on_restart,
+                ml_diagnostics=self.batcher.diagnostics,
+            )
+            self.runner = web.AppRunner(app)
+            await self.runner.setup()
+            self.site = web.TCPSite(self.runner, tcp_host, tcp_port)
+            await self.site.start()
 
+        ip = _get_best_local_ip()
+        self.logger.info(f"Vision system running. Open http://{ip}:{tcp_port}/")
+
+        self._first_frame_task = asyncio.create_task(self._watch_first_results(timeline))
+
+    async def _watch_first_results(self, timeline: StartupTimeline, timeout_s: float = 120.0) -> None:
+        """Mark when the first camera frame, processed frame and ML readiness arrive."""
+        try:
+            while not self.stop_event.is_set() and timeline.elapsed() < timeout_s:
+                if self.arenacam is not None and self.arenacam.latest_frame is not None:
+                    timeline.mark("first_frame")
+                if self.arena_processor is not None and self.arena_processor.latest_overlay_jpeg is not None:
+                    timeline.mark("first_pose")
+                if self.batcher.ready:
+                    timeline.mark("ml_ready")
+                if all(timeline.mark_time(m) is not None for m in ("first_frame", "first_pose", "ml_ready")):
+                    return
+                await asyncio.sleep(0.02)
+        except asyncio.CancelledError:
+            return
+
+    async def stop(self) -> None:
+        self.stop_event.set()
+
+        if self._first_frame_task is not None:
+            self._first_frame_task.cancel()
+
+        if self.wifi_server is not None:
+            try:
+                await asyncio.wait_for(self.wifi_server.stop(), timeout=2.5)
+            except Exception:
+                pass
+
+        for cam in self.cameras.values():
+            if cam.proc_task is not None:
+                cam.proc_task.cancel()
+                try:
+                    await asyncio.wait_for(cam.proc_task, timeout=1.0)
+                except Exception:
+                    pass
+
+        if self.site is not None:
+            try:
+                await self.site.stop()
+            except Exception:
+                pass
+
+        if self.runner is not None:
+            try:
+                await asyncio.wait_for(self.runner.cleanup(), timeout=2.0)
+            except Exception:
+                pass
+
+        for cam in self.cameras.values():
+            if cam.arenacam is not None:
+                try:
+                    await asyncio.wait_for(cam.arenacam.stop(), timeout=2.5)
+                except Exception:
+                    pass
+
+            if cam.vision_worker is not None:
+                try:
+                    await asyncio.wait_for(cam.vision_worker.stop(), timeout=6.0)
+                except Exception:
+                    pass
+
+
+def _check_ports(config: dict) -> None:
+    """Raises RuntimeError if a UDP camera port or the web / ESP TCP port is already taken."""
+    camera_cfgs = _camera_configs(config)
+    fe_cfg = config.get("frontend", {})
     ensure_ports_available(
-        udp_host=udp_host,
-        udp_port=udp_port,
-        tcp_host=tcp_host,
-        tcp_port=tcp_port,
-        extra_tcp_ports=[ws_port],
+        udp_host=camera_cfgs[0].get("bind_ip", "0.0.0.0"),
+        udp_port=int(camera_cfgs[0].get("bind_port", 5000)),
+        tcp_host=fe_cfg.get("host", "0.0.0.0"),
+        tcp_port=int(fe_cfg.get("port", 8080)),
+        extra_tcp_ports=[int(config.get("communications", {}).get("ws_port", 7755))],
+        extra_udp_ports=[(c.get("bind_ip", "0.0.0.0"), int(c.get("bind_port", 5000))) for c in camera_cfgs[1:]],
     )
 
+
+# Read once at process start; a soft restart leaves them as they were
+_FULL_RESTART_KEYS = (
+    ("machinelearning",),
+    ("system", "log_level"),
+    ("system", "loop_monitor"),
+    ("frontend", "restart_mode"),
+)
+
+
+def _full_restart_changes(old: dict, new: dict) -> List[str]:
+    """Keys of _FULL_RESTART_KEYS whose value differs between two configs."""
+
+    def _get(cfg: dict, path: tuple):
+        for key in path:
+            cfg = cfg.get(key, {}) if isinstance(cfg, dict) else {}
+        return cfg
+
+    return [".".join(path) for path in _FULL_RESTART_KEYS if _get(old, path) != _get(new, path)]
+
+
+def _apply_reloaded_config(config: dict, previous: dict, logger) -> None:
+    """
+    Checks a config reloaded for a soft restart the way run() checks the first
+    one (camera list, ports) and resizes the executor pools for it; raises if
+    it cannot be used.
+    """
+    camera_cfgs = _camera_configs(config)
+    _check_ports(config)
+    executors.configure(_executor_sizes(config, camera_cfgs))
+    changed = _full_restart_changes(previous, config)
+    if changed:
+        logger.warning(f"Soft restart does not apply changes to {', '.join(changed)}; restart the process for them")
+
+
+async def _start_session(
+    configs: List[dict], logger, batcher: InferenceBatcher, timeline: StartupTimeline, on_restart
+) -> Tuple[Optional[VisionSession], Optional[dict]]:
+    """Starts a VisionSession with the first of configs that works; (None, None) if none does."""
+    for i, config in enumerate(configs):
+        session = VisionSession(config, logger, batcher, on_restart=on_restart)
+        try:
+            await session.start(timeline)
+            return session, config
+        except Exception as e:
+            fallback = " with the previous config" if i + 1 < len(configs) else ""
+            logger.error(f"Vision components failed to start ({e}); retrying{fallback}")
+            web_error(f"Soft restart failed: {e}")
+            await session.stop()
+    return None, None
+
+
+async def run_sessions(
+    config: dict,
+    reload_config: Callable[[], dict],
+    logger,
+    batcher: InferenceBatcher,
+    timeline: StartupTimeline,
+    stop_event: asyncio.Event,
+    restart_event: asyncio.Event,
+    on_restart=None,
+    on_session: Optional[Callable[[VisionSession], None]] = None,
+) -> None:
+    """
+    Runs one VisionSession at a time until stop_event is set.
+
+    The first session's start errors propagate. Each restart_event stops the
+    session, reloads the config with reload_config() and starts a new one; a
+    reloaded config that fails its checks or fails to start is logged and the
+    last config that did start is used again, retried with backoff until it
+    comes up. The keys in _FULL_RESTART_KEYS only change with the process.
+    """
+    session = VisionSession(config, logger, batcher, on_restart=on_restart)
+    try:
+        await session.start(timeline)
+    except BaseException:
+        await session.stop()
+        raise
+    try:
+        while True:
+            timeline.log_summary()
+            if on_session is not None:
+                on_session(session)
+
+            waiters = [
+                asyncio.create_task(stop_event.wait()),
+                asyncio.create_task(restart_event.wait()),
+            ]
+            try:
+                await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for w in waiters:
+                    w.cancel()
+
+            if stop_event.is_set():
+                break
+
+            restart_event.clear()
+            logger.warning("Soft restart: rebuilding vision components")
+            timeline = StartupTimeline("restart", logger=logger)
+
+            with timeline.phase("teardown"):
+                await session.stop()
+                session = None
+
+            configs = [config]
+            with timeline.phase("config"):
+                try:
+                    reloaded = reload_config()
+                    _apply_reloaded_config(reloaded, config, logger)
+                    configs.insert(0, reloaded)
+                except Exception as e:
+                    logger.error(f"Could not use the reloaded config.json ({e}); keeping previous config")
+                    web_error(f"Reloaded config.json rejected: {e}")
+
+            delay_s = 1.0
+            while session is None and not stop_event.is_set():
+                session, started = await _start_session(configs, logger, batcher, timeline, on_restart)
+                if session is not None:
+                    config = started
+                    break
+                configs = [config]
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=delay_s)
+                except asyncio.TimeoutError:
+                    pass
+                delay_s = min(delay_s * 2.0, 30.0)
+            if session is None:
+                break
+    finally:
+        if session is not None:
+            await session.stop()
+
+
+def _executor_sizes(config: dict, camera_cfgs: List[dict]) -> Dict[str, int]:
+    """system.executors, raised to what the configured cameras need."""
+    sizes = dict(config.get("system", {}).get("executors") or {})
+    # One vision thread per in-process camera (up to the core count), so arenas don't queue behind each other
+    sizes["vision"] = max(int(sizes.get("vision", 1)), min(len(camera_cfgs), os.cpu_count() or 1))
+    # Each rtp_h264 camera keeps one io thread in a blocking pipe read for its whole life;
+    # the default pool stays free for the short calls (gst probes, worker spawn, randomize)
+    io_default = executors.DEFAULT_SIZES["io"]
+    sizes["io"] = max(int(sizes.get("io", io_default)), len(camera_cfgs) + io_default)
+    return sizes
+
+
+async def run():
+    config_path = Path(__file__).parent / "config.json"
+    timeline = StartupTimeline("startup")
+
+    with timeline.phase("config"):
+        config = load_config(config_path)
+
+    level = parse_level(config.get("system", {}).get("log_level", "INFO"), default=logging.INFO)
+    logger = get_logger("main", level=level)
+    timeline.logger = logger
+
+    executors.configure(_executor_sizes(config, _camera_configs(config)))
+    fe_cfg = config.get("frontend", {})
+
+    with timeline.phase("port_check"):
+        _check_ports(config)
+
+    # Before any component starts, so startup stalls are attributed too; lives across soft restarts
+    loop_monitor = LoopMonitor(_loop_monitor_config(config.get("system", {})), logger=logger)
+    loop_monitor.start()
+
     stop_event = asyncio.Event()
+    restart_event = asyncio.Event()
     loop = asyncio.get_running_loop()
 
     def _request_stop():
@@ -156,87 +776,50 @@ async def run():
         except NotImplementedError:
             pass
 
-    arenacam = create_arenacam(
-        ArenaCamConfig(
-            mode=cam_cfg.get("mode", "rtp_h264"),
-            bind_ip=udp_host,
-            bind_port=udp_port,
-            rtp_payload=int(cam_cfg.get("rtp_payload", 96)),
-        )
-    )
+    # "soft" rebuilds components in-process; "exec" re-execs the whole process
+    restart_mode = str(fe_cfg.get("restart_mode", "soft")).strip().lower()
+    on_restart = restart_event.set if restart_mode == "soft" else None
+
+    # Shared by every session so loaded models survive soft restarts
+    ml_cfg = config.get("machinelearning", {})
+    batcher = create_batcher(ml_cfg.get("models_dir"), _inference_config(ml_cfg))
 
-    runner = None
-    site = None
-    proc_task = None
-    wifi_server = None
     ml_proc = None
     ml_stdout_task = None
+    ml_listener_task = None
 
-    try:
-        ml_proc, ml_stdout_task = await _start_ml_listener(config, logger)
-
-        await arenacam.start()
-
-        arena_processor = ArenaProcessor(
-            ArenaConfig(
-                id_bl=0,
-                id_tl=1,
-                id_tr=2,
-                id_br=3,
-                output_width=1000,
-                output_height=500,
-                crop_refresh_seconds=600,
-                border_marker_fraction=0.5,
-                vertical_padding_fraction=0.01,
-                crop_jpeg_quality=75,
-                overlay_jpeg_quality=80,
-            )
-        )
-
-        proc_task = asyncio.create_task(
-            arena_processing_loop(stop_event, logger, arenacam, arena_processor, target_fps=30.0)
-        )
+    prewarm_models = bool(ml_cfg.get("prewarm_models", True))
 
-        # ---- ESP WS SERVER ----
-        def _get_pose(marker_id: int):
-            return arena_processor.poses_arena.get(marker_id, (-1.0, -1.0, -1.0))
+    def _on_listener_event(evt: dict) -> None:
+        if evt.get("type") == "model_updated" and evt.get("filename"):
+            batcher.model_updated(str(evt["filename"]), prewarm=prewarm_models)
 
-        def _is_seen(marker_id: int) -> bool:
-            # ArenaProcessor.seen_ids is a @property returning a set.
-            # But tolerate older versions where it might be a method.
-            seen_obj = arena_processor.seen_ids
-            seen = seen_obj() if callable(seen_obj) else seen_obj
-            return marker_id in seen
+    try:
+        # "subprocess" (default) isolates the listener; "inprocess" runs it on this loop
+        listener_mode = str(ml_cfg.get("listener_mode", "subprocess")).strip().lower()
+        with timeline.phase("ml_listener"):
+            if listener_mode == "inprocess":
+                ml_listener_task = _start_ml_listener_inprocess(config, logger, on_event=_on_listener_event)
+            else:
+                ml_proc, ml_stdout_task = await _start_ml_listener(config, logger, on_event=_on_listener_event)
 
-        models_dir = config.get("machinelearning", {}).get("models_dir")
-        wifi_server = WifiServer(
-            host=ws_host,
-            port=ws_port,
-            get_marker_pose=_get_pose,
-            is_marker_seen=_is_seen,
-            models_dir=models_dir,
+        await run_sessions(
+            config, lambda: load_config(config_path), logger, batcher, timeline, stop_event, restart_event, on_restart
         )
-        await wifi_server.start()
-        logger.info(f"ESP WebSocket server listening on ws://{_get_best_local_ip()}:{ws_port}/ws")
-        # -----------------------
-
-        restart_password = str(fe_cfg.get("restart_password", "")).strip()
-        app = create_app(stop_event, arenacam, arena_processor, restart_password=restart_password)
-        runner = web.AppRunner(app)
-        await runner.setup()
-        site = web.TCPSite(runner, tcp_host, tcp_port)
-        await site.start()
-
-        ip = _get_best_local_ip()
-        logger.info(f"Vision system running. Open http://{ip}:{tcp_port}/")
-
-        await stop_event.wait()
 
     except asyncio.CancelledError:
         pass
     finally:
         stop_event.set()
 
+        if ml_listener_task is not None:
+            ml_listener_task.cancel()
+            try:
+                await asyncio.wait_for(ml_listener_task, timeout=1.0)
+            except BaseException:
+                pass
+            set_event_sink(None)
+
         if ml_proc is not None:
             try:
                 ml_proc.terminate()
@@ -259,36 +842,13 @@ async def run():
                 except Exception:
                     pass
 
-        if wifi_server is not None:
-            try:
-                await asyncio.wait_for(wifi_server.stop(), timeout=2.5)
-            except Exception:
-                pass
-
-        if proc_task is not None:
-            proc_task.cancel()
-            try:
-                await asyncio.wait_for(proc_task, timeout=1.0)
-            except Exception:
-                pass
-
-        if site is not None:
-            try:
-                await site.stop()
-            except Exception:
-                pass
-
-        if runner is not None:
-            try:
-                await asyncio.wait_for(runner.cleanup(), timeout=2.0)
-            except Exception:
-                pass
-
         try:
-            await asyncio.wait_for(arenacam.stop(), timeout=2.5)
+            await asyncio.wait_for(batcher.stop(), timeout=2.0)
         except Exception:
             pass
 
+        await loop_monitor.stop()
+        executors.shutdown()
         logger.info("Stopped cleanly")
 
 
@@ -1,20 +1,27 @@
 import asyncio
+import inspect
 import json
 import os
 import sys
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, Optional, Tuple
 
 import cv2
 import numpy as np
 from aiohttp import web, WSMsgType
 
+from utils.executors import run_blocking
 from utils.logging import get_logger, register_web_event_sink
+from utils.metrics import REGISTRY, counter, gauge, histogram
 
 
 BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "static"
 
+# UI events serialized on the "serialize" pool rather than on the loop
+_LARGE_EVENT_TYPES = {"team_roster", "team_ml_image"}
+
 
 def _decode_jpeg(jpeg_bytes: bytes) -> Optional[np.ndarray]:
     if not jpeg_bytes:
@@ -71,6 +78,52 @@ def _draw_waiting_overlay(frame: np.ndarray) -> np.ndarray:
     return out
 
 
+def _waiting_overlay_jpeg(raw: bytes) -> bytes:
+    frame = _decode_jpeg(raw)
+    if frame is None:
+        return raw
+    return _encode_jpeg(_draw_waiting_overlay(frame), quality=80) or raw
+
+
+class CameraStreams:
+    """Frame getters behind one camera's /video, /overlay and /crop streams."""
+
+    def __init__(self, name: str, arenacam, arena_processor):
+        self.name = name
+        self.arenacam = arenacam
+        self.arena = arena_processor
+        # /crop before the arena transform exists: one overlay per camera frame, shared by all clients
+        self._waiting_src: Optional[bytes] = None
+        self._waiting_jpeg: Optional[asyncio.Future] = None
+
+    def get_raw_jpeg(self) -> Optional[bytes]:
+        return self.arenacam.latest_frame
+
+    def get_overlay_jpeg(self) -> Optional[bytes]:
+        return self.arena.latest_overlay_jpeg or self.get_raw_jpeg()
+
+    async def get_crop_jpeg(self) -> Optional[bytes]:
+        if self.arena.latest_cropped_jpeg is not None:
+            return self.arena.latest_cropped_jpeg
+
+        raw = self.get_raw_jpeg()
+        if raw is None:
+            return None
+
+        if raw is not self._waiting_src or self._waiting_jpeg is None:
+            self._waiting_src = raw
+            self._waiting_jpeg = asyncio.ensure_future(run_blocking("image", _waiting_overlay_jpeg, raw))
+            self._waiting_jpeg.add_done_callback(self._forget_failed)
+        # Shielded: a client disconnecting mid-encode must not cancel it for the others
+        return await asyncio.shield(self._waiting_jpeg)
+
+    def _forget_failed(self, fut: asyncio.Future) -> None:
+        # A failed encode is retried by the next viewer instead of served to all of them until the next frame
+        if self._waiting_jpeg is fut and (fut.cancelled() or fut.exception() is not None):
+            self._waiting_jpeg = None
+            self._waiting_src = None
+
+
 async def _restart_process_after_delay(delay_seconds: float = 0.5):
     await asyncio.sleep(delay_seconds)
     python = sys.executable
@@ -78,20 +131,46 @@ async def _restart_process_after_delay(delay_seconds: float = 0.5):
     os.execv(python, argv)
 
 
+async def _soft_restart_after_delay(on_restart: Callable[[], None], delay_seconds: float = 0.5):
+    # Give the HTTP response time to reach the browser before the app is torn down
+    await asyncio.sleep(delay_seconds)
+    on_restart()
+
+
 class WebPage:
-    def __init__(self, stop_event, arenacam, arena_processor, restart_password: str = ""):
+    def __init__(
+        self,
+        stop_event,
+        arenacam,
+        arena_processor,
+        restart_password: str = "",
+        on_restart: Optional[Callable[[], None]] = None,
+        ml_diagnostics: Optional[Callable[[], dict]] = None,
+        cameras: Optional[Dict[str, Tuple[object, object]]] = None,
+    ):
         self.logger = get_logger("frontend")
 
         self.stop_event = stop_event
         self.arenacam = arenacam
         self.arena = arena_processor
+        # name -> streams for /cam/<name>/...; the first camera is arenacam/arena_processor, also on /video, /overlay, /crop
+        self.default_camera = CameraStreams(next(iter(cameras)) if cameras else "main", arenacam, arena_processor)
+        self.cameras: Dict[str, CameraStreams] = {self.default_camera.name: self.default_camera}
+        for name, (cam, processor) in (cameras or {}).items():
+            if name != self.default_camera.name:
+                self.cameras[name] = CameraStreams(name, cam, processor)
         self.restart_password = restart_password or ""
+        # Soft restart hook from core/main.py; without it /api/restart re-execs the process
+        self.on_restart = on_restart
+        self.ml_diagnostics = ml_diagnostics
 
+        self.started_monotonic = time.monotonic()
         self.app = web.Application()
         self.ws_clients = set()
 
         self.setup_routes()
         self.setup_event_sink()
+        self.app.on_shutdown.append(self.on_shutdown)
 
     def setup_routes(self):
         self.app.router.add_get("/", self.handle_index)
@@ -99,11 +178,16 @@ class WebPage:
         self.app.router.add_get("/video", self.handle_video_stream)
         self.app.router.add_get("/overlay", self.handle_overlay_stream)
         self.app.router.add_get("/crop", self.handle_crop_stream)
+        self.app.router.add_get("/cam/{name}/{stream}", self.handle_camera_stream)
 
         self.app.router.add_get("/ws", self.handle_ws)
 
         self.app.router.add_post("/api/randomize", self.handle_randomize)
         self.app.router.add_post("/api/restart", self.handle_restart)
+        self.app.router.add_get("/api/cameras", self.handle_cameras)
+        self.app.router.add_get("/api/ml", self.handle_ml_diagnostics)
+        self.app.router.add_get("/api/stats", self.handle_stats)
+        self.app.router.add_get("/metrics", self.handle_metrics)
 
         self.app.router.add_static(
             "/static/",
@@ -126,7 +210,11 @@ class WebPage:
         if not self.ws_clients:
             return
 
-        data = json.dumps(evt)
+        # Rosters and ML images are large enough to stall the loop; log lines are not
+        if evt.get("type") in _LARGE_EVENT_TYPES:
+            data = await run_blocking("serialize", json.dumps, evt)
+        else:
+            data = json.dumps(evt)
 
         dead = []
         for ws in list(self.ws_clients):
@@ -138,31 +226,24 @@ class WebPage:
         for ws in dead:
             self.ws_clients.discard(ws)
 
+    async def on_shutdown(self, _app):
+        # Close UI sockets so runner.cleanup() doesn't wait on them (e.g. during a soft restart)
+        for ws in list(self.ws_clients):
+            try:
+                await ws.close()
+            except Exception:
+                pass
+        self.ws_clients.clear()
+
     async def handle_index(self, request):
         return web.FileResponse(STATIC_DIR / "index.html")
 
-    def get_raw_jpeg(self) -> Optional[bytes]:
-        return self.arenacam.latest_frame
-
-    def get_overlay_jpeg(self) -> Optional[bytes]:
-        return self.arena.latest_overlay_jpeg or self.get_raw_jpeg()
-
-    def get_crop_jpeg(self) -> Optional[bytes]:
-        if self.arena.latest_cropped_jpeg is not None:
-            return self.arena.latest_cropped_jpeg
-
-        raw = self.get_raw_jpeg()
-        if raw is None:
-            return None
-
-        frame = _decode_jpeg(raw)
-        if frame is None:
-            return raw
-
-        frame = _draw_waiting_overlay(frame)
-        return _encode_jpeg(frame, quality=80)
+    async def mjpeg_stream(self, request, frame_getter, stream: str):
+        m_clients = gauge("mjpeg_clients", "Connected MJPEG clients", stream=stream)
+        m_frames = counter("mjpeg_frames_sent_total", "MJPEG frames written to clients", stream=stream)
+        m_bytes = counter("mjpeg_bytes_sent_total", "MJPEG bytes written to clients", stream=stream)
+        m_write = histogram("mjpeg_write_seconds", "Time to write one MJPEG part to a client", stream=stream)
 
-    async def mjpeg_stream(self, request, frame_getter):
         response = web.StreamResponse(
             status=200,
             reason="OK",
@@ -175,13 +256,16 @@ class WebPage:
         )
 
         await response.prepare(request)
+        m_clients.inc()
 
         try:
             while not self.stop_event.is_set():
                 jpeg = frame_getter()
+                if inspect.isawaitable(jpeg):
+                    jpeg = await jpeg
 
                 if jpeg is not None:
-                    await response.write(
+                    part = (
                         b"--frame\r\n"
                         b"Content-Type: image/jpeg\r\n"
                         b"Content-Length: "
@@ -190,6 +274,10 @@ class WebPage:
                         + jpeg
                         + b"\r\n"
                     )
+                    with m_write.time():
+                        await response.write(part)
+                    m_frames.inc()
+                    m_bytes.inc(len(part))
 
                 await asyncio.sleep(1 / 30)
 
@@ -197,27 +285,43 @@ class WebPage:
             pass
         except Exception:
             pass
+        finally:
+            m_clients.dec()
 
         return response
 
     async def handle_video_stream(self, request):
         self.logger.info("Web client connected to /video")
-        response = await self.mjpeg_stream(request, self.get_raw_jpeg)
+        response = await self.mjpeg_stream(request, self.default_camera.get_raw_jpeg, "video")
         self.logger.info("Web client disconnected from /video")
         return response
 
     async def handle_overlay_stream(self, request):
         self.logger.info("Web client connected to /overlay")
-        response = await self.mjpeg_stream(request, self.get_overlay_jpeg)
+        response = await self.mjpeg_stream(request, self.default_camera.get_overlay_jpeg, "overlay")
         self.logger.info("Web client disconnected from /overlay")
         return response
 
     async def handle_crop_stream(self, request):
         self.logger.info("Web client connected to /crop")
-        response = await self.mjpeg_stream(request, self.get_crop_jpeg)
+        response = await self.mjpeg_stream(request, self.default_camera.get_crop_jpeg, "crop")
         self.logger.info("Web client disconnected from /crop")
         return response
 
+    async def handle_camera_stream(self, request):
+        name = request.match_info["name"]
+        stream = request.match_info["stream"]
+        cam = self.cameras.get(name)
+        getters = {"video": cam.get_raw_jpeg, "overlay": cam.get_overlay_jpeg, "crop": cam.get_crop_jpeg} if cam else {}
+        if stream not in getters:
+            raise web.HTTPNotFound()
+
+        path = f"/cam/{name}/{stream}"
+        self.logger.info(f"Web client connected to {path}")
+        response = await self.mjpeg_stream(request, getters[stream], f"{name}/{stream}")
+        self.logger.info(f"Web client disconnected from {path}")
+        return response
+
     async def handle_ws(self, request):
         ws = web.WebSocketResponse()
         await ws.prepare(request)
@@ -237,9 +341,30 @@ class WebPage:
 
         return ws
 
+    async def handle_cameras(self, request):
+        return web.json_response(
+            {
+                "ok": True,
+                "default": self.default_camera.name,
+                "cameras": [
+                    {"name": name, **{stream: f"/cam/{name}/{stream}" for stream in ("video", "overlay", "crop")}}
+                    for name in self.cameras
+                ],
+            }
+        )
+
     async def handle_randomize(self, request):
-        if hasattr(self.arena, "randomize_mission_overlay"):
-            result = self.arena.randomize_mission_overlay()
+        name = request.query.get("cam")
+        cam = self.cameras.get(name) if name else self.default_camera
+        if cam is None:
+            return web.json_response({"ok": False, "error": f"Unknown camera {name!r}."}, status=404)
+
+        if hasattr(cam.arena, "randomize_mission_overlay"):
+            # With a vision worker this is a round trip to another process
+            try:
+                result = await run_blocking("io", cam.arena.randomize_mission_overlay)
+            except (RuntimeError, EOFError, OSError) as e:
+                return web.json_response({"ok": False, "error": str(e)}, status=503)
             return web.json_response({"ok": True, **result})
 
         return web.json_response(
@@ -250,6 +375,27 @@ class WebPage:
             status=500,
         )
 
+    async def handle_ml_diagnostics(self, request):
+        if self.ml_diagnostics is None:
+            return web.json_response({"ok": False, "error": "ML diagnostics not available."}, status=503)
+        return web.json_response({"ok": True, **self.ml_diagnostics()})
+
+    async def handle_stats(self, request):
+        return web.json_response(
+            {
+                "ok": True,
+                "uptime_s": time.monotonic() - self.started_monotonic,
+                "metrics": REGISTRY.to_dict(),
+            }
+        )
+
+    async def handle_metrics(self, request):
+        # Prometheus text exposition format
+        return web.Response(
+            text=REGISTRY.render_prometheus(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
     async def handle_restart(self, request):
         if not self.restart_password:
             return web.json_response(
@@ -287,7 +433,10 @@ class WebPage:
             )
 
         self.logger.warning("Accepted authenticated restart request from web client")
-        asyncio.create_task(_restart_process_after_delay())
+        if self.on_restart is not None:
+            asyncio.create_task(_soft_restart_after_delay(self.on_restart))
+        else:
+            asyncio.create_task(_restart_process_after_delay())
 
         return web.json_response(
             {
@@ -297,11 +446,22 @@ class WebPage:
         )
 
 
-def create_app(stop_event, arenacam, arena_processor, restart_password: str = ""):
+def create_app(
+    stop_event,
+    arenacam,
+    arena_processor,
+    restart_password: str = "",
+    on_restart: Optional[Callable[[], None]] = None,
+    ml_diagnostics: Optional[Callable[[], dict]] = None,
+    cameras: Optional[Dict[str, Tuple[object, object]]] = None,
+):
     page = WebPage(
         stop_event=stop_event,
         arenacam=arenacam,
         arena_processor=arena_processor,
         restart_password=restart_password,
+        on_restart=on_restart,
+        ml_diagnostics=ml_diagnostics,
+        cameras=cameras,
     )
     return page.app
\ No newline at end of file
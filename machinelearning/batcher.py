@@ -0,0 +1,433 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from utils.logging import get_logger
+from utils.metrics import counter, gauge, histogram
+
+if TYPE_CHECKING:
+    # Imported lazily: pulling in torch/torchvision costs seconds at startup.
+    from machinelearning.predictor import Predictor
+
+
+_M_REQUESTS = counter("inference_requests_total", "Prediction requests received")
+_M_REJECTED = counter("inference_rejected_total", "Prediction requests refused by admission control")
+_M_FAILURES = counter("inference_failures_total", "Prediction requests that raised")
+_M_QUEUE = gauge("inference_queue_depth", "Prediction requests waiting for a batch")
+_M_BATCH = histogram("inference_batch_seconds", "predict_batch() time per batch")
+_M_QUEUE_WAIT = histogram("inference_queue_wait_seconds", "Time from request to its batch starting")
+_M_LATENCY = histogram("inference_request_seconds", "Time from request to result")
+
+
+@dataclass
+class InferenceConfig:
+    # Predictor
+    input_size: Optional[Tuple[int, int]] = None  # (width, height); None = native frame size
+    runtime: str = "eager"  # "eager" | "torchscript" | "int8"
+    backbone_weights: Optional[str] = None  # local ResNet18 weights file; None = <models_dir>/.runtime/...
+
+    # Micro-batching
+    batch_max_size: int = 8
+    batch_max_wait_ms: float = 5.0
+
+    # Execution: batches run on a dedicated pool, never the default executor
+    # used by the vision loop and the camera reader.
+    workers: int = 1
+    intra_op_threads: int = 2  # torch.set_num_threads (process-wide) once the predictor loads
+    # Run the Predictor in a separate worker process (own GIL; torch is never imported here)
+    process: bool = False
+
+    # Admission control
+    max_queue_depth: int = 32
+    max_pending_per_team: int = 2
+
+
+class InferenceRejected(RuntimeError):
+    """Raised to a caller whose request was refused by admission control."""
+
+
+@dataclass
+class _PendingRequest:
+    frame_bgr: Any
+    team_name: str
+    model_index: int
+    future: asyncio.Future
+    enqueued_monotonic: float = field(default_factory=time.monotonic)
+
+
+def _process_rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round((pct / 100.0) * (len(ordered) - 1)))))
+    return float(ordered[k])
+
+
+class InferenceBatcher:
+    """
+    Collects prediction requests for a few milliseconds and runs them through
+    Predictor.predict_batch together, so N teams asking at once cost one
+    backbone pass instead of N.
+
+    Latency bound per request: at most batch_max_wait_ms of extra queueing
+    before its batch starts, plus the time of any batches already running.
+    A batch is dispatched early once batch_max_size requests are waiting.
+
+    Requests are queued per team and batches are filled round-robin across
+    teams, so one robot spamming prediction_request cannot starve the others.
+    Beyond max_queue_depth total (or max_pending_per_team for one team,
+    counting its requests in a running batch too) new requests are rejected
+    with InferenceRejected rather than queued.
+
+    `predictor` may be a Predictor or a zero-argument factory for one. A
+    factory is run on the inference pool right after start(), so the caller
+    can start serving before torch is even imported; requests that arrive
+    in the meantime queue up and wait for the model to be ready.
+    """
+
+    def __init__(
+        self,
+        predictor: Union["Predictor", Callable[[], "Predictor"]],
+        cfg: Optional[InferenceConfig] = None,
+        stats_window: int = 512,
+    ):
+        self._logger = get_logger("InferenceBatcher")
+        if hasattr(predictor, "predict_batch"):
+            self.predictor: Optional["Predictor"] = predictor  # type: ignore[assignment]
+            self._predictor_factory: Optional[Callable[[], "Predictor"]] = None
+        else:
+            self.predictor = None
+            self._predictor_factory = predictor  # type: ignore[assignment]
+        self.cfg = cfg or InferenceConfig()
+
+        self.max_batch_size = max(1, int(self.cfg.batch_max_size))
+        self.max_wait_s = max(0.0, float(self.cfg.batch_max_wait_ms)) / 1000.0
+        self.workers = max(1, int(self.cfg.workers))
+        self.intra_op_threads = max(1, int(self.cfg.intra_op_threads))
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self._ready = asyncio.Event()
+        self._load_error: Optional[BaseException] = None
+        self._load_seconds: Optional[float] = None
+
+        # team -> FIFO of that team's requests; dict order is the round-robin order
+        self._pending: "OrderedDict[str, Deque[_PendingRequest]]" = OrderedDict()
+        self._queued = 0
+        # team -> requests taken off the queue whose batch has not finished
+        self._inflight: Dict[str, int] = {}
+        self._wakeup = asyncio.Event()
+
+        self._requests = 0
+        self._batches = 0
+        self._failures = 0
+        self._rejected = 0
+        self._max_queue_depth = 0
+        self._batch_sizes: Deque[int] = deque(maxlen=stats_window)
+        self._queue_wait_ms: Deque[float] = deque(maxlen=stats_window)
+        self._latency_ms: Deque[float] = deque(maxlen=stats_window)
+
+    def _load_predictor(self) -> "Predictor":
+        if not self.cfg.process:
+            import torch
+
+            # Process-wide: one call covers every pool thread
+            torch.set_num_threads(self.intra_op_threads)
+        if self.predictor is not None:
+            return self.predictor
+        assert self._predictor_factory is not None
+        return self._predictor_factory()
+
+    async def _load_task(self) -> None:
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        try:
+            self.predictor = await loop.run_in_executor(self._executor, self._load_predictor)
+            self._load_seconds = time.monotonic() - started
+            self._logger.info(f"[ml] Predictor ready after {self._load_seconds:.1f}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._load_error = e
+            self._logger.error(f"[ml] Predictor failed to load: {e}")
+        finally:
+            self._ready.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set() and self.predictor is not None
+
+    async def wait_ready(self) -> bool:
+        """Wait for the predictor to finish loading; False if loading failed."""
+        await self._ready.wait()
+        return self.predictor is not None
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ml-infer")
+        # Loading is queued on the pool first, so it completes before any batch runs.
+        self._tasks = [asyncio.create_task(self._load_task())]
+        self._tasks += [asyncio.create_task(self._worker_loop()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            try:
+                await t
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks = []
+
+        for q in self._pending.values():
+            for req in q:
+                if not req.future.done():
+                    req.future.set_exception(RuntimeError("Inference batcher stopped"))
+        self._pending.clear()
+        self._queued = 0
+        self._inflight.clear()
+        _M_QUEUE.set(0)
+
+        if self._executor is not None:
+            # Running batches finish in the background; nothing awaits them.
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+        close = getattr(self.predictor, "close", None)
+        if close is not None:
+            close()
+
+    def model_updated(self, filename: str, prewarm: bool = True) -> None:
+        """
+        A model file changed on disk (ML listener event): forget its cached
+        head and, if prewarm, load the new one on the inference pool now so
+        the team's next request doesn't pay for it.
+        """
+        if self.predictor is None:
+            return  # not loaded yet; heads load fresh anyway
+
+        self.predictor.invalidate(filename)
+        if prewarm and self._executor is not None:
+            asyncio.get_running_loop().run_in_executor(self._executor, self._prewarm, filename)
+
+    def _prewarm(self, filename: str) -> None:
+        try:
+            assert self.predictor is not None
+            self.predictor.warm(filename)
+            self._logger.info(f"[ml] Pre-warmed {filename}")
+        except Exception as e:
+            self._logger.warning(f"[ml] Could not pre-warm {filename}: {e}")
+
+    async def predict(self, frame_bgr, team_name: str, model_index: int) -> int:
+        team = str(team_name)
+        self._requests += 1
+        _M_REQUESTS.inc()
+
+        if self._queued >= int(self.cfg.max_queue_depth):
+            self._rejected += 1
+            _M_REJECTED.inc()
+            raise InferenceRejected(f"inference queue full ({self._queued} pending)")
+
+        team_q = self._pending.get(team)
+        team_pending = (len(team_q) if team_q is not None else 0) + self._inflight.get(team, 0)
+        if team_pending >= int(self.cfg.max_pending_per_team):
+            self._rejected += 1
+            _M_REJECTED.inc()
+            raise InferenceRejected(f"too many pending requests for {team} ({team_pending})")
+
+        loop = asyncio.get_running_loop()
+        req = _PendingRequest(frame_bgr, team, int(model_index), loop.create_future())
+
+        if team_q is None:
+            team_q = deque()
+            self._pending[team] = team_q
+        team_q.append(req)
+        self._queued += 1
+        _M_QUEUE.set(self._queued)
+        self._max_queue_depth = max(self._max_queue_depth, self._queued)
+        self._wakeup.set()
+
+        return await req.future
+
+    def _pop_fair(self) -> _PendingRequest:
+        # Oldest team in rotation gives one request, then moves to the back.
+        team, team_q = next(iter(self._pending.items()))
+        req = team_q.popleft()
+        self._queued -= 1
+        _M_QUEUE.set(self._queued)
+        if team_q:
+            self._pending.move_to_end(team)
+        else:
+            del self._pending[team]
+        self._inflight[team] = self._inflight.get(team, 0) + 1
+        return req
+
+    def _finish(self, reqs: List[_PendingRequest]) -> None:
+        """Releases popped requests from their team's in-flight count."""
+        for r in reqs:
+            n = self._inflight.get(r.team_name, 0) - 1
+            if n > 0:
+                self._inflight[r.team_name] = n
+            else:
+                self._inflight.pop(r.team_name, None)
+
+    async def _wait_for_request(self, timeout: Optional[float] = None) -> bool:
+        if self._queued > 0:
+            return True
+        self._wakeup.clear()
+        try:
+            if timeout is None:
+                await self._wakeup.wait()
+            else:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._queued > 0
+
+    async def _collect_batch(self) -> List[_PendingRequest]:
+        while not await self._wait_for_request():
+            pass
+        batch = [self._pop_fair()]
+
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            if self._queued > 0:
+                batch.append(self._pop_fair())
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await self._wait_for_request(remaining):
+                break
+
+        # Requests whose caller already gave up don't need inference.
+        self._finish([r for r in batch if r.future.done()])
+        return [r for r in batch if not r.future.done()]
+
+    async def _worker_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        await self._ready.wait()
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+            try:
+                await self._run_batch(loop, batch)
+            finally:
+                self._finish(batch)
+
+    async def _run_batch(self, loop: asyncio.AbstractEventLoop, batch: List[_PendingRequest]) -> None:
+        if self.predictor is None:
+            for r in batch:
+                if not r.future.done():
+                    r.future.set_exception(RuntimeError(f"ML model failed to load: {self._load_error}"))
+            return
+
+        started = time.monotonic()
+        for r in batch:
+            self._queue_wait_ms.append((started - r.enqueued_monotonic) * 1000.0)
+            _M_QUEUE_WAIT.observe(started - r.enqueued_monotonic)
+
+        try:
+            results = await loop.run_in_executor(
+                self._executor,
+                self.predictor.predict_batch,
+                [(r.frame_bgr, r.team_name, r.model_index) for r in batch],
+            )
+        except asyncio.CancelledError:
+            for r in batch:
+                if not r.future.done():
+                    r.future.set_exception(RuntimeError("Inference batcher stopped"))
+            raise
+        except Exception as e:
+            results = [e] * len(batch)
+
+        self._batches += 1
+        self._batch_sizes.append(len(batch))
+
+        finished = time.monotonic()
+        _M_BATCH.observe(finished - started)
+        for r, res in zip(batch, results):
+            self._latency_ms.append((finished - r.enqueued_monotonic) * 1000.0)
+            _M_LATENCY.observe(finished - r.enqueued_monotonic)
+            if r.future.done():
+                continue
+            if isinstance(res, Exception):
+                self._failures += 1
+                _M_FAILURES.inc()
+                r.future.set_exception(res)
+            else:
+                r.future.set_result(res)
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Load state, process memory and per-model memory of the predictor."""
+        return {
+            "ready": self.ready,
+            "load_error": str(self._load_error) if self._load_error is not None else None,
+            "process_rss_bytes": _process_rss_bytes(),
+            "predictor": self.predictor.diagnostics() if self.predictor is not None else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = list(self._batch_sizes)
+        waits = list(self._queue_wait_ms)
+        lat = list(self._latency_ms)
+        return {
+            "ready": self.ready,
+            "load_seconds": self._load_seconds,
+            "requests": self._requests,
+            "batches": self._batches,
+            "failures": self._failures,
+            "rejected": self._rejected,
+            "queue_depth": self._queued,
+            "max_queue_depth": self._max_queue_depth,
+            "pending_per_team": {team: len(q) for team, q in self._pending.items()},
+            "inflight_per_team": dict(self._inflight),
+            "workers": self.workers,
+            "intra_op_threads": self.intra_op_threads,
+            "mean_batch_size": (sum(sizes) / len(sizes)) if sizes else 0.0,
+            "max_batch_size_seen": max(sizes) if sizes else 0,
+            "queue_wait_ms_p50": _percentile(waits, 50),
+            "queue_wait_ms_p95": _percentile(waits, 95),
+            "latency_ms_p50": _percentile(lat, 50),
+            "latency_ms_p95": _percentile(lat, 95),
+            "latency_ms_p99": _percentile(lat, 99),
+        }
+
+
+def create_batcher(models_dir: Optional[str], cfg: Optional[InferenceConfig] = None) -> InferenceBatcher:
+    """Batcher whose Predictor for models_dir is built lazily on start()."""
+    cfg = cfg or InferenceConfig()
+
+    predictor_kwargs = {
+        "models_dir": models_dir,
+        "input_size": cfg.input_size,
+        "runtime": cfg.runtime,
+        "backbone_weights": cfg.backbone_weights,
+    }
+
+    def _make_predictor() -> "Predictor":
+        if cfg.process:
+            from machinelearning.process_predictor import ProcessPredictor
+
+            return ProcessPredictor(predictor_kwargs, cfg.intra_op_threads)  # type: ignore[return-value]
+
+        from machinelearning.predictor import Predictor
+
+        return Predictor(**predictor_kwargs)
+
+    return InferenceBatcher(_make_predictor, cfg)
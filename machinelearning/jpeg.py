@@ -0,0 +1,67 @@
+"""JPEG helpers for ML frames. Kept free of torch so the network side can import them cheaply."""
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+# IMREAD_REDUCED_* lets libjpeg skip work via DCT scaling (1/2, 1/4, 1/8).
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# JPEG SOFn markers that carry the frame size (excludes DHT/JPG/DAC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(jpeg_bytes: bytes) -> Optional[Tuple[int, int]]:
+    """Read (width, height) from a JPEG's SOF header without decoding it."""
+    buf = memoryview(jpeg_bytes)
+    n = len(buf)
+    if n < 4 or buf[0] != 0xFF or buf[1] != 0xD8:
+        return None
+
+    i = 2
+    while i + 4 <= n:
+        if buf[i] != 0xFF:
+            return None
+        marker = buf[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # no length field
+            i += 2
+            continue
+        seg_len = (buf[i + 2] << 8) | buf[i + 3]
+        if marker in _SOF_MARKERS:
+            if i + 9 > n:
+                return None
+            h = (buf[i + 5] << 8) | buf[i + 6]
+            w = (buf[i + 7] << 8) | buf[i + 8]
+            return int(w), int(h)
+        if marker == 0xDA:  # start of scan, no SOF seen
+            return None
+        i += 2 + seg_len
+    return None
+
+
+def decode_jpeg_bgr(jpeg_bytes: bytes, min_size: Optional[Tuple[int, int]] = None) -> Optional[np.ndarray]:
+    """
+    Decode a JPEG to BGR. When min_size=(width, height) is given, decode at the
+    largest libjpeg reduction (1/8, 1/4, 1/2) that still covers min_size, which
+    is much cheaper than a full decode followed by a downscale.
+    """
+    arr = np.frombuffer(jpeg_bytes, dtype=np.uint8)
+
+    flag = cv2.IMREAD_COLOR
+    if min_size is not None:
+        size = jpeg_size(jpeg_bytes)
+        if size is not None:
+            w, h = size
+            for factor, reduced in _REDUCED_FLAGS:
+                if w // factor >= min_size[0] and h // factor >= min_size[1]:
+                    flag = reduced
+                    break
+
+    return cv2.imdecode(arr, flag)
@@ -1,11 +1,17 @@
+import asyncio
+import base64
+import hashlib
+import json
 import os
+import random
 import time
 import threading
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
 from urllib.parse import quote
 
+import aiohttp
 import requests
 
 
@@ -25,13 +31,55 @@ def _repo_root() -> str:
 
 
 DEFAULT_OUTPUT_DIR = os.path.join(_repo_root(), "machinelearning", "models")
+DEFAULT_DOWNLOAD_WORKERS = int(os.environ.get("VISION_ML_DOWNLOAD_WORKERS", "4"))
+
+
+# Set while running in-process (see set_event_sink); stdout is core/main.py's pipe otherwise
+_logger = None
 
 
 def log(msg: str) -> None:
+    if _logger is not None:
+        _logger.info(msg)
+        return
     # Keep formatting close to the legacy script
     print(msg, flush=True)
 
 
+# Lines on stdout starting with this carry a JSON event for core/main.py
+# (which pumps this process's stdout) instead of a human-readable message.
+EVENT_PREFIX = "@@listener-event "
+
+
+_event_sink: Optional[Callable[[Dict[str, Any]], None]] = None
+
+
+def set_event_sink(sink: Optional[Callable[[Dict[str, Any]], None]]) -> None:
+    """
+    Deliver events to sink (called from worker threads) instead of stdout, and
+    log through utils.logging; used when running in-process. None goes back
+    to stdout for both.
+    """
+    global _event_sink, _logger
+    _event_sink = sink
+    if sink is None:
+        _logger = None
+    else:
+        # Only importable from the repo root, which the subprocess (run as a script) is not
+        from utils.logging import get_logger
+
+        _logger = get_logger("MLListener")
+
+
+def emit_event(event_type: str, **fields: Any) -> None:
+    evt = {"type": event_type, **fields}
+    sink = _event_sink
+    if sink is not None:
+        sink(evt)
+        return
+    print(EVENT_PREFIX + json.dumps(evt), flush=True)
+
+
 def ensure_dir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
@@ -46,15 +94,42 @@ def parse_rfc3339(ts: str) -> float:
     return dt.timestamp()
 
 
-def list_storage_items(prefix: str) -> List[Dict[str, Any]]:
-    """List objects in Firebase Storage under a prefix."""
-    url = f"https://firebasestorage.googleapis.com/v0/b/{FIREBASE_STORAGE_BUCKET}/o"
+def storage_base_url() -> str:
+    """Firebase Storage REST endpoint; overridable so the listener can run against a local stand-in."""
+    return os.environ.get("VISION_ML_STORAGE_URL", "https://firebasestorage.googleapis.com").rstrip("/")
+
+
+def rtdb_stream_url() -> str:
+    """RTDB streaming endpoint; overridable so the listener can run against a local SSE stand-in."""
+    return os.environ.get("VISION_ML_RTDB_URL", FIREBASE_DB_URL.rstrip("/") + "/.json")
+
+
+def make_session(pool_size: int = DEFAULT_DOWNLOAD_WORKERS) -> requests.Session:
+    """HTTP session with a connection pool large enough for concurrent downloads."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, int(pool_size)))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def list_storage_items(prefix: str, session: Optional[requests.Session] = None) -> List[Dict[str, Any]]:
+    """List objects in Firebase Storage under a prefix (following pagination)."""
+    http = session or requests
+    url = f"{storage_base_url()}/v0/b/{FIREBASE_STORAGE_BUCKET}/o"
     params = {"prefix": prefix, "key": FIREBASE_API_KEY}
 
-    r = requests.get(url, params=params, timeout=15)
-    r.raise_for_status()
-    data = r.json()
-    return data.get("items", []) or []
+    items: List[Dict[str, Any]] = []
+    while True:
+        r = http.get(url, params=params, timeout=15)
+        r.raise_for_status()
+        data = r.json()
+        items.extend(data.get("items", []) or [])
+
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            return items
+        params = {**params, "pageToken": page_token}
 
 
 def build_download_url(object_name: str, download_tokens: str) -> str:
@@ -64,21 +139,38 @@ def build_download_url(object_name: str, download_tokens: str) -> str:
         token = str(download_tokens).split(",")[0].strip()
 
     enc_name = quote(object_name, safe="")
-    url = f"https://firebasestorage.googleapis.com/v0/b/{FIREBASE_STORAGE_BUCKET}/o/{enc_name}?alt=media"
+    url = f"{storage_base_url()}/v0/b/{FIREBASE_STORAGE_BUCKET}/o/{enc_name}?alt=media"
     if token:
         url += f"&token={quote(token, safe='')}"
     return url
 
 
-def download_file(object_name: str, filename_only: str, output_dir: str, download_tokens: str) -> None:
-    """Download to output_dir/filename_only atomically (.tmp then replace)."""
+class ChecksumMismatch(Exception):
+    pass
+
+
+def download_file(
+    object_name: str,
+    filename_only: str,
+    output_dir: str,
+    download_tokens: str,
+    expected_md5: str = "",
+    session: Optional[requests.Session] = None,
+) -> None:
+    """
+    Download to output_dir/filename_only atomically (.tmp then replace).
+
+    expected_md5 is Firebase's md5Hash (base64 of the digest); when given, the
+    file is only moved into place if the downloaded bytes match it.
+    """
     ensure_dir(output_dir)
 
     dst = os.path.join(output_dir, filename_only)
     tmp = dst + ".tmp"
 
+    http = session or requests
     url = build_download_url(object_name, download_tokens)
-    r = requests.get(url, stream=True, timeout=30)
+    r = http.get(url, stream=True, timeout=30)
     r.raise_for_status()
 
     try:
@@ -87,20 +179,142 @@ def download_file(object_name: str, filename_only: str, output_dir: str, downloa
     except OSError:
         pass
 
+    digest = hashlib.md5()
     with open(tmp, "wb") as f:
         for chunk in r.iter_content(chunk_size=64 * 1024):
             if chunk:
+                digest.update(chunk)
                 f.write(chunk)
 
+    if expected_md5:
+        actual = base64.b64encode(digest.digest()).decode("ascii")
+        if actual != expected_md5:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise ChecksumMismatch(f"{filename_only}: md5 {actual} != expected {expected_md5}")
+
     os.replace(tmp, dst)
 
 
-def check_once(output_dir: str) -> None:
+# -------------------------
+# Manifest
+# -------------------------
+
+MANIFEST_NAME = ".manifest.json"
+
+
+def _manifest_path(output_dir: str) -> str:
+    return os.path.join(output_dir, MANIFEST_NAME)
+
+
+def load_manifest(output_dir: str) -> Dict[str, Dict[str, Any]]:
+    """object name -> {filename, generation, md5Hash, size, updated} of the local copy."""
+    try:
+        with open(_manifest_path(output_dir), "r") as f:
+            data = json.load(f)
+        return data.get("objects", {}) if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir: str, objects: Dict[str, Dict[str, Any]]) -> None:
+    path = _manifest_path(output_dir)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": 1, "objects": objects}, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _manifest_entry(item: Dict[str, Any], filename: str) -> Dict[str, Any]:
+    return {
+        "filename": filename,
+        "generation": str(item.get("generation", "") or ""),
+        "md5Hash": str(item.get("md5Hash", "") or ""),
+        "size": str(item.get("size", "") or ""),
+        "updated": str(item.get("updated", "") or ""),
+    }
+
+
+def _unchanged(entry: Optional[Dict[str, Any]], remote: Dict[str, Any]) -> bool:
+    if not entry:
+        return False
+    # generation changes on every overwrite; md5/size/updated cover listings without it
+    keys = ("generation", "md5Hash", "size", "updated")
+    return all(entry.get(k, "") == remote[k] for k in keys)
+
+
+def _seed_from_local_file(local_path: str, remote: Dict[str, Any]) -> bool:
+    """
+    First run with no manifest entry: trust an existing file that is at least
+    as new as the remote object (the legacy mtime rule), so upgrading does not
+    re-download every model.
+    """
+    try:
+        local_ts = os.path.getmtime(local_path)
+    except OSError:
+        return False
+    remote_ts = parse_rfc3339(remote["updated"]) if remote["updated"] else 0.0
+    return local_ts >= remote_ts
+
+
+def _download_one(
+    obj_name: str,
+    filename: str,
+    output_dir: str,
+    tokens: str,
+    remote: Dict[str, Any],
+    session: Optional[requests.Session],
+) -> None:
+    download_file(obj_name, filename, output_dir, tokens, expected_md5=remote["md5Hash"], session=session)
+    remote_ts = parse_rfc3339(remote["updated"]) if remote["updated"] else 0.0
+    try:
+        os.utime(os.path.join(output_dir, filename), (time.time(), remote_ts))
+    except Exception:
+        pass
+
+
+def check_once(
+    output_dir: str,
+    session: Optional[requests.Session] = None,
+    workers: int = DEFAULT_DOWNLOAD_WORKERS,
+    teams: Optional[Iterable[str]] = None,
+) -> int:
+    """
+    Sync REMOTE_PREFIX into output_dir; returns how many objects were listed.
+
+    Objects whose generation/md5/size/updated match the persisted manifest
+    are skipped without touching the filesystem (one directory listing per
+    check catches files deleted locally). Changed objects are downloaded
+    concurrently over the shared session and checksum-verified.
+
+    With teams, only "<REMOTE_PREFIX><team>_*" objects are listed and synced;
+    manifest entries of other teams are left as they are.
+    """
     ensure_dir(output_dir)
-    log("[listener] Executing check")
 
-    items = list_storage_items(REMOTE_PREFIX)
+    if teams is None:
+        prefixes = [REMOTE_PREFIX]
+        log("[listener] Executing check")
+    else:
+        team_list = sorted(set(teams))
+        prefixes = [f"{REMOTE_PREFIX}{team}_" for team in team_list]
+        log(f"[listener] Executing check ({', '.join(team_list)})")
+
+    manifest = load_manifest(output_dir)
+    items: List[Dict[str, Any]] = []
+    for prefix in prefixes:
+        items.extend(i for i in list_storage_items(prefix, session=session) if str(i.get("name", "")).startswith(prefix))
+
+    try:
+        local_files = set(os.listdir(output_dir))
+    except OSError:
+        local_files = set()
 
+    to_download = []
+    seen = set()
+    skipped = 0
     for item in items:
         obj_name = str(item.get("name", ""))
         if not obj_name.startswith(REMOTE_PREFIX):
@@ -110,122 +324,376 @@ def check_once(output_dir: str) -> None:
         if not filename:
             continue
 
-        updated = str(item.get("updated", ""))
-        remote_ts = parse_rfc3339(updated) if updated else 0.0
+        seen.add(obj_name)
+        remote = _manifest_entry(item, filename)
+        entry = manifest.get(obj_name)
+
+        if filename in local_files:
+            if _unchanged(entry, remote):
+                skipped += 1
+                continue
+            if entry is None and _seed_from_local_file(os.path.join(output_dir, filename), remote):
+                manifest[obj_name] = remote
+                skipped += 1
+                continue
+
+        reason = "changed" if filename in local_files else "missing locally"
+        log(f"[listener] Downloading {filename} ({reason})")
         tokens = str(item.get("downloadTokens", "") or "")
+        to_download.append((obj_name, filename, tokens, remote))
+
+    # Objects removed remotely are forgotten (local files are left alone, as before)
+    for obj_name in list(manifest.keys()):
+        if obj_name not in seen and obj_name.startswith(tuple(prefixes)):
+            del manifest[obj_name]
+
+    failures = 0
+    if to_download:
+        with ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="listener-dl") as pool:
+            futures = {
+                pool.submit(_download_one, obj_name, filename, output_dir, tokens, remote, session): (obj_name, remote)
+                for (obj_name, filename, tokens, remote) in to_download
+            }
+            for fut in as_completed(futures):
+                obj_name, remote = futures[fut]
+                try:
+                    fut.result()
+                except Exception as e:
+                    failures += 1
+                    manifest.pop(obj_name, None)
+                    log(f"[listener] Download of {remote['filename']} failed: {e}")
+                    continue
+                manifest[obj_name] = remote
+                log(f"[listener] Downloaded {remote['filename']}")
+                emit_event(
+                    "model_updated",
+                    filename=remote["filename"],
+                    generation=remote["generation"],
+                    md5Hash=remote["md5Hash"],
+                )
+
+    save_manifest(output_dir, manifest)
+    log(
+        f"[listener] Check done: {len(to_download) - failures} downloaded, "
+        f"{skipped} unchanged, {failures} failed"
+    )
+    if failures:
+        raise RuntimeError(f"{failures} model download(s) failed")
+    return len(items)
 
-        local_path = os.path.join(output_dir, filename)
 
-        if os.path.exists(local_path):
-            local_ts = os.path.getmtime(local_path)
-            if local_ts < remote_ts:
-                log(f"[listener] Downloading {filename} (local {local_ts:.3f} < remote {remote_ts:.3f})")
-                download_file(obj_name, filename, output_dir, tokens)
-                try:
-                    os.utime(local_path, (time.time(), remote_ts))
-                except Exception:
-                    pass
-                log(f"[listener] Downloaded {filename}")
-            else:
-                log(f"[listener] Skipping {filename} (local {local_ts:.3f} >= remote {remote_ts:.3f})")
-        else:
-            log(f"[listener] Downloading {filename} (missing locally)")
-            download_file(obj_name, filename, output_dir, tokens)
-            try:
-                os.utime(local_path, (time.time(), remote_ts))
-            except Exception:
-                pass
-            log(f"[listener] Downloaded {filename}")
+def known_teams(output_dir: str) -> Set[str]:
+    """Teams with at least one synced model, from the "<team>_<index>_<dim>.pth" names in the manifest."""
+    teams = set()
+    for entry in load_manifest(output_dir).values():
+        parts = str(entry.get("filename", "")).rsplit("_", 2)
+        if len(parts) == 3 and parts[0]:
+            teams.add(parts[0])
+    return teams
 
 
-@dataclass
 class Debouncer:
-    delay_s: float = 0.25
-    _lock: threading.Lock = threading.Lock()
-    _scheduled: bool = False
-    _timer: Optional[threading.Timer] = None
+    """
+    Coalescing scheduler for check_once().
+
+    At most one check runs at a time. Events that arrive while a check is
+    scheduled or running are folded into a single trailing re-run, so a burst
+    of uploads costs at most two listings and a change made mid-check is never
+    missed. A failed check is retried with exponential backoff instead of
+    taking the listener down.
+    """
+
+    def __init__(self, delay_s: float = 0.25, backoff_initial_s: float = 2.0, backoff_max_s: float = 60.0):
+        self.delay_s = float(delay_s)
+        self.backoff_initial_s = float(backoff_initial_s)
+        self.backoff_max_s = float(backoff_max_s)
+
+        self._lock = threading.Lock()
+        self._pending = None  # latest fn to run; None when nothing is owed
+        self._running = False
+        self._timer: Optional[threading.Timer] = None
+        self._consecutive_failures = 0
+        self._closed = False
+
+        self.events_received = 0
+        self.events_coalesced = 0
+        self.checks_run = 0
+        self.checks_failed = 0
+        self.last_error: Optional[str] = None
 
     def schedule(self, fn) -> None:
         with self._lock:
-            if self._scheduled:
+            if self._closed:
                 return
-            self._scheduled = True
+            self.events_received += 1
+            coalesced = self._pending is not None or self._running
+            self._pending = fn
+            if coalesced:
+                # Picked up by the scheduled run, or by the trailing run after the current one
+                self.events_coalesced += 1
+                return
+            self._arm(self.delay_s)
 
-            def run():
-                try:
-                    fn()
-                except Exception as e:
-                    log(f"[listener] check() failed: {e}")
-                    os._exit(1)
-                finally:
-                    with self._lock:
-                        self._scheduled = False
-                        self._timer = None
-
-            self._timer = threading.Timer(self.delay_s, run)
-            self._timer.daemon = True
-            self._timer.start()
-
-
-def db_event_stream_loop(debouncer: Debouncer, output_dir: str, stop_evt: threading.Event) -> None:
-    """Listen for RTDB changes via Firebase REST streaming (SSE)."""
-    url = FIREBASE_DB_URL.rstrip("/") + "/.json"
-    params = {"print": "silent"}
+    def cancel(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._pending = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _arm(self, delay_s: float) -> None:
+        # Caller holds self._lock
+        self._timer = threading.Timer(delay_s, self._run)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _run(self) -> None:
+        with self._lock:
+            self._timer = None
+            fn, self._pending = self._pending, None
+            if fn is None or self._closed:
+                return
+            self._running = True
+
+        error: Optional[BaseException] = None
+        try:
+            fn()
+        except Exception as e:
+            error = e
+
+        with self._lock:
+            self._running = False
+            self.checks_run += 1
+
+            if error is not None:
+                self.checks_failed += 1
+                self._consecutive_failures += 1
+                self.last_error = str(error)
+                if self._pending is None:
+                    self._pending = fn
+                delay = min(
+                    self.backoff_max_s,
+                    self.backoff_initial_s * (2 ** (self._consecutive_failures - 1)),
+                )
+                log(f"[listener] check() failed: {error} (retrying in {delay:.1f}s)")
+            else:
+                self._consecutive_failures = 0
+                delay = self.delay_s
+
+            if self._pending is not None and not self._closed:
+                self._arm(delay)
+
+        emit_event("check_done", ok=error is None, **self.stats())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "events_received": self.events_received,
+            "events_coalesced": self.events_coalesced,
+            "checks_run": self.checks_run,
+            "checks_failed": self.checks_failed,
+            "consecutive_failures": self._consecutive_failures,
+            "last_error": self.last_error,
+        }
+
+
+class ScopedCheck:
+    """
+    Accumulates which teams need re-checking between Debouncer runs.
+
+    Each RTDB change adds its team (or "everything"); the next check_once()
+    drains the set, so a burst touching several teams becomes one check of
+    just those teams. A failed check puts its scope back for the retry.
+
+    Scoping is only trusted for teams that already have a synced model:
+    an RTDB key that isn't one (a push ID, a bookkeeping node, a brand-new
+    team) or a scoped listing that comes back empty runs a full check
+    instead, so an upload is never missed because of how its key is named.
+    """
+
+    def __init__(self, output_dir: str, session: Optional[requests.Session], workers: int = DEFAULT_DOWNLOAD_WORKERS):
+        self.output_dir = output_dir
+        self.session = session
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._full = False
+        self._teams: Set[str] = set()
+
+    def request(self, teams: Optional[Set[str]]) -> None:
+        with self._lock:
+            if teams is None:
+                self._full = True
+            else:
+                self._teams.update(teams)
+
+    def __call__(self) -> None:
+        with self._lock:
+            full, teams = self._full, self._teams
+            self._full, self._teams = False, set()
+
+        if not full and not teams:
+            return
+        if not full:
+            unknown = teams - known_teams(self.output_dir)
+            if unknown:
+                log(f"[listener] No synced models for {', '.join(sorted(unknown))}; checking everything")
+                full = True
+        try:
+            listed = check_once(self.output_dir, session=self.session, workers=self.workers, teams=None if full else teams)
+            if not full and listed == 0:
+                log("[listener] Scoped check listed nothing; checking everything")
+                full = True
+                check_once(self.output_dir, session=self.session, workers=self.workers)
+        except Exception:
+            self.request(None if full else teams)
+            raise
+
+
+def teams_from_rtdb_payload(event: str, payload: Any) -> Optional[Set[str]]:
+    """
+    Teams touched by an RTDB put/patch, or None for "check everything".
+
+    The top-level key is taken as a candidate team name, matching the
+    "<team>_<index>_<dim>.pth" model file names; ScopedCheck falls back to a
+    full check when it isn't a team with synced models. A put at the root is
+    the snapshot sent on every (re)connect and triggers a full check.
+    """
+    if not isinstance(payload, dict):
+        return None
+
+    parts = [p for p in str(payload.get("path", "/")).split("/") if p]
+    if parts:
+        teams = {parts[0]}
+    elif event == "patch" and isinstance(payload.get("data"), dict):
+        teams = {str(k) for k in payload["data"].keys()}
+    else:
+        return None
+
+    teams = {t.strip() for t in teams if t.strip() and "_" not in t and "." not in t}
+    return teams or None
+
+
+async def rtdb_event_stream(
+    on_change: Callable[[str, Any], None],
+    stop_evt: asyncio.Event,
+    http: aiohttp.ClientSession,
+    url: Optional[str] = None,
+    reconnect_initial_s: float = 1.0,
+    reconnect_max_s: float = 60.0,
+    read_timeout_s: float = 90.0,
+) -> None:
+    """
+    Listen for RTDB changes via Firebase REST streaming (SSE).
+
+    Firebase sends a keep-alive event every ~30 s, so a read that stalls for
+    read_timeout_s means the connection is dead and is re-opened. Reconnects
+    use jittered exponential backoff, reset once an event is received.
+    """
+    url = url or rtdb_stream_url()
     headers = {"Accept": "text/event-stream"}
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=read_timeout_s)
+    attempt = 0
 
     while not stop_evt.is_set():
         try:
             log("[listener] Connecting to Firebase RTDB event stream")
-            with requests.get(url, params=params, headers=headers, stream=True, timeout=60) as r:
+            # print=silent, as the legacy requests-based stream sent it
+            async with http.get(url, headers=headers, params={"print": "silent"}, timeout=timeout) as r:
                 r.raise_for_status()
 
-                for raw_line in r.iter_lines(decode_unicode=True):
-                    if stop_evt.is_set():
-                        return
-                    if not raw_line:
+                event = ""
+                data_lines: List[str] = []
+                async for raw_line in r.content:
+                    line = raw_line.decode("utf-8", errors="replace").rstrip("\r\n")
+
+                    if line:
+                        if line.startswith(":"):
+                            continue
+                        field, _, value = line.partition(":")
+                        value = value[1:] if value.startswith(" ") else value
+                        if field == "event":
+                            event = value.strip().lower()
+                        elif field == "data":
+                            data_lines.append(value)
                         continue
 
-                    line = raw_line.strip()
-                    if line.startswith("event:"):
-                        evt = line.split(":", 1)[1].strip().lower()
-                        if evt in ("put", "patch"):
-                            log("[listener] Database changed -> scheduling check")
-                            debouncer.schedule(lambda: check_once(output_dir))
-                    elif line.startswith("data:"):
-                        payload = line.split(":", 1)[1].strip()
-                        if payload and payload != "null":
-                            debouncer.schedule(lambda: check_once(output_dir))
-
-        except requests.exceptions.ReadTimeout:
-            continue
+                    # Blank line ends an event
+                    if not event and not data_lines:
+                        continue
+                    data = "\n".join(data_lines)
+                    name, event, data_lines = event, "", []
+                    attempt = 0
+
+                    if name in ("put", "patch"):
+                        try:
+                            payload = json.loads(data) if data else None
+                        except ValueError:
+                            payload = None
+                        on_change(name, payload)
+                    elif name == "cancel":
+                        log(f"[listener] RTDB stream cancelled by server: {data}")
+                    elif name == "auth_revoked":
+                        log("[listener] RTDB stream auth revoked; reconnecting")
+                        break
+
+            if stop_evt.is_set():
+                return
+            raise ConnectionError("stream closed")
+
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            log(f"[listener] RTDB stream error: {e} (reconnecting in 2s)")
-            time.sleep(2)
+            base = min(reconnect_max_s, reconnect_initial_s * (2 ** attempt))
+            delay = base / 2.0 + random.uniform(0.0, base / 2.0)
+            attempt += 1
+            log(f"[listener] RTDB stream error: {e!r} (reconnecting in {delay:.1f}s)")
+            try:
+                await asyncio.wait_for(stop_evt.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
 
 
-def main() -> None:
-    output_dir = os.environ.get("VISION_ML_MODELS_DIR", DEFAULT_OUTPUT_DIR)
+async def run_listener(
+    output_dir: str,
+    stop_evt: Optional[asyncio.Event] = None,
+    workers: int = DEFAULT_DOWNLOAD_WORKERS,
+    rtdb_url: Optional[str] = None,
+) -> None:
+    """
+    Initial sync, then re-check on every RTDB change until stop_evt is set (or
+    the task is cancelled). Runs standalone via main() or inside the vision
+    system's own event loop; checks themselves run on Debouncer threads.
+    """
+    stop_evt = stop_evt or asyncio.Event()
+    session = make_session(workers)
+    debouncer = Debouncer(delay_s=0.25)
+    checks = ScopedCheck(output_dir, session, workers)
 
-    # Initial sync
-    check_once(output_dir)
+    def on_change(event: str, payload: Any) -> None:
+        teams = teams_from_rtdb_payload(event, payload)
+        scope = ", ".join(sorted(teams)) if teams else "all teams"
+        log(f"[listener] Database {event} -> scheduling check ({scope})")
+        checks.request(teams)
+        debouncer.schedule(checks)
 
-    debouncer = Debouncer(delay_s=0.25)
-    stop_evt = threading.Event()
+    # Initial sync goes through the debouncer so a network failure at boot is retried, not fatal
+    checks.request(None)
+    debouncer.schedule(checks)
+
+    try:
+        async with aiohttp.ClientSession() as http:
+            await rtdb_event_stream(on_change, stop_evt, http, url=rtdb_url)
+    finally:
+        debouncer.cancel()
+        session.close()
 
-    t = threading.Thread(
-        target=db_event_stream_loop,
-        args=(debouncer, output_dir, stop_evt),
-        daemon=True,
-    )
-    t.start()
 
+def main() -> None:
+    output_dir = os.environ.get("VISION_ML_MODELS_DIR", DEFAULT_OUTPUT_DIR)
     try:
-        while True:
-            time.sleep(3600)
+        asyncio.run(run_listener(output_dir))
     except KeyboardInterrupt:
         log("[listener] Shutdown requested (Ctrl+C)")
-        stop_evt.set()
-        time.sleep(0.2)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,35 @@
 import os
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import torch
 import torch.nn.functional as F
-import torchvision
 
-from machinelearning.util import preprocess
+from machinelearning.runtime import backbone_weights_tag, eager_backbone, load_or_compile_backbone
+from machinelearning.util import BatchPreprocessor, preprocess
+
+
+@dataclass(frozen=True)
+class ModelHead:
+    """The per-team part of a model: the final Linear(512, dim) layer."""
+
+    path: Path
+    mtime_ns: int
+    weight: torch.Tensor  # (dim, 512)
+    bias: torch.Tensor  # (dim,)
+    source: str = "pth"  # "head-cache" | "pth-mmap" | "pth"
+    load_ms: float = 0.0
+
+    @property
+    def dim(self) -> int:
+        return int(self.weight.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.weight.numel() * self.weight.element_size() + self.bias.numel() * self.bias.element_size())
 
 
 class Predictor:
@@ -16,16 +39,56 @@ class Predictor:
       - base model: resnet18 (IMAGENET1K_V1)
       - replace fc -> Linear(512, dim)
       - output argmax class index
+
+    Team models only differ in their fc layer, so the backbone is built once,
+    frozen, and shared. Each .pth contributes just its fc weight/bias (a "head"),
+    cached by path + mtime. Nothing shared is mutated during predict(), so it is
+    safe to call from several threads at once.
+
+    The first time a .pth is seen, it is opened memory-mapped (only the fc
+    pages are read) and its head is written to a few-KB file under
+    <models_dir>/.runtime/heads/, keyed by the .pth mtime; later loads, even
+    after a restart, read only that file.
+
+    runtime selects how the backbone executes (see machinelearning.runtime):
+    "eager" (default), "torchscript" or "int8".
+
+    Backbone weights come from backbone_weights (default
+    <models_dir>/.runtime/resnet18_imagenet1k_v1.pth), which is written on the
+    first run so later startups never hit the network.
     """
 
-    def __init__(self, models_dir: Optional[str] = None):
+    def __init__(
+        self,
+        models_dir: Optional[str] = None,
+        input_size: Optional[Tuple[int, int]] = None,
+        runtime: str = "eager",
+        backbone_weights: Optional[str] = None,
+    ):
         repo_root = Path(__file__).resolve().parents[1]
         self.models_dir = Path(models_dir) if models_dir else (repo_root / "machinelearning" / "models")
         self.models_dir = self.models_dir.resolve()
 
-        self.base = torchvision.models.resnet18(weights="IMAGENET1K_V1")
-        self.base = self.base.to(torch.device("cpu"))
-        self.base.eval()
+        # (width, height) frames are resized to before the backbone; None = native size
+        self.input_size = (int(input_size[0]), int(input_size[1])) if input_size else None
+
+        runtime_dir = self.models_dir / ".runtime"
+        self.heads_dir = runtime_dir / "heads"
+        weights_path = Path(backbone_weights) if backbone_weights else (runtime_dir / "resnet18_imagenet1k_v1.pth")
+
+        self.runtime = (runtime or "eager").strip().lower()
+        base = eager_backbone(weights_path=weights_path)
+        self.backbone = load_or_compile_backbone(
+            base,
+            self.runtime,
+            cache_dir=runtime_dir,
+            input_size=self.input_size or (224, 224),
+            weights_tag=backbone_weights_tag(weights_path),
+        )
+        self._batch_pre = BatchPreprocessor(self.input_size)
+
+        self._heads: Dict[Path, ModelHead] = {}
+        self._heads_lock = threading.Lock()
 
     def _find_model_file(self, team_name: str, model_index: int) -> Tuple[Path, int]:
         team = str(team_name).strip()
@@ -71,23 +134,200 @@ class Predictor:
         dim = int(dim_str)
         return best, dim
 
-    def predict(self, frame_bgr, team_name: str, model_index: int) -> int:
+    @staticmethod
+    def _torch_load(path: Path, mmap: bool = False):
+        # weights_only is never dropped: the .pth files are student uploads,
+        # and a full unpickle would run whatever code they contain
+        kwargs = {"map_location": torch.device("cpu"), "weights_only": True}
+        if not mmap:
+            return torch.load(str(path), **kwargs)
+        try:
+            return torch.load(str(path), mmap=True, **kwargs)
+        except TypeError:
+            # torch without mmap support
+            return torch.load(str(path), **kwargs)
+
+    def _head_cache_path(self, model_path: Path, mtime_ns: int) -> Path:
+        return self.heads_dir / f"{model_path.stem}.{mtime_ns}.pt"
+
+    def _read_fc(self, model_path: Path, mtime_ns: int) -> Tuple[Dict[str, torch.Tensor], str]:
+        cached = self._head_cache_path(model_path, mtime_ns)
+        if cached.exists():
+            try:
+                return self._torch_load(cached), "head-cache"
+            except Exception:
+                pass  # rewritten below
+
+        try:
+            state, source = self._torch_load(model_path, mmap=True), "pth-mmap"
+        except RuntimeError:
+            # Legacy (non-zip) checkpoints can't be memory-mapped
+            state, source = self._torch_load(model_path), "pth"
+
+        # clone(): keep just these tensors, not a view into the mapped .pth
+        fc = {k: state[k].detach().clone() for k in ("fc.weight", "fc.bias") if k in state}
+        del state
+
+        if len(fc) == 2:
+            try:
+                self.heads_dir.mkdir(parents=True, exist_ok=True)
+                tmp = cached.with_suffix(".tmp")
+                torch.save(fc, str(tmp))
+                tmp.replace(cached)
+                for old in self.heads_dir.glob(f"{model_path.stem}.*.pt"):
+                    if old != cached:
+                        old.unlink(missing_ok=True)
+            except OSError:
+                pass
+        return fc, source
+
+    def _load_head(self, model_path: Path, dim: int, mtime_ns: int) -> ModelHead:
+        started = time.perf_counter()
+        state, source = self._read_fc(model_path, mtime_ns)
+
+        try:
+            weight = state["fc.weight"].detach().to(torch.float32).contiguous()
+            bias = state["fc.bias"].detach().to(torch.float32).contiguous()
+        except KeyError as e:
+            raise ValueError(f"{model_path.name} has no fc layer ({e})") from None
+
+        if tuple(weight.shape) != (dim, 512) or tuple(bias.shape) != (dim,):
+            raise ValueError(
+                f"{model_path.name}: fc shape {tuple(weight.shape)} does not match Linear(512, {dim})"
+            )
+
+        return ModelHead(
+            path=model_path,
+            mtime_ns=mtime_ns,
+            weight=weight,
+            bias=bias,
+            source=source,
+            load_ms=(time.perf_counter() - started) * 1000.0,
+        )
+
+    def get_head(self, team_name: str, model_index: int) -> ModelHead:
+        """Return the cached head for a team model, (re)loading it if the file changed."""
         model_path, dim = self._find_model_file(team_name, model_index)
+        mtime_ns = model_path.stat().st_mtime_ns
+
+        with self._heads_lock:
+            head = self._heads.get(model_path)
+        if head is not None and head.mtime_ns == mtime_ns and head.dim == dim:
+            return head
 
-        model = self.base
-        model.fc = torch.nn.Linear(512, dim)
-        model = model.to(torch.device("cpu"))
-        model.eval()
+        # Load outside the lock so one slow load does not stall other teams.
+        # Two threads racing on the same file both load it; the last one wins.
+        head = self._load_head(model_path, dim, mtime_ns)
+        with self._heads_lock:
+            self._heads[model_path] = head
+        return head
 
-        # load weights (torch versions differ on weights_only support)
+    def invalidate(self, filename: str) -> int:
+        """Drop cached heads loaded from a model file with this name; returns how many."""
+        name = os.path.basename(str(filename))
+        with self._heads_lock:
+            stale = [p for p in self._heads if p.name == name]
+            for p in stale:
+                del self._heads[p]
+        return len(stale)
+
+    def warm(self, filename: str) -> ModelHead:
+        """Load the head for a model file ({team}_{index}_{dim}.pth) ahead of its first request."""
+        parts = os.path.basename(str(filename)).split("_")
+        if len(parts) < 3:
+            raise ValueError(f"Not a model filename: {filename}")
+        return self.get_head(parts[0], int(parts[1]))
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Memory held by the shared backbone and by each cached team head."""
+        backbone_bytes = 0
         try:
-            state = torch.load(str(model_path), map_location=torch.device("cpu"), weights_only=True)
-        except TypeError:
-            state = torch.load(str(model_path), map_location=torch.device("cpu"))
-        model.load_state_dict(state)
+            for t in list(self.backbone.parameters()) + list(self.backbone.buffers()):
+                backbone_bytes += t.numel() * t.element_size()
+        except Exception:
+            pass  # scripted/quantized modules may not expose tensors this way
+
+        with self._heads_lock:
+            heads = list(self._heads.values())
+
+        return {
+            "runtime": self.runtime,
+            "input_size": list(self.input_size) if self.input_size else None,
+            "backbone_bytes": int(backbone_bytes),
+            "heads_bytes": int(sum(h.nbytes for h in heads)),
+            "models": [
+                {
+                    "file": h.path.name,
+                    "dim": h.dim,
+                    "bytes": h.nbytes,
+                    "source": h.source,
+                    "load_ms": round(h.load_ms, 2),
+                }
+                for h in sorted(heads, key=lambda h: h.path.name)
+            ],
+        }
+
+    def features(self, x: torch.Tensor) -> torch.Tensor:
+        """Run the shared backbone on a preprocessed [N, 3, H, W] batch -> [N, 512]."""
+        with torch.inference_mode():
+            return self.backbone(x)
 
-        x = preprocess(frame_bgr)
-        with torch.no_grad():
-            out = model(x)
-            probs = F.softmax(out, dim=1).detach().cpu().numpy().flatten()
+    @staticmethod
+    def apply_head(head: ModelHead, feats: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return F.linear(feats, head.weight, head.bias)
+
+    def predict(self, frame_bgr, team_name: str, model_index: int) -> int:
+        head = self.get_head(team_name, model_index)
+
+        x = preprocess(frame_bgr, self.input_size)
+        out = self.apply_head(head, self.features(x))
+        probs = F.softmax(out, dim=1).detach().cpu().numpy().flatten()
         return int(probs.argmax())
+
+    def _predict_group(self, group: List[Tuple[int, ModelHead, Any]], results: List[Union[int, Exception]]) -> None:
+        """Runs frames of one preprocessed shape through the backbone as a batch, then each row's head."""
+        x = self._batch_pre.preprocess_batch([f for (_i, _h, f) in group])
+        feats = self.features(x)
+        outs = []
+        for row, (_i, head, _f) in enumerate(group):
+            outs.append(int(self.apply_head(head, feats[row : row + 1]).argmax(dim=1).item()))
+        # Written only once the whole group succeeded, so a retry starts clean
+        for (i, _h, _f), out in zip(group, outs):
+            results[i] = out
+
+    def predict_batch(self, requests: Sequence[Tuple[Any, str, int]]) -> List[Union[int, Exception]]:
+        """
+        Predict several (frame_bgr, team_name, model_index) requests at once.
+
+        Frames with the same preprocessed shape go through the backbone as one
+        batch; each row then gets its own team head. A failure on one request
+        (missing model, bad frame) is returned in its slot instead of raised.
+        """
+        results: List[Union[int, Exception]] = [RuntimeError("not run")] * len(requests)
+        pending: Dict[Tuple[int, int], List[Tuple[int, ModelHead, Any]]] = {}
+
+        for i, (frame_bgr, team_name, model_index) in enumerate(requests):
+            try:
+                head = self.get_head(team_name, model_index)
+                shape = self.input_size or (int(frame_bgr.shape[1]), int(frame_bgr.shape[0]))
+            except Exception as e:
+                results[i] = e
+                continue
+            pending.setdefault(shape, []).append((i, head, frame_bgr))
+
+        for group in pending.values():
+            try:
+                self._predict_group(group, results)
+            except Exception as e:
+                if len(group) == 1:
+                    results[group[0][0]] = e
+                    continue
+                # One bad frame fails the whole batch; retry singly so only it gets the error
+                for item in group:
+                    try:
+                        self._predict_group([item], results)
+                    except Exception as err:
+                        results[item[0]] = err
+
+        return results
@@ -0,0 +1,149 @@
+"""
+Predictor in a separate worker process, for running inference on its own
+cores and GIL (InferenceConfig.process / machinelearning.inference_process).
+
+ProcessPredictor has the Predictor methods InferenceBatcher uses and forwards
+them to a one-process pool; calls run in submission order, so an invalidate()
+always lands before the next batch. Frames are pickled across, which is a
+few hundred microseconds for a batch of ESP-sized images.
+"""
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from utils.executors import process_context
+from utils.logging import get_logger
+
+_PREDICTOR = None
+
+
+def _init_worker(predictor_kwargs: Dict[str, Any], intra_op_threads: int) -> None:
+    global _PREDICTOR
+    import torch
+
+    from machinelearning.predictor import Predictor
+
+    torch.set_num_threads(max(1, int(intra_op_threads)))
+    _PREDICTOR = Predictor(**predictor_kwargs)
+
+
+def _call(method: str, *args):
+    assert _PREDICTOR is not None
+    return getattr(_PREDICTOR, method)(*args)
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+class ProcessPredictor:
+    """
+    Blocks in __init__ until the model is loaded in the worker, so it can be
+    returned from an InferenceBatcher predictor factory like a Predictor.
+    A crashed worker is replaced (and reloads the model) on the next batch,
+    on the inference thread; invalidate() and diagnostics() are called from
+    the event loop and never wait for that. Invalidations that could not reach
+    the old worker are replayed into the new one.
+    """
+
+    def __init__(self, predictor_kwargs: Dict[str, Any], intra_op_threads: int = 2):
+        self._logger = get_logger("ProcessPredictor")
+        self._kwargs = dict(predictor_kwargs)
+        self._threads = int(intra_op_threads)
+        # Held while replacing a dead worker, so two threads cannot each start one
+        self._respawn_lock = threading.Lock()
+        # Filenames invalidated while the worker was dead; guarded by a lock never held for long
+        self._pending_lock = threading.Lock()
+        self._pending_invalidations: List[str] = []
+        self._pool = self._new_pool()
+        self._diagnostics: Dict[str, Any] = {}
+        self._diag_future: Optional[Future] = None
+        self.pid = self._pool.submit(_worker_pid).result()
+        self._diagnostics = self._pool.submit(_call, "diagnostics").result()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=process_context(),
+            initializer=_init_worker,
+            initargs=(self._kwargs, self._threads),
+        )
+
+    def _respawn(self) -> None:
+        """Replaces a dead worker; blocks while the new one loads the model. Caller holds _respawn_lock."""
+        self._logger.error("[ml] Inference process died; starting a new one")
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._new_pool()
+        self.pid = self._pool.submit(_worker_pid).result()
+
+    def _submit(self, method: str, *args) -> Future:
+        """Submits to the worker, replacing it first if it died. Inference thread only."""
+        with self._respawn_lock:
+            try:
+                self._replay_invalidations()
+                return self._pool.submit(_call, method, *args)
+            except BrokenProcessPool:
+                self._respawn()
+                self._replay_invalidations()
+                return self._pool.submit(_call, method, *args)
+
+    def _replay_invalidations(self) -> None:
+        with self._pending_lock:
+            pending, self._pending_invalidations = self._pending_invalidations, []
+        for i, filename in enumerate(pending):
+            try:
+                self._pool.submit(_call, "invalidate", filename)
+            except BrokenProcessPool:
+                with self._pending_lock:
+                    self._pending_invalidations[:0] = pending[i:]
+                raise
+
+    def _record_invalidation(self, filename: str) -> None:
+        with self._pending_lock:
+            if filename not in self._pending_invalidations:
+                self._pending_invalidations.append(filename)
+
+    def _invalidate_done(self, fut: Future, filename: str) -> None:
+        # Queued, but the worker died (or the pool was replaced) before running it
+        if fut.cancelled() or isinstance(fut.exception(), BrokenProcessPool):
+            self._record_invalidation(filename)
+
+    def predict_batch(self, requests: Sequence[Tuple[Any, str, int]]) -> List[Union[int, Exception]]:
+        return self._submit("predict_batch", list(requests)).result()
+
+    def predict(self, frame_bgr, team_name: str, model_index: int) -> int:
+        return self._submit("predict", frame_bgr, team_name, model_index).result()
+
+    def invalidate(self, filename: str) -> None:
+        # Called on the event loop: never replaces a dead worker here (that loads the model).
+        # Not awaited: queued ahead of any later batch anyway
+        try:
+            fut = self._pool.submit(_call, "invalidate", filename)
+        except BrokenProcessPool:
+            self._record_invalidation(filename)
+            return
+        fut.add_done_callback(lambda f: self._invalidate_done(f, filename))
+
+    def warm(self, filename: str) -> None:
+        self._submit("warm", filename).result()
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Last known worker diagnostics; refreshed in the background so callers on the event loop never wait."""
+        fut = self._diag_future
+        if fut is not None and fut.done():
+            try:
+                self._diagnostics = fut.result()
+            except Exception:
+                pass
+            fut = None
+        if fut is None:
+            try:
+                self._diag_future = self._pool.submit(_call, "diagnostics")
+            except BrokenProcessPool:
+                self._diag_future = None
+        return {**self._diagnostics, "process_pid": self.pid}
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,235 @@
+"""
+Optimized CPU runtimes for the shared ResNet18 backbone.
+
+Backends:
+  - "eager":       plain PyTorch fp32 module (reference)
+  - "torchscript": traced, frozen and optimize_for_inference'd fp32 graph
+  - "int8":        static int8 quantization (fused conv/bn/relu, x86/fbgemm),
+                   calibrated on a handful of frames, then traced + frozen
+
+Only the backbone is compiled. Team models differ only in their fc head, which
+stays a tiny fp32 matmul, so one artifact serves every .pth in models_dir.
+
+Artifacts are cached under <models_dir>/.runtime/, keyed by backend, input
+size, torch version and a tag for the backbone weights (e.g. the mtime of a
+local weights file), and are rebuilt whenever any of those change.
+"""
+import re
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+import torch
+import torchvision
+
+from utils.logging import get_logger
+
+BACKENDS = ("eager", "torchscript", "int8")
+
+_logger = get_logger("ml-runtime")
+
+
+def _cache_key(backend: str, input_size: Tuple[int, int], weights_tag: str) -> str:
+    raw = f"{backend}-{input_size[0]}x{input_size[1]}-torch{torch.__version__}-{weights_tag}"
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", raw)
+
+
+def synthetic_calibration_batch(n: int = 32, input_size: Tuple[int, int] = (224, 224), seed: int = 0) -> torch.Tensor:
+    """
+    Normalized [n, 3, H, W] batch of smooth gradients, blobs and noise.
+
+    Not a substitute for real frames, but it exercises the same activation
+    ranges closely enough for int8 calibration of an ImageNet backbone.
+    """
+    import cv2
+
+    from machinelearning.util import BatchPreprocessor
+
+    w, h = int(input_size[0]), int(input_size[1])
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+
+    frames = []
+    for _ in range(n):
+        base = np.empty((h, w, 3), dtype=np.float32)
+        for c in range(3):
+            a, b, k = rng.uniform(-1, 1, size=3)
+            base[:, :, c] = 128 + 100 * np.sin(a * xx / w * 6 + b * yy / h * 6 + k * 3)
+        img = np.clip(base, 0, 255).astype(np.uint8)
+        for _ in range(int(rng.integers(1, 6))):
+            center = (int(rng.integers(0, w)), int(rng.integers(0, h)))
+            radius = int(rng.integers(4, max(5, min(w, h) // 3)))
+            color = tuple(int(v) for v in rng.integers(0, 256, size=3))
+            cv2.circle(img, center, radius, color, -1)
+        img = cv2.add(img, rng.integers(0, 16, img.shape, dtype=np.uint8))
+        frames.append(img)
+
+    return BatchPreprocessor((w, h)).preprocess_batch(frames).clone()
+
+
+def _torchscript(backbone: torch.nn.Module, example: torch.Tensor) -> torch.jit.ScriptModule:
+    # Frozen only: optimize_for_inference() output does not survive save/load,
+    # so it is applied after loading (see _finalize).
+    with torch.inference_mode():
+        traced = torch.jit.trace(backbone, example, check_trace=False)
+    return torch.jit.freeze(traced.eval())
+
+
+def _finalize(module: torch.nn.Module, backend: str) -> torch.nn.Module:
+    if backend == "torchscript":
+        return torch.jit.optimize_for_inference(module)
+    return module
+
+
+def _int8(backbone: torch.nn.Module, example: torch.Tensor, calibration: torch.Tensor) -> torch.jit.ScriptModule:
+    import torch.ao.quantization as tq
+    from torchvision.models.quantization import resnet18 as quantizable_resnet18
+
+    engine = "x86" if "x86" in torch.backends.quantized.supported_engines else "fbgemm"
+    torch.backends.quantized.engine = engine
+
+    qmodel = quantizable_resnet18(weights=None, quantize=False)
+    qmodel.fc = torch.nn.Identity()
+    qmodel.load_state_dict(backbone.state_dict())
+    qmodel.eval()
+    qmodel.fuse_model()
+    qmodel.qconfig = tq.get_default_qconfig(engine)
+    tq.prepare(qmodel, inplace=True)
+
+    with torch.inference_mode():
+        for chunk in calibration.split(8):
+            qmodel(chunk)
+
+    tq.convert(qmodel, inplace=True)
+    with torch.inference_mode():
+        traced = torch.jit.trace(qmodel, example, check_trace=False)
+    return torch.jit.freeze(traced.eval())
+
+
+def _build(
+    backbone: torch.nn.Module,
+    backend: str,
+    input_size: Tuple[int, int],
+    calibration: Optional[torch.Tensor],
+) -> torch.jit.ScriptModule:
+    example = torch.zeros((1, 3, int(input_size[1]), int(input_size[0])), dtype=torch.float32)
+    if backend == "torchscript":
+        return _torchscript(backbone, example)
+    if backend == "int8":
+        if calibration is None:
+            calibration = synthetic_calibration_batch(input_size=input_size)
+        return _int8(backbone, example, calibration)
+
+    raise ValueError(f"Unknown inference backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+
+
+def compile_backbone(
+    backbone: torch.nn.Module,
+    backend: str,
+    input_size: Tuple[int, int] = (224, 224),
+    calibration: Optional[torch.Tensor] = None,
+) -> torch.nn.Module:
+    """Build an optimized copy of an eval-mode fp32 backbone (fc already removed)."""
+    backend = (backend or "eager").strip().lower()
+    if backend == "eager":
+        return backbone
+
+    return _finalize(_build(backbone, backend, input_size, calibration), backend)
+
+
+def load_or_compile_backbone(
+    backbone: torch.nn.Module,
+    backend: str,
+    cache_dir: Optional[Path],
+    input_size: Tuple[int, int] = (224, 224),
+    weights_tag: str = "imagenet1k_v1",
+    calibration: Optional[Callable[[], torch.Tensor]] = None,
+) -> torch.nn.Module:
+    """
+    Return the backbone for `backend`, using a cached artifact when one matches.
+
+    Falls back to the eager module (with a warning) if compiling or loading
+    fails, so a broken runtime never takes predictions down.
+    """
+    backend = (backend or "eager").strip().lower()
+    if backend == "eager":
+        return backbone
+
+    path: Optional[Path] = None
+    if cache_dir is not None:
+        path = Path(cache_dir) / f"backbone-{_cache_key(backend, input_size, weights_tag)}.pt"
+        if path.exists():
+            try:
+                if backend == "int8":
+                    torch.backends.quantized.engine = (
+                        "x86" if "x86" in torch.backends.quantized.supported_engines else "fbgemm"
+                    )
+                module = _finalize(torch.jit.load(str(path), map_location="cpu"), backend)
+                _logger.info(f"[ml] Loaded {backend} backbone from {path.name}")
+                return module
+            except Exception as e:
+                _logger.warning(f"[ml] Cached {backend} backbone unusable ({e}); rebuilding")
+
+    try:
+        calib = calibration() if (calibration is not None and backend == "int8") else None
+        module = _build(backbone, backend, input_size, calib)
+    except Exception as e:
+        _logger.warning(f"[ml] Could not build {backend} backbone ({e}); using eager fp32")
+        return backbone
+
+    if path is not None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            torch.jit.save(module, str(tmp))
+            tmp.replace(path)
+            # Drop artifacts for other keys of the same backend (older torch, old weights, ...)
+            for old in path.parent.glob(f"backbone-{backend}-*.pt"):
+                if old != path:
+                    old.unlink(missing_ok=True)
+        except Exception as e:
+            _logger.warning(f"[ml] Could not cache {backend} backbone: {e}")
+
+    _logger.info(f"[ml] Built {backend} backbone")
+    return _finalize(module, backend)
+
+
+def backbone_weights_tag(weights_path: Optional[Path]) -> str:
+    """Cache-key tag for the backbone weights: the local file's mtime, or the torchvision weights name."""
+    if weights_path is not None and Path(weights_path).exists():
+        return f"local{Path(weights_path).stat().st_mtime_ns}"
+    return "imagenet1k_v1"
+
+
+def eager_backbone(weights: Optional[str] = "IMAGENET1K_V1", weights_path: Optional[Path] = None) -> torch.nn.Module:
+    """
+    ResNet18 with fc removed, frozen, in eval mode.
+
+    With weights_path, the backbone state dict is read from that local file
+    (no torchvision download). If the file does not exist yet, the weights are
+    fetched once via torchvision and saved there for next time.
+    """
+    if weights_path is not None and Path(weights_path).exists():
+        base = torchvision.models.resnet18(weights=None)
+        base.fc = torch.nn.Identity()
+        state = torch.load(str(weights_path), map_location=torch.device("cpu"), weights_only=True)
+        base.load_state_dict({k: v for k, v in state.items() if not k.startswith("fc.")})
+    else:
+        base = torchvision.models.resnet18(weights=weights)
+        base.fc = torch.nn.Identity()
+        if weights_path is not None:
+            try:
+                path = Path(weights_path)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(".tmp")
+                torch.save(base.state_dict(), str(tmp))
+                tmp.replace(path)
+                _logger.info(f"[ml] Saved backbone weights to {path}")
+            except Exception as e:
+                _logger.warning(f"[ml] Could not save backbone weights to {weights_path}: {e}")
+
+    base = base.to(torch.device("cpu"))
+    base.eval()
+    for p in base.parameters():
+        p.requires_grad_(False)
+    return base
@@ -1,21 +1,86 @@
+import threading
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
 import torch
-import torchvision.transforms as transforms
-import PIL.Image
 
 _mean = torch.Tensor([0.485, 0.456, 0.406]).cpu()
 _std = torch.Tensor([0.229, 0.224, 0.225]).cpu()
 
+# to_tensor + normalize folded into one affine per channel:
+#   (x / 255 - mean) / std  ==  x * _scale + _shift
+_scale = (1.0 / (255.0 * _std))[:, None, None]
+_shift = (-_mean / _std)[:, None, None]
+
+
+def preprocess_into(image_bgr: np.ndarray, out: torch.Tensor, input_size: Optional[Tuple[int, int]] = None) -> None:
+    """
+    Write one normalized RGB CHW image into out (a [3, H, W] float32 tensor,
+    typically a row of a preallocated batch).
+
+    input_size=(width, height) resizes with INTER_AREA first; None keeps the
+    frame's native resolution (out must then already match it).
+    """
+    if input_size is not None:
+        w, h = int(input_size[0]), int(input_size[1])
+        if image_bgr.shape[1] != w or image_bgr.shape[0] != h:
+            image_bgr = cv2.resize(image_bgr, (w, h), interpolation=cv2.INTER_AREA)
+
+    # HWC uint8 BGR -> CHW float RGB: each channel is read strided straight into
+    # its plane of out (no intermediate tensor), then the fused affine.
+    src = torch.from_numpy(np.ascontiguousarray(image_bgr))
+    for c in range(3):
+        out[c].copy_(src[..., 2 - c])
+    out.mul_(_scale).add_(_shift)
+
+
+class BatchPreprocessor:
+    """
+    Preprocess frames into a reusable [N, 3, H, W] tensor.
 
-def preprocess(image_bgr):
+    The buffer is per thread (and only grows), so concurrent callers never
+    share memory. Returned tensors are views into it and are only valid until
+    the same thread calls preprocess_batch() again.
+    """
+
+    def __init__(self, input_size: Optional[Tuple[int, int]] = None):
+        self.input_size = (int(input_size[0]), int(input_size[1])) if input_size else None
+        self._local = threading.local()
+
+    def _buffer(self, n: int, h: int, w: int) -> torch.Tensor:
+        buf: Optional[torch.Tensor] = getattr(self._local, "buf", None)
+        if buf is None or buf.shape[0] < n or buf.shape[2] != h or buf.shape[3] != w:
+            cap = max(n, buf.shape[0] if buf is not None else 0)
+            buf = torch.empty((cap, 3, h, w), dtype=torch.float32)
+            self._local.buf = buf
+        return buf[:n]
+
+    def preprocess_batch(self, frames_bgr: Sequence[np.ndarray]) -> torch.Tensor:
+        if self.input_size is not None:
+            w, h = self.input_size
+        else:
+            h, w = frames_bgr[0].shape[:2]
+            for f in frames_bgr[1:]:
+                if f.shape[:2] != (h, w):
+                    raise ValueError("Frames differ in size; set an input_size to batch them")
+
+        out = self._buffer(len(frames_bgr), h, w)
+        for i, frame in enumerate(frames_bgr):
+            preprocess_into(frame, out[i], self.input_size)
+        return out
+
+
+def preprocess(image_bgr, input_size: Optional[Tuple[int, int]] = None):
     """
     image_bgr: numpy array from OpenCV (BGR)
     returns: torch tensor [1, 3, H, W] normalized for ResNet18
     """
-    # Convert BGR -> RGB for PIL
-    image_rgb = image_bgr[:, :, ::-1]
-    image = PIL.Image.fromarray(image_rgb)
-
-    device = torch.device("cpu")
-    t = transforms.functional.to_tensor(image).to(device)
-    t.sub_(_mean[:, None, None]).div_(_std[:, None, None])
-    return t[None, ...]
+    if input_size is not None:
+        w, h = int(input_size[0]), int(input_size[1])
+    else:
+        h, w = image_bgr.shape[:2]
+
+    t = torch.empty((1, 3, h, w), dtype=torch.float32)
+    preprocess_into(image_bgr, t[0], input_size)
+    return t
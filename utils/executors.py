@@ -0,0 +1,104 @@
+"""
+Named thread pools for blocking work, so the event loop only does I/O.
+
+    bgr = await run_blocking("image", decode_jpeg, jpeg)
+
+Which work runs where:
+  - loop:      socket I/O, bookkeeping, and JSON for small messages
+               (ESP replies, log lines)
+  - "image":   OpenCV decode / draw / encode and base64 of camera or ESP
+               frames; cv2 releases the GIL, so this scales with cores
+  - "vision":  ArenaProcessor.process_bgr, one frame at a time
+  - "serialize": json.dumps of large UI events (roster, ML images); holds the
+               GIL, but the loop gets it back every switch interval instead
+               of waiting for the whole payload
+  - "io":      blocking pipe / file reads (GStreamer stdout; each rtp_h264
+               camera holds one thread for its life, so run() adds one per
+               camera to the configured size)
+  - inference has its own pool in InferenceBatcher
+
+Worker processes (the vision worker, the inference process) get their
+multiprocessing context from process_context().
+
+Pools are created lazily, sized by configure() (system.executors in
+config.json) and shared by every session, so soft restarts keep them unless
+the reloaded config changes their size.
+"""
+import asyncio
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+
+from utils.metrics import histogram
+
+T = TypeVar("T")
+
+DEFAULT_SIZES: Dict[str, int] = {
+    "image": max(2, min(4, os.cpu_count() or 2)),
+    "vision": 1,
+    "serialize": 1,
+    "io": 4,
+}
+
+_sizes: Dict[str, int] = dict(DEFAULT_SIZES)
+_pools: Dict[str, ThreadPoolExecutor] = {}
+# Size each existing pool was created with
+_pool_sizes: Dict[str, int] = {}
+
+
+def configure(sizes: Optional[Dict[str, int]] = None) -> None:
+    """
+    Sets pool sizes. A pool that already exists at another size is replaced on
+    its next use; work already submitted to the old one still runs.
+    """
+    for name, size in (sizes or {}).items():
+        name, size = str(name), max(1, int(size))
+        _sizes[name] = size
+        if name in _pools and _pool_sizes.get(name) != size:
+            _pool_sizes.pop(name, None)
+            _pools.pop(name).shutdown(wait=False)
+
+
+def executor(name: str) -> ThreadPoolExecutor:
+    pool = _pools.get(name)
+    if pool is None:
+        if name not in _sizes:
+            raise KeyError(f"Unknown executor pool: {name}")
+        pool = _pools[name] = ThreadPoolExecutor(max_workers=_sizes[name], thread_name_prefix=f"exec-{name}")
+        _pool_sizes[name] = _sizes[name]
+    return pool
+
+
+async def run_blocking(pool: str, fn: Callable[..., T], *args) -> T:
+    """Runs fn(*args) on the named pool, recording queue wait and run time."""
+    m_wait = histogram("executor_wait_seconds", "Time blocking work waited for a pool thread", pool=pool)
+    m_run = histogram("executor_run_seconds", "Time blocking work ran on a pool thread", pool=pool)
+    submitted = time.perf_counter()
+
+    def _call() -> T:
+        started = time.perf_counter()
+        m_wait.observe(started - submitted)
+        try:
+            return fn(*args)
+        finally:
+            m_run.observe(time.perf_counter() - started)
+
+    return await asyncio.get_running_loop().run_in_executor(executor(pool), _call)
+
+
+def process_context():
+    """multiprocessing context for worker processes.
+
+    spawn, not fork: the parent has an event loop and threads running, and a
+    forked child would inherit their locks in whatever state they were in.
+    """
+    return mp.get_context("spawn")
+
+
+def shutdown() -> None:
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _pools.clear()
+    _pool_sizes.clear()
@@ -0,0 +1,236 @@
+"""
+Event-loop health: how late the loop wakes up (lag) and which callbacks
+held it (slow callbacks).
+
+    monitor = LoopMonitor(LoopMonitorConfig(slow_callback_ms=50))
+    monitor.start()      # on the running loop
+    ...
+    await monitor.stop()
+
+Slow callbacks are attributed to the task's coroutine (innermost frame where
+it next suspended) or to the plain callback, logged, and
+exported as event_loop_slow_callbacks_total / event_loop_blocked_seconds_total
+labelled by callback. asyncio's own debug-mode slow_callback_duration does the
+same detection but slows every other part of the loop down as well.
+"""
+import asyncio
+import asyncio.events
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.logging import get_logger
+from utils.metrics import counter, gauge, histogram
+
+_M_LAG = histogram("event_loop_lag_seconds", "How late a periodic sleep on the event loop woke up")
+_M_LAG_MAX = gauge("event_loop_lag_max_seconds", "Largest event loop lag in the last report interval")
+
+
+@dataclass
+class LoopMonitorConfig:
+    enabled: bool = True
+    sample_interval_ms: float = 50.0
+    # Lag above this is logged with the callbacks that caused it
+    lag_warn_ms: float = 100.0
+    # Callbacks that run longer than this without yielding are reported
+    slow_callback_ms: float = 50.0
+    # Each callback is logged at most once per interval; the rest are summarized
+    report_interval_s: float = 30.0
+
+
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+
+def _innermost_frame(coro: Any):
+    """Deepest frame of an await chain outside asyncio itself (asyncio.sleep etc. say nothing useful)."""
+    frame = None
+    while coro is not None:
+        f = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if f is None:
+            break
+        if not f.f_code.co_filename.startswith(_ASYNCIO_DIR):
+            frame = f
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frame
+
+
+def _frame_location(frame) -> str:
+    if frame is None:
+        return "?"
+    filename = frame.f_code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{'/'.join(filename[-2:])}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+def _callback_name(cb: Any) -> str:
+    name = getattr(cb, "__qualname__", None) or getattr(cb, "__name__", None) or type(cb).__name__
+    module = getattr(cb, "__module__", None)
+    return f"{module}.{name}" if module else name
+
+
+class _Blocker:
+    __slots__ = ("count", "total_s", "max_s", "last_logged", "suppressed")
+
+    def __init__(self):
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.last_logged = 0.0
+        self.suppressed = 0
+
+
+class LoopMonitor:
+    """
+    Samples event loop lag and reports callbacks that block the loop.
+
+    Detection wraps asyncio.Handle._run, which every loop callback (task steps
+    included) goes through; the wrapper costs two perf_counter() calls and an
+    attribute lookup per callback on the monitored loop and is removed again by
+    stop(). The await chain is only walked for callbacks over the threshold, so
+    where a slow step resumed is not known, only where it suspended.
+    """
+
+    def __init__(self, cfg: Optional[LoopMonitorConfig] = None, logger=None):
+        self.cfg = cfg or LoopMonitorConfig()
+        self.logger = logger or get_logger("loop")
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._orig_run = None
+
+        self._blockers: Dict[str, _Blocker] = {}
+        # Slow callbacks since the last lag sample, so a late wakeup can name them
+        self._recent: List[Tuple[str, float]] = []
+        self._window_lag_max_s = 0.0
+
+    # -------------------- Lifecycle --------------------
+
+    def start(self) -> None:
+        if not self.cfg.enabled or self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._install_hook()
+        self._task = asyncio.create_task(self._sample_loop())
+
+    async def stop(self) -> None:
+        self._remove_hook()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _install_hook(self) -> None:
+        if self._orig_run is not None:
+            return
+        orig_run = asyncio.events.Handle._run
+        monitor = self
+        loop = self._loop
+        threshold_s = max(0.0, float(self.cfg.slow_callback_ms)) / 1000.0
+
+        def _run(handle):
+            if handle._loop is not loop:
+                return orig_run(handle)
+            cb = handle._callback
+            owner = getattr(cb, "__self__", None)
+            t0 = time.perf_counter()
+            try:
+                return orig_run(handle)
+            finally:
+                dt = time.perf_counter() - t0
+                if dt >= threshold_s:
+                    monitor._on_slow_callback(cb, owner, dt)
+
+        self._orig_run = orig_run
+        asyncio.events.Handle._run = _run  # type: ignore[method-assign]
+
+    def _remove_hook(self) -> None:
+        if self._orig_run is None:
+            return
+        asyncio.events.Handle._run = self._orig_run  # type: ignore[method-assign]
+        self._orig_run = None
+
+    # -------------------- Slow callbacks --------------------
+
+    def _on_slow_callback(self, cb, owner, dt: float) -> None:
+        coro = owner.get_coro() if isinstance(owner, asyncio.Task) else None
+        if coro is not None:
+            name = getattr(coro, "__qualname__", None) or type(coro).__name__
+            suspended = _innermost_frame(coro)
+            detail = f"task {owner.get_name()} ({name})"
+            detail += f" until {_frame_location(suspended)}" if suspended is not None else " until it finished"
+        else:
+            name = _callback_name(cb)
+            detail = f"callback {name}"
+
+        counter("event_loop_slow_callbacks_total", "Loop callbacks slower than slow_callback_ms", callback=name).inc()
+        counter("event_loop_blocked_seconds_total", "Time spent in slow loop callbacks", callback=name).inc(dt)
+
+        b = self._blockers.get(name)
+        if b is None:
+            b = self._blockers[name] = _Blocker()
+        b.count += 1
+        b.total_s += dt
+        b.max_s = max(b.max_s, dt)
+        self._recent.append((name, dt))
+
+        now = time.monotonic()
+        if now - b.last_logged >= float(self.cfg.report_interval_s):
+            extra = f" (+{b.suppressed} more since last report)" if b.suppressed else ""
+            self.logger.warning(f"[loop] Blocked {dt * 1000.0:.0f} ms by {detail}{extra}")
+            b.last_logged = now
+            b.suppressed = 0
+        else:
+            b.suppressed += 1
+
+    # -------------------- Lag sampling --------------------
+
+    async def _sample_loop(self) -> None:
+        interval_s = max(1e-3, float(self.cfg.sample_interval_ms) / 1000.0)
+        warn_s = max(0.0, float(self.cfg.lag_warn_ms)) / 1000.0
+        next_report = time.monotonic() + float(self.cfg.report_interval_s)
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(interval_s)
+            lag = max(0.0, time.perf_counter() - t0 - interval_s)
+            _M_LAG.observe(lag)
+            self._window_lag_max_s = max(self._window_lag_max_s, lag)
+
+            if lag >= warn_s:
+                culprits = sorted(self._recent, key=lambda item: item[1], reverse=True)[:3]
+                blamed = ", ".join(f"{name} {dt * 1000.0:.0f} ms" for name, dt in culprits)
+                self.logger.warning(
+                    f"[loop] Event loop lag {lag * 1000.0:.0f} ms"
+                    + (f"; slow callbacks: {blamed}" if blamed else "")
+                )
+            self._recent.clear()
+
+            if time.monotonic() >= next_report:
+                _M_LAG_MAX.set(self._window_lag_max_s)
+                self._log_report()
+                self._window_lag_max_s = 0.0
+                next_report = time.monotonic() + float(self.cfg.report_interval_s)
+
+    def _log_report(self) -> None:
+        if not self._blockers:
+            return
+        top = sorted(self._blockers.items(), key=lambda kv: kv[1].total_s, reverse=True)[:5]
+        parts = [f"{name} {b.count}x {b.total_s * 1000.0:.0f} ms (max {b.max_s * 1000.0:.0f})" for name, b in top]
+        self.logger.info(
+            f"[loop] Max lag {self._window_lag_max_s * 1000.0:.0f} ms in the last "
+            f"{float(self.cfg.report_interval_s):.0f} s; blocking callbacks: " + ", ".join(parts)
+        )
+        self._blockers.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lag_p50_ms": _M_LAG.quantile(0.50) * 1000.0,
+            "lag_p99_ms": _M_LAG.quantile(0.99) * 1000.0,
+            "lag_max_window_ms": self._window_lag_max_s * 1000.0,
+            "blockers": {
+                name: {"count": b.count, "total_ms": b.total_s * 1000.0, "max_ms": b.max_s * 1000.0}
+                for name, b in self._blockers.items()
+            },
+        }
@@ -0,0 +1,255 @@
+"""
+Lightweight in-process metrics: counters, gauges and log-linear histograms,
+exported as Prometheus text (/metrics) or JSON (/api/stats).
+
+    FRAMES = counter("vision_frames_total", "Frames processed")
+    DETECT = histogram("vision_stage_seconds", "Per-stage time", stage="detect")
+
+    FRAMES.inc()
+    with DETECT.time():
+        ...
+
+Metrics are created once at import time and updated from any thread;
+updates are a few hundred nanoseconds, so they can sit on per-frame paths.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in items)
+    return "{" + inner + "}"
+
+
+def _format_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v))
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"value": self._value}
+
+
+class Gauge:
+    def __init__(self):
+        self._value = 0.0
+
+    def set(self, value: float) -> None:
+        self._value = float(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._value -= amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"value": self._value}
+
+
+class Histogram:
+    """
+    HDR-style histogram of seconds: SUB_BUCKETS linear buckets per power of
+    two from MIN_VALUE up, so relative error is bounded (~9%) at every scale
+    and observe() is O(1) with no allocation.
+    """
+
+    MIN_VALUE = 1e-6  # 1 us
+    OCTAVES = 28  # 1 us * 2**28 ~ 4.5 min
+    SUB_BUCKETS = 8
+    # Coarse bucket bounds for the Prometheus export
+    EXPORT_BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._counts = [0] * (self.OCTAVES * self.SUB_BUCKETS + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def _index(self, v: float) -> int:
+        if v < self.MIN_VALUE:
+            return 0
+        m, e = math.frexp(v / self.MIN_VALUE)  # v/MIN = m * 2**e, m in [0.5, 1)
+        i = (e - 1) * self.SUB_BUCKETS + int((m * 2.0 - 1.0) * self.SUB_BUCKETS) + 1
+        return min(i, len(self._counts) - 1)
+
+    def _upper_bound(self, i: int) -> float:
+        if i == 0:
+            return self.MIN_VALUE
+        octave, sub = divmod(i - 1, self.SUB_BUCKETS)
+        return self.MIN_VALUE * (2.0 ** octave) * (1.0 + (sub + 1) / self.SUB_BUCKETS)
+
+    def observe(self, seconds: float) -> None:
+        i = self._index(seconds)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += seconds
+            self._count += 1
+            if seconds > self._max:
+                self._max = seconds
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            vmax = self._max
+        if total == 0:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank and c:
+                return min(self._upper_bound(i), vmax)
+        return vmax
+
+    def buckets(self) -> List[Tuple[float, int]]:
+        """Cumulative (le, count) pairs at EXPORT_BOUNDS, ending with +Inf."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+        out: List[Tuple[float, int]] = []
+        i = 0
+        running = 0
+        for bound in self.EXPORT_BOUNDS:
+            while i < len(counts) and self._upper_bound(i) <= bound * (1 + 1e-9):
+                running += counts[i]
+                i += 1
+            out.append((bound, running))
+        out.append((math.inf, total))
+        return out
+
+    def to_dict(self) -> Dict[str, float]:
+        n = self._count
+        return {
+            "count": float(n),
+            "mean_ms": (self._sum / n) * 1000.0 if n else 0.0,
+            "p50_ms": self.quantile(0.50) * 1000.0,
+            "p95_ms": self.quantile(0.95) * 1000.0,
+            "p99_ms": self.quantile(0.99) * 1000.0,
+            "max_ms": self._max * 1000.0,
+        }
+
+
+class _Family:
+    def __init__(self, name: str, kind: str, help_text: str):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.children: Dict[LabelKey, object] = {}
+
+
+class Registry:
+    _KINDS = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+    def __init__(self):
+        self._families: Dict[str, _Family] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind: str, name: str, help_text: str, labels: Dict[str, str]):
+        key = _label_key(labels)
+        with self._lock:
+            fam = self._families.get(name)
+            if fam is None:
+                fam = self._families[name] = _Family(name, kind, help_text)
+            elif fam.kind != kind:
+                raise ValueError(f"metric {name} already registered as a {fam.kind}")
+            metric = fam.children.get(key)
+            if metric is None:
+                metric = fam.children[key] = self._KINDS[kind]()
+            return metric
+
+    def counter(self, name: str, help_text: str = "", **labels: str) -> Counter:
+        return self._get("counter", name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str = "", **labels: str) -> Gauge:
+        return self._get("gauge", name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str = "", **labels: str) -> Histogram:
+        return self._get("histogram", name, help_text, labels)
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            families = [(f, list(f.children.items())) for f in self._families.values()]
+        for fam, children in families:
+            if fam.help:
+                lines.append(f"# HELP {fam.name} {fam.help}")
+            lines.append(f"# TYPE {fam.name} {fam.kind}")
+            for key, metric in children:
+                if isinstance(metric, Histogram):
+                    for bound, count in metric.buckets():
+                        le = _format_labels(key, ("le", _format_value(bound)))
+                        lines.append(f"{fam.name}_bucket{le} {count}")
+                    lines.append(f"{fam.name}_sum{_format_labels(key)} {_format_value(metric._sum)}")
+                    lines.append(f"{fam.name}_count{_format_labels(key)} {metric.count}")
+                else:
+                    lines.append(f"{fam.name}{_format_labels(key)} {_format_value(metric.value)}")  # type: ignore[attr-defined]
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """name -> "label=value,..." (or "") -> the metric's to_dict()."""
+        out: Dict[str, Dict[str, Dict[str, float]]] = {}
+        with self._lock:
+            families = [(f, list(f.children.items())) for f in self._families.values()]
+        for fam, children in families:
+            out[fam.name] = {",".join(f"{k}={v}" for k, v in key): m.to_dict() for key, m in children}  # type: ignore[attr-defined]
+        return out
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help_text: str = "", **labels: str) -> Counter:
+    return REGISTRY.counter(name, help_text, **labels)
+
+
+def gauge(name: str, help_text: str = "", **labels: str) -> Gauge:
+    return REGISTRY.gauge(name, help_text, **labels)
+
+
+def histogram(name: str, help_text: str = "", **labels: str) -> Histogram:
+    return REGISTRY.histogram(name, help_text, **labels)
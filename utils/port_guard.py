@@ -1,6 +1,6 @@
 import socket
 from contextlib import closing
-from typing import Optional
+from typing import Optional, Tuple
 
 from utils.logging import get_logger
 
@@ -30,6 +30,7 @@ def ensure_ports_available(
     tcp_host: str,
     tcp_port: int,
     extra_tcp_ports: Optional[list[int]] = None,
+    extra_udp_ports: Optional[list[Tuple[str, int]]] = None,
 ) -> None:
     """
     Ensures the ports required by the system are available.
@@ -37,15 +38,17 @@ def ensure_ports_available(
     - UDP port for camera ingest (RTP/H264 stream)
     - TCP port for frontend web server
     - Optional additional TCP ports (e.g., ESP WebSocket server)
+    - Optional additional (host, port) UDP ports (further cameras)
 
     If any are unavailable, logs a fatal and raises RuntimeError.
     """
     logger = get_logger("port_guard")
 
-    udp_err = _try_bind_udp(udp_host, udp_port)
-    if udp_err is not None:
-        logger.fatal(f"UDP port not available: {udp_host}:{udp_port} ({udp_err})")
-        raise RuntimeError(f"UDP port in use: {udp_host}:{udp_port}")
+    for host, port in [(udp_host, int(udp_port))] + [(h, int(p)) for h, p in (extra_udp_ports or [])]:
+        udp_err = _try_bind_udp(host, port)
+        if udp_err is not None:
+            logger.fatal(f"UDP port not available: {host}:{port} ({udp_err})")
+            raise RuntimeError(f"UDP port in use: {host}:{port}")
 
     ports = [int(tcp_port)] + [int(p) for p in (extra_tcp_ports or [])]
     for p in ports:
@@ -55,4 +58,6 @@ def ensure_ports_available(
             raise RuntimeError(f"TCP port in use: {tcp_host}:{p}")
 
     extras = "" if not (extra_tcp_ports or []) else f", extra TCP {extra_tcp_ports}"
+    if extra_udp_ports:
+        extras += f", extra UDP {[f'{h}:{p}' for h, p in extra_udp_ports]}"
     logger.info(f"Ports OK: UDP {udp_host}:{udp_port}, TCP {tcp_host}:{tcp_port}{extras}")
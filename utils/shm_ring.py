@@ -0,0 +1,359 @@
+"""
+Single-writer ring buffer of preallocated frame slots in shared memory, for
+handing JPEGs, raw BGR frames and pose snapshots between threads and
+processes without pickling or copying.
+
+    ring = ShmRing.create("vmv-raw", slots=4, slot_bytes=2 << 20)   # owner
+    ring.write(jpeg)                 # or ring.write_array(bgr)
+
+    ring = ShmRing.attach("vmv-raw")                                 # any process
+    msg = ring.latest()              # (seq, ts, bytes) copy, or None
+
+    detector = RingReader(ring, "detector")
+    with detector.borrow() as frame:  # zero-copy view of the next frame
+        if frame is not None:
+            bgr = cv2.imdecode(np.frombuffer(frame.data, np.uint8), cv2.IMREAD_COLOR)
+    if detector.last_torn:
+        ...                          # the writer reused the slot mid-read; drop bgr
+
+Every message gets the next sequence number (from 1). Readers never block
+the writer: each slot carries the sequence number of the message in it,
+cleared while the slot is being rewritten, and a reader that sees it change
+under its copy retries or discards (a per-slot seqlock).
+
+Named readers keep their cursor and counters in the ring header, so any
+process attached to the ring can see every reader's backpressure:
+frames overwritten before that reader got to them, frames it skipped to
+stay current, and torn (rewritten mid-read) borrows.
+"""
+import os
+import struct
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from utils.metrics import counter
+
+MAGIC = 0x564D5652  # "VMVR"
+VERSION = 2
+
+# magic, version, slots, slot_bytes, head_seq, oversize_drops
+_HEADER = struct.Struct("<IIIIQQ")
+_HEADER_FIXED_BYTES = 64
+
+MAX_READERS = 8
+READER_NAME_BYTES = 24
+# name, pid, pad, cursor, reads, overwritten, skipped, torn
+_READER = struct.Struct(f"<{READER_NAME_BYTES}sII5Q")
+_READER_BYTES = 72
+HEADER_BYTES = _HEADER_FIXED_BYTES + MAX_READERS * _READER_BYTES
+
+# seq, length, pad, ts, height, width, channels (shape is zero for plain bytes)
+_SLOT = struct.Struct("<QIIdIII4x")
+SLOT_HEADER_BYTES = _SLOT.size
+
+Message = Tuple[int, float, bytes]
+
+
+class FrameView(NamedTuple):
+    seq: int
+    ts: float
+    data: memoryview
+    shape: Optional[Tuple[int, int, int]]
+
+    def array(self) -> np.ndarray:
+        """The slot as a uint8 HxWxC array (no copy); only valid inside borrow()."""
+        assert self.shape is not None, "slot holds bytes, not an array"
+        return np.frombuffer(self.data, dtype=np.uint8).reshape(self.shape)
+
+
+class ShmRing:
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self._owner = owner
+        self._buf = shm.buf
+        magic, version, slots, slot_bytes, _head, _drops = _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{shm.name} is not a version {VERSION} ShmRing")
+        self.slots = int(slots)
+        self.slot_bytes = int(slot_bytes)
+        self._stride = SLOT_HEADER_BYTES + self.slot_bytes
+
+        # Reader-side cache so latest() on an unchanged ring costs no copy
+        self._cached: Optional[Message] = None
+
+    @classmethod
+    def create(cls, name: str, slots: int = 4, slot_bytes: int = 1 << 20) -> "ShmRing":
+        slots = max(2, int(slots))
+        slot_bytes = max(1, int(slot_bytes))
+        size = HEADER_BYTES + slots * (SLOT_HEADER_BYTES + slot_bytes)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:HEADER_BYTES] = bytes(HEADER_BYTES)
+        _HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, slots, slot_bytes, 0, 0)
+        for i in range(slots):
+            _SLOT.pack_into(shm.buf, HEADER_BYTES + i * (SLOT_HEADER_BYTES + slot_bytes), 0, 0, 0, 0.0, 0, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "ShmRing":
+        return cls(shared_memory.SharedMemory(name=name, create=False), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def head_seq(self) -> int:
+        """Sequence number of the newest complete message (0 = none yet)."""
+        return _HEADER.unpack_from(self._buf, 0)[4]
+
+    @property
+    def oversize_drops(self) -> int:
+        return _HEADER.unpack_from(self._buf, 0)[5]
+
+    def _slot_offset(self, seq: int) -> int:
+        return HEADER_BYTES + (seq % self.slots) * self._stride
+
+    def _slot_seq(self, seq: int) -> int:
+        return _SLOT.unpack_from(self._buf, self._slot_offset(seq))[0]
+
+    # -------------------- Writer --------------------
+
+    def _write(self, data, n: int, ts: Optional[float], shape: Tuple[int, int, int]) -> int:
+        magic, version, slots, slot_bytes, head, drops = _HEADER.unpack_from(self._buf, 0)
+        if n > self.slot_bytes:
+            _HEADER.pack_into(self._buf, 0, magic, version, slots, slot_bytes, head, drops + 1)
+            return 0
+
+        seq = head + 1
+        off = self._slot_offset(seq)
+        # seq 0 marks the slot as being rewritten; readers that see it (or a
+        # different seq after their copy) retry or discard
+        _SLOT.pack_into(self._buf, off, 0, 0, 0, 0.0, 0, 0, 0)
+        start = off + SLOT_HEADER_BYTES
+        self._buf[start:start + n] = data
+        _SLOT.pack_into(self._buf, off, seq, n, 0, time.time() if ts is None else float(ts), *shape)
+        _HEADER.pack_into(self._buf, 0, magic, version, slots, slot_bytes, seq, drops)
+        return seq
+
+    def write(self, data: bytes, ts: Optional[float] = None) -> int:
+        """Publish data; returns its sequence number, or 0 if it does not fit a slot."""
+        return self._write(data, len(data), ts, (0, 0, 0))
+
+    def write_array(self, frame: np.ndarray, ts: Optional[float] = None) -> int:
+        """Publish a uint8 HxW or HxWxC frame (e.g. decoded BGR) without encoding it."""
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        h, w = frame.shape[:2]
+        c = frame.shape[2] if frame.ndim == 3 else 1
+        return self._write(frame.reshape(-1), frame.nbytes, ts, (h, w, c))
+
+    # -------------------- Readers --------------------
+
+    def read(self, seq: int) -> Optional[Message]:
+        """The message with this sequence number, or None if it was never written or was overwritten."""
+        if seq <= 0:
+            return None
+        off = self._slot_offset(seq)
+        slot_seq, n, _pad, ts, _h, _w, _c = _SLOT.unpack_from(self._buf, off)
+        if slot_seq != seq:
+            return None
+        start = off + SLOT_HEADER_BYTES
+        data = bytes(self._buf[start:start + n])
+        if self._slot_seq(seq) != seq:
+            return None  # rewritten while we copied
+        return seq, ts, data
+
+    def view(self, seq: int) -> Optional[FrameView]:
+        """
+        Zero-copy view of a slot. The writer may reuse the slot at any time;
+        check still_valid(seq) after using the data (RingReader.borrow does).
+        """
+        if seq <= 0:
+            return None
+        off = self._slot_offset(seq)
+        slot_seq, n, _pad, ts, h, w, c = _SLOT.unpack_from(self._buf, off)
+        if slot_seq != seq:
+            return None
+        start = off + SLOT_HEADER_BYTES
+        return FrameView(seq, ts, self._buf[start:start + n], (h, w, c) if h else None)
+
+    def still_valid(self, seq: int) -> bool:
+        return self._slot_seq(seq) == seq
+
+    def latest(self) -> Optional[Message]:
+        for _ in range(8):
+            head = self.head_seq
+            if head == 0:
+                return None
+            if self._cached is not None and self._cached[0] == head:
+                return self._cached
+            msg = self.read(head)
+            if msg is not None:
+                self._cached = msg
+                return msg
+        # The writer lapped us every time; the cached message is the best we have
+        return self._cached
+
+    # -------------------- Reader registry --------------------
+
+    def _reader_offset(self, index: int) -> int:
+        return _HEADER_FIXED_BYTES + index * _READER_BYTES
+
+    def _claim_reader(self, name: str, pid: int) -> int:
+        """Index of the reader entry for name, claiming a free one if needed."""
+        raw = name.encode("utf-8")[:READER_NAME_BYTES].ljust(READER_NAME_BYTES, b"\0")
+        free = -1
+        for i in range(MAX_READERS):
+            entry_name = _READER.unpack_from(self._buf, self._reader_offset(i))[0]
+            if entry_name == raw:
+                _READER.pack_into(self._buf, self._reader_offset(i), raw, pid, 0, *self._reader_counts(i))
+                return i
+            if free < 0 and not entry_name.strip(b"\0"):
+                free = i
+        if free < 0:
+            raise RuntimeError(f"{self.name}: more than {MAX_READERS} readers")
+        _READER.pack_into(self._buf, self._reader_offset(free), raw, pid, 0, self.head_seq, 0, 0, 0, 0)
+        return free
+
+    def _reader_counts(self, index: int) -> Tuple[int, int, int, int, int]:
+        return _READER.unpack_from(self._buf, self._reader_offset(index))[3:]
+
+    def _store_reader_counts(self, index: int, counts: Tuple[int, int, int, int, int]) -> None:
+        off = self._reader_offset(index)
+        name, pid = _READER.unpack_from(self._buf, off)[:2]
+        _READER.pack_into(self._buf, off, name, pid, 0, *counts)
+
+    def reader_stats(self) -> Dict[str, Dict[str, int]]:
+        """Every registered reader's cursor and counters, as seen from this process."""
+        head = self.head_seq
+        out: Dict[str, Dict[str, int]] = {}
+        for i in range(MAX_READERS):
+            raw, pid, _pad, cursor, reads, overwritten, skipped, torn = _READER.unpack_from(
+                self._buf, self._reader_offset(i)
+            )
+            name = raw.rstrip(b"\0").decode("utf-8", errors="replace")
+            if not name:
+                continue
+            out[name] = {
+                "pid": pid,
+                "cursor": cursor,
+                "lag": max(0, head - cursor),
+                "reads": reads,
+                "overwritten": overwritten,
+                "skipped": skipped,
+                "torn": torn,
+            }
+        return out
+
+    # -------------------- Lifecycle --------------------
+
+    def close(self) -> None:
+        self._cached = None
+        self._buf = None  # type: ignore[assignment]
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # a borrowed view is still alive; the mapping goes away with the process
+        except Exception:
+            pass
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class RingReader:
+    """
+    A named cursor into a ShmRing. With latest=True (streamers, detectors)
+    each read jumps to the newest frame and frames passed over count as
+    skipped; with latest=False (recorders) frames are read in order and
+    only those the writer overwrote first are lost.
+
+    One RingReader per consumer; it is not shared between threads.
+    """
+
+    def __init__(self, ring: ShmRing, name: str, latest: bool = True, label: Optional[str] = None):
+        self.ring = ring
+        self.name = name
+        self.latest = latest
+        self.last_torn = False
+        self._index = ring._claim_reader(name, os.getpid())
+        # label names the ring in metrics; shm names are unique per run
+        label = label or ring.name
+        self._m_overwritten = counter(
+            "ring_overwritten_total", "Frames overwritten before a reader got to them", ring=label, reader=name
+        )
+        self._m_torn = counter("ring_torn_reads_total", "Borrowed frames rewritten mid-read", ring=label, reader=name)
+
+    @property
+    def cursor(self) -> int:
+        return self.ring._reader_counts(self._index)[0]
+
+    def _next_seq(self) -> Optional[int]:
+        """Picks the next sequence number to read and accounts for frames passed over."""
+        cursor, reads, overwritten, skipped, torn = self.ring._reader_counts(self._index)
+        head = self.ring.head_seq
+        if head <= cursor:
+            return None
+        oldest = max(1, head - self.ring.slots + 2)  # head - slots + 1 may be mid-rewrite
+        if self.latest:
+            seq = head
+            lost = max(0, oldest - 1 - cursor)
+            passed = max(0, head - 1 - max(cursor, oldest - 1))
+        else:
+            seq = max(cursor + 1, oldest)
+            lost = seq - cursor - 1
+            passed = 0
+        if lost:
+            self._m_overwritten.inc(lost)
+        self.ring._store_reader_counts(self._index, (seq, reads + 1, overwritten + lost, skipped + passed, torn))
+        return seq
+
+    def poll(self) -> Optional[Message]:
+        """Copy of the next unread message, or None when caught up."""
+        while True:
+            seq = self._next_seq()
+            if seq is None:
+                return None
+            msg = self.ring.read(seq)
+            if msg is not None:
+                return msg
+            self._count_torn()
+
+    @contextmanager
+    def borrow(self) -> Iterator[Optional[FrameView]]:
+        """Zero-copy view of the next unread frame (None when caught up); sets last_torn on exit."""
+        self.last_torn = False
+        view: Optional[FrameView] = None
+        while True:
+            seq = self._next_seq()
+            if seq is None:
+                break
+            view = self.ring.view(seq)
+            if view is not None:
+                break
+            self._count_torn()
+        try:
+            yield view
+        finally:
+            if view is not None:
+                if not self.ring.still_valid(view.seq):
+                    self.last_torn = True
+                    self._count_torn()
+                try:
+                    view.data.release()
+                except BufferError:
+                    pass  # caller still holds an array on it
+
+    def _count_torn(self) -> None:
+        cursor, reads, overwritten, skipped, torn = self.ring._reader_counts(self._index)
+        self.ring._store_reader_counts(self._index, (cursor, reads, overwritten, skipped, torn + 1))
+        self._m_torn.inc()
+
+    def stats(self) -> Dict[str, int]:
+        return self.ring.reader_stats().get(self.name, {})
+
@@ -0,0 +1,61 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.logging import get_logger
+
+
+class StartupTimeline:
+    """
+    Records how long each phase of a startup (or soft restart) takes.
+
+        timeline = StartupTimeline("startup")
+        with timeline.phase("arenacam"):
+            await arenacam.start()
+        timeline.mark("first_frame")   # point event, relative to t0
+        timeline.log_summary()
+    """
+
+    def __init__(self, name: str = "startup", logger=None):
+        self.name = name
+        self.logger = logger or get_logger("timeline")
+        self._t0 = time.perf_counter()
+        self._phases: List[Tuple[str, float, float]] = []  # (name, start_s, duration_s)
+        self._marks: Dict[str, float] = {}
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._t0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._phases.append((name, start - self._t0, end - start))
+            self.logger.debug(f"[{self.name}] {name}: {(end - start) * 1000.0:.0f} ms")
+
+    def mark(self, name: str) -> None:
+        if name in self._marks:
+            return
+        self._marks[name] = self.elapsed()
+        self.logger.info(f"[{self.name}] {name} at +{self._marks[name] * 1000.0:.0f} ms")
+
+    def mark_time(self, name: str) -> Optional[float]:
+        return self._marks.get(name)
+
+    def log_summary(self) -> None:
+        parts = [f"{name} {dur * 1000.0:.0f} ms" for (name, _start, dur) in self._phases]
+        self.logger.info(f"[{self.name}] {self.elapsed() * 1000.0:.0f} ms total: " + ", ".join(parts))
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "name": self.name,
+            "total_ms": self.elapsed() * 1000.0,
+            "phases": [
+                {"name": name, "start_ms": start * 1000.0, "duration_ms": dur * 1000.0}
+                for (name, start, dur) in self._phases
+            ],
+            "marks_ms": {k: v * 1000.0 for k, v in self._marks.items()},
+        }
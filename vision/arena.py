@@ -8,6 +8,7 @@ import time
 import math
 
 from utils.logging import web_info
+from utils.metrics import counter, histogram
 from vision.aruco import ArucoDetector, ArucoMarker
 
 
@@ -30,6 +31,12 @@ class ArenaConfig:
     output_width: int = 1000
     output_height: int = 500
 
+    # Working resolution: wider frames are downscaled (INTER_AREA, aspect
+    # ratio kept) before detection, and the overlay is drawn at that size.
+    # Corners and homographies are rescaled to camera pixels, so poses and the
+    # crop geometry do not change. 0 = camera size
+    working_width: int = 0
+
     # How often to refresh crop/arena homography from markers 0-3 (seconds)
     crop_refresh_seconds: float = 600.0  # 10 minutes
 
@@ -72,10 +79,17 @@ class ArenaProcessor:
         * computes image->arena mapping
         * provides marker poses (x,y,theta) in arena coords
         * draws green boxes, red arrow, red hollow origin box
+
+    camera labels its vision_frames_total / vision_stage_seconds metrics.
     """
 
-    def __init__(self, cfg: ArenaConfig):
+    def __init__(self, cfg: ArenaConfig, camera: str = "main"):
         self.cfg = cfg
+        self._m_frames = counter("vision_frames_total", "Frames run through ArenaProcessor.process_bgr", camera=camera)
+        self._m_stage = {
+            stage: histogram("vision_stage_seconds", "ArenaProcessor time per frame by stage", camera=camera, stage=stage)
+            for stage in ("detect", "pose", "render", "encode")
+        }
 
         # IDs like 257/467/522/697 require DICT_4X4_1000 (0..999)
         self.detector = ArucoDetector(dict_name="DICT_4X4_1000")
@@ -83,10 +97,15 @@ class ArenaProcessor:
         self.latest_overlay_jpeg: Optional[bytes] = None
         self.latest_cropped_jpeg: Optional[bytes] = None
 
+        # Both map camera pixels, whatever the working resolution
         self._M_img_to_crop: Optional[np.ndarray] = None
         self._H_img_to_arena: Optional[np.ndarray] = None
         self._last_xform_update_monotonic: float = 0.0
 
+        # Reused cv2.resize destination for the working-resolution frame
+        self._work_buf: Optional[np.ndarray] = None
+        self._frame_size: Optional[Tuple[int, int]] = None
+
         # Latest detected IDs and latest computed poses
         self._seen_ids: set[int] = set()
         self._poses_arena: Dict[int, Tuple[float, float, float]] = {}
@@ -106,6 +125,11 @@ class ArenaProcessor:
 
     # -------------------- Public accessors --------------------
 
+    @property
+    def frame_size(self) -> Optional[Tuple[int, int]]:
+        """(width, height) of the last camera frame, before any downscale."""
+        return self._frame_size
+
     @property
     def seen_ids(self) -> set[int]:
         return set(self._seen_ids)
@@ -498,40 +522,86 @@ class ArenaProcessor:
         else:
             web_info("Seen markers: " + ", ".join(str(i) for i in ids))
 
+    # -------------------- Working resolution --------------------
+
+    def _working_size(self, frame_w: int, frame_h: int) -> Tuple[int, int]:
+        """Frame size to process at: working_width wide with the camera's aspect ratio, never upscaled."""
+        w = int(self.cfg.working_width)
+        if w <= 0 or w >= frame_w:
+            return frame_w, frame_h
+        return w, max(1, int(round(frame_h * w / frame_w)))
+
+    def _to_working(self, frame_bgr: np.ndarray) -> np.ndarray:
+        fh, fw = frame_bgr.shape[:2]
+        w, h = self._working_size(fw, fh)
+        if (w, h) == (fw, fh):
+            return frame_bgr
+        shape = (h, w) + frame_bgr.shape[2:]
+        if self._work_buf is None or self._work_buf.shape != shape or self._work_buf.dtype != frame_bgr.dtype:
+            self._work_buf = np.empty(shape, dtype=frame_bgr.dtype)
+        cv2.resize(frame_bgr, (w, h), dst=self._work_buf, interpolation=cv2.INTER_AREA)
+        return self._work_buf
+
+    @staticmethod
+    def _scale_markers(markers: Dict[int, ArucoMarker], sx: float, sy: float) -> Dict[int, ArucoMarker]:
+        """Markers with corners multiplied by (sx, sy)."""
+        s = np.array([sx, sy], dtype=np.float32)
+        out: Dict[int, ArucoMarker] = {}
+        for mid, m in markers.items():
+            c = m.corners * s
+            out[mid] = ArucoMarker(marker_id=mid, corners=c, center=(m.center[0] * sx, m.center[1] * sy))
+        return out
+
     # -------------------- Main processing --------------------
 
     def process_bgr(self, frame_bgr: np.ndarray) -> None:
+        t0 = time.perf_counter()
+        # Detect, draw and warp on the working frame; transforms and poses use
+        # camera-pixel corners, so they hold if the working size changes
+        frame_h, frame_w = frame_bgr.shape[:2]
+        self._frame_size = (frame_w, frame_h)
+        frame_bgr = self._to_working(frame_bgr)
+        sx = frame_w / frame_bgr.shape[1]
+        sy = frame_h / frame_bgr.shape[0]
         markers = self.detector.detect(frame_bgr)
+        markers_cam = markers if sx == 1.0 and sy == 1.0 else self._scale_markers(markers, sx, sy)
         self._seen_ids = set(markers.keys())
+        t_detect = time.perf_counter()
 
         # Refresh transforms (stable)
-        self._maybe_refresh_transforms(markers)
+        self._maybe_refresh_transforms(markers_cam)
 
         # Update pose cache for all seen markers
         poses: Dict[int, Tuple[float, float, float]] = {}
-        for mid, m in markers.items():
+        for mid, m in markers_cam.items():
             poses[mid] = self._marker_pose_arena(m)
         self._poses_arena = poses
+        t_pose = time.perf_counter()
 
         # Full overlay
         overlay = frame_bgr.copy()
         self._draw_marker_boxes_arrows_origins(overlay, markers)
+        t_enc = time.perf_counter()
         overlay_jpg = self._encode_jpeg(overlay, self.cfg.overlay_jpeg_quality)
         if overlay_jpg is not None:
             self.latest_overlay_jpeg = overlay_jpg
+        encode_s = time.perf_counter() - t_enc
 
         # Cropped overlay (warp every call using cached M)
         if self._M_img_to_crop is None:
             self.latest_cropped_jpeg = None
         else:
+            # Working pixels -> camera pixels -> crop
+            M = self._M_img_to_crop
+            if sx != 1.0 or sy != 1.0:
+                M = M @ np.diag([sx, sy, 1.0])
             warped = cv2.warpPerspective(
                 frame_bgr,
-                self._M_img_to_crop,
+                M,
                 (self.cfg.output_width, self.cfg.output_height),
             )
 
             # Draw overlays in cropped space by transforming points
-            M = self._M_img_to_crop
 
             for mid, m in markers.items():
                 pts = m.corners.reshape(-1, 1, 2).astype(np.float32)
@@ -562,9 +632,18 @@ class ArenaProcessor:
 
             self._draw_mission_overlay_on_crop(warped)
 
+            t_enc = time.perf_counter()
             cropped_jpg = self._encode_jpeg(warped, self.cfg.crop_jpeg_quality)
             if cropped_jpg is not None:
                 self.latest_cropped_jpeg = cropped_jpg
+            encode_s += time.perf_counter() - t_enc
+
+        t_end = time.perf_counter()
+        self._m_frames.inc()
+        self._m_stage["detect"].observe(t_detect - t0)
+        self._m_stage["pose"].observe(t_pose - t_detect)
+        self._m_stage["render"].observe(t_end - t_pose - encode_s)
+        self._m_stage["encode"].observe(encode_s)
 
         # 60-second system printout of seen markers
         self._maybe_print_seen_markers()
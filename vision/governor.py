@@ -0,0 +1,231 @@
+"""
+Adaptive frame rate and working resolution for one camera's vision loop.
+
+    governor = FrameRateGovernor(GovernorConfig(), processor, camera="main",
+                                 pose_subscribers=lambda: wifi_server.pose_subscribers("main"))
+    while ...:
+        process one frame, taking cost_s
+        governor.observe(cost_s)
+        sleep until 1 / governor.target_fps has passed, at least MIN_LOOP_SLEEP_S
+
+The governor keeps an EWMA of the processing cost per frame and picks:
+
+  - the frame rate: max_fps while robots are asking for poses (an "aruco"
+    request within subscriber_window_s), idle_fps otherwise, capped at what
+    cpu_budget (share of one core) affords at the measured cost;
+  - the mode, one of working_widths (ArenaConfig.working_width, best
+    first): it steps to a smaller width when the budget cannot reach the
+    wanted rate, or when robots are listening and frame period + cost exceeds
+    pose_latency_slo_ms, and back up once the cost at the larger width (as
+    last measured there, else scaled by pixel count) fits with room to
+    spare. A measured cost is trusted for cost_ttl_s; after that the larger
+    mode is tried again, so one slow stretch does not keep the governor in a
+    smaller mode for good. Modes are held for at least mode_hold_s.
+
+State is exported as vision_governor_* gauges labelled by camera; the mode is
+vision_governor_mode{camera, mode} = 1 for the current mode and 0 for the rest.
+"""
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils.logging import get_logger
+from utils.metrics import counter, gauge
+
+# A larger mode is only tried when its predicted cost leaves this much headroom
+_STEP_UP_MARGIN = 1.25
+
+# Vision loops sleep at least this long per frame, even when processing overran
+# the frame period, so they never spin on the event loop
+MIN_LOOP_SLEEP_S = 0.005
+
+
+@dataclass
+class GovernorConfig:
+    enabled: bool = False  # opt-in: the fixed-rate loop stays the default
+    min_fps: float = 5.0
+    max_fps: float = 30.0
+    idle_fps: float = 10.0  # when no robot is asking for poses
+    cpu_budget: float = 0.8  # share of one core the loop may spend processing
+    pose_latency_slo_ms: float = 100.0  # frame period + processing time, while robots listen
+    working_widths: Tuple[int, ...] = (0, 960, 640)  # modes, best first; 0 = camera size
+    subscriber_window_s: float = 2.0
+    mode_hold_s: float = 5.0
+    cost_alpha: float = 0.2  # EWMA weight of the newest frame
+    cost_ttl_s: float = 60.0  # a mode's measured cost is trusted this long, then the mode is retried
+
+
+def mode_name(width: int) -> str:
+    return "full" if width <= 0 else f"w{int(width)}"
+
+
+def export_state(camera: str, state: Dict[str, Any], widths: Tuple[int, ...]) -> None:
+    """Sets the vision_governor_* gauges from a FrameRateGovernor.state() snapshot."""
+    gauge("vision_governor_target_fps", "Frame rate the governor currently aims for", camera=camera).set(
+        state["target_fps"]
+    )
+    gauge("vision_governor_cost_ms", "EWMA of processing time per frame", camera=camera).set(state["cost_ms"])
+    gauge("vision_governor_working_width", "Width frames are processed at", camera=camera).set(state["working_width"])
+    gauge("vision_governor_pose_subscribers", "Robots that asked for poses recently", camera=camera).set(
+        state["pose_subscribers"]
+    )
+    for w in widths:
+        name = mode_name(w)
+        gauge("vision_governor_mode", "1 for the governor's current mode", camera=camera, mode=name).set(
+            1.0 if name == state["mode"] else 0.0
+        )
+
+
+class FrameRateGovernor:
+    def __init__(
+        self,
+        cfg: GovernorConfig,
+        processor,
+        camera: str,
+        pose_subscribers: Optional[Callable[[], int]] = None,
+    ):
+        self.cfg = cfg
+        self.processor = processor
+        self.camera = camera
+        self.pose_subscribers = pose_subscribers or (lambda: 0)
+        self.logger = get_logger("Governor")
+
+        self.widths: Tuple[int, ...] = tuple(int(w) for w in cfg.working_widths) or (0,)
+        # ArenaConfig.working_width from the camera config caps every mode
+        self._base_width = int(processor.cfg.working_width)
+        self.mode = 0
+        self.cost_s: Optional[float] = None
+        # Last cost measured in each mode and when; JPEG decode does not shrink with the width
+        self._mode_cost: Dict[int, Tuple[float, float]] = {}
+        self.subscribers = 0
+        self.target_fps = float(cfg.idle_fps)
+        self._last_switch = time.monotonic()
+        self._m_switches = counter("vision_governor_mode_changes_total", "Governor mode changes", camera=camera)
+
+        self._apply_mode(0)
+        export_state(self.camera, self.state(), self.widths)
+
+    # -------------------- Modes --------------------
+
+    def _frame_width(self) -> int:
+        size = getattr(self.processor, "frame_size", None)
+        return int(size[0]) if size else 0
+
+    def _mode_width(self, mode: int) -> int:
+        """ArenaConfig.working_width for mode."""
+        w = self.widths[mode]
+        if self._base_width > 0:
+            return self._base_width if w <= 0 else min(w, self._base_width)
+        return w
+
+    def _effective_width(self, mode: int) -> int:
+        """Pixels wide frames are processed at in mode (camera width if unknown or not smaller)."""
+        fw = self._frame_width()
+        w = self._mode_width(mode)
+        if fw <= 0:
+            return w
+        return fw if w <= 0 or w >= fw else w
+
+    def _pixel_ratio(self, to_mode: int, from_mode: int) -> float:
+        a, b = self._effective_width(to_mode), self._effective_width(from_mode)
+        if a <= 0 or b <= 0:
+            return 1.0
+        return (a / b) ** 2
+
+    def _apply_mode(self, mode: int) -> None:
+        self.mode = mode
+        self.processor.cfg.working_width = self._mode_width(mode)
+
+    def _predicted_cost(self, mode: int) -> float:
+        if mode in self._mode_cost:
+            return self._mode_cost[mode][0]
+        # Never measured: assume cost scales with pixel count
+        return self.cost_s * self._pixel_ratio(mode, self.mode)
+
+    def _stale(self, mode: int, now: float) -> bool:
+        """Whether mode's measured cost is too old to keep the governor out of it."""
+        return mode in self._mode_cost and now - self._mode_cost[mode][1] >= float(self.cfg.cost_ttl_s)
+
+    def _switch(self, mode: int, reason: str, now: float) -> None:
+        if self.cost_s is not None:
+            self._mode_cost[self.mode] = (self.cost_s, now)
+            self.cost_s = self._predicted_cost(mode)
+        old = mode_name(self.widths[self.mode])
+        self._apply_mode(mode)
+        self._last_switch = now
+        self._m_switches.inc()
+        self.logger.info(f"[{self.camera}] {old} -> {mode_name(self.widths[mode])} ({reason})")
+
+    def _next_smaller(self) -> Optional[int]:
+        cur = self._effective_width(self.mode)
+        for m in range(self.mode + 1, len(self.widths)):
+            if self._effective_width(m) < cur:
+                return m
+        return None
+
+    def _next_larger(self) -> Optional[int]:
+        cur = self._effective_width(self.mode)
+        for m in range(self.mode - 1, -1, -1):
+            if self._effective_width(m) > cur:
+                return m
+        return None
+
+    # -------------------- Rate --------------------
+
+    def _rate_for(self, cost_s: float, wanted: float) -> float:
+        affordable = float(self.cfg.cpu_budget) / cost_s if cost_s > 0 else wanted
+        return max(float(self.cfg.min_fps), min(wanted, affordable, float(self.cfg.max_fps)))
+
+    def _fits(self, cost_s: float, wanted: float, active: bool) -> bool:
+        """Whether cost_s per frame reaches the wanted rate within the CPU budget and latency SLO."""
+        if cost_s * wanted > float(self.cfg.cpu_budget):
+            return False
+        if active:
+            fps = self._rate_for(cost_s, wanted)
+            if (1.0 / fps + cost_s) * 1000.0 > float(self.cfg.pose_latency_slo_ms):
+                return False
+        return True
+
+    def observe(self, cost_s: float) -> None:
+        """Records one processed frame's cost and updates target_fps and the mode."""
+        if self.cost_s is None:
+            self.cost_s = float(cost_s)
+        else:
+            a = float(self.cfg.cost_alpha)
+            self.cost_s = a * float(cost_s) + (1.0 - a) * self.cost_s
+        self.update()
+
+    def update(self) -> None:
+        try:
+            self.subscribers = int(self.pose_subscribers())
+        except Exception:
+            self.subscribers = 0
+        active = self.subscribers > 0
+        wanted = float(self.cfg.max_fps) if active else float(self.cfg.idle_fps)
+
+        if self.cost_s is not None:
+            now = time.monotonic()
+            if now - self._last_switch >= float(self.cfg.mode_hold_s):
+                smaller = self._next_smaller()
+                larger = self._next_larger()
+                if not self._fits(self.cost_s, wanted, active) and smaller is not None:
+                    self._switch(smaller, "over budget" if self.cost_s * wanted > self.cfg.cpu_budget else "over SLO", now)
+                elif larger is not None and self._fits(self._predicted_cost(larger) * _STEP_UP_MARGIN, wanted, active):
+                    self._switch(larger, "headroom", now)
+                elif larger is not None and self._stale(larger, now):
+                    # The load that made it slow may be gone; if not, this re-measures it
+                    self._switch(larger, "retry", now)
+            self.target_fps = self._rate_for(self.cost_s, wanted)
+        else:
+            self.target_fps = max(float(self.cfg.min_fps), min(wanted, float(self.cfg.max_fps)))
+
+        export_state(self.camera, self.state(), self.widths)
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "mode": mode_name(self.widths[self.mode]),
+            "working_width": float(self._effective_width(self.mode)),
+            "target_fps": float(self.target_fps),
+            "cost_ms": float(self.cost_s * 1000.0) if self.cost_s is not None else 0.0,
+            "pose_subscribers": float(self.subscribers),
+        }
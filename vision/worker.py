@@ -0,0 +1,466 @@
+"""
+Runs the camera and ArenaProcessor in a separate process, so vision work
+gets its own interpreter (and GIL) and the main process only serves HTTP
+and WebSocket traffic.
+
+The worker publishes through shared-memory rings (utils/shm_ring.py):
+
+    raw       camera JPEGs, as they arrive
+    overlay   ArenaProcessor.latest_overlay_jpeg after each processed frame
+    crop      latest_cropped_jpeg (empty while there is no arena transform)
+    poses     JSON snapshot {"seen": [...], "poses": {id: [x, y, theta]}}
+
+and the main process reads them through SharedArenaCam / SharedArenaProcessor,
+which stand in for the ArenaCam and ArenaProcessor that WebPage, WifiServer
+and VisionSession use in the single-process setup.
+
+The detector decodes raw frames straight out of their shared-memory slot;
+each consumer of the raw ring ("detector" here, "web" in the main process)
+has a RingReader, and VisionWorker exports their lag and dropped-frame
+counts as ring_reader_* gauges.
+
+With VisionWorkerConfig.governor set, a FrameRateGovernor paces the worker's
+loop. The main process feeds it the pose subscriber count through a shared
+value and re-exports the state it publishes with each pose snapshot as the
+vision_governor_* gauges.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from communications.arenacam import ArenaCamConfig, create_arenacam
+from utils.executors import process_context, run_blocking
+from utils.logging import get_logger, web_error, web_info
+from utils.metrics import gauge
+from utils.shm_ring import RingReader, ShmRing
+from vision.arena import ArenaConfig, ArenaProcessor
+from vision.governor import MIN_LOOP_SLEEP_S, FrameRateGovernor, GovernorConfig, export_state
+
+IMAGE_CHANNELS = ("raw", "overlay", "crop")
+POSES_CHANNEL = "poses"
+
+
+@dataclass
+class VisionWorkerConfig:
+    slots: int = 4
+    slot_bytes: int = 2 << 20  # per image slot; 720p JPEGs are a few hundred KiB
+    pose_slot_bytes: int = 64 << 10
+    target_fps: float = 30.0  # when there is no governor
+    governor: Optional[GovernorConfig] = None
+    start_timeout_s: float = 30.0
+    # A worker that dies is started again after this, doubling up to restart_max_delay_s
+    restart_delay_s: float = 1.0
+    restart_max_delay_s: float = 30.0
+
+
+# -------------------- Worker process --------------------
+
+
+def _publish_results(
+    processor: ArenaProcessor, rings: Dict[str, ShmRing], ts: float, governor: Optional[FrameRateGovernor] = None
+) -> None:
+    if processor.latest_overlay_jpeg is not None:
+        rings["overlay"].write(processor.latest_overlay_jpeg, ts)
+    rings["crop"].write(processor.latest_cropped_jpeg or b"", ts)
+    snapshot = {
+        "seen": sorted(processor.seen_ids),
+        "poses": {str(mid): list(pose) for mid, pose in processor.poses_arena.items()},
+    }
+    if governor is not None:
+        snapshot["governor"] = governor.state()
+    rings[POSES_CHANNEL].write(json.dumps(snapshot).encode("utf-8"), ts)
+
+
+def _process_and_publish(
+    processor: ArenaProcessor,
+    rings: Dict[str, ShmRing],
+    detector: RingReader,
+    governor: Optional[FrameRateGovernor] = None,
+) -> None:
+    """Decodes the newest raw frame in place (no copy out of the ring) and processes it."""
+    with detector.borrow() as frame:
+        if frame is None:
+            return
+        bgr = cv2.imdecode(np.frombuffer(frame.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        ts = frame.ts
+    if bgr is None or detector.last_torn:
+        return  # the camera lapped the ring mid-decode; the next frame is already there
+    processor.process_bgr(bgr)
+    _publish_results(processor, rings, ts, governor)
+
+
+def _serve_commands(conn, processor: ArenaProcessor, logger) -> None:
+    """Answers the main process's requests (currently only mission overlay randomization)."""
+    while True:
+        try:
+            cmd = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            if cmd == "randomize":
+                conn.send(("ok", processor.randomize_mission_overlay()))
+            else:
+                conn.send(("error", f"unknown command {cmd!r}"))
+        except Exception as e:
+            logger.error(f"Vision worker command {cmd!r} failed: {e}")
+            try:
+                conn.send(("error", str(e)))
+            except Exception:
+                return
+
+
+async def _worker(
+    cam_cfg: ArenaCamConfig, arena_cfg: ArenaConfig, cfg: VisionWorkerConfig, camera, names, conn, stop_evt, subscribers
+):
+    logger = get_logger("VisionWorker")
+    rings = {ch: ShmRing.attach(name) for ch, name in names.items()}
+    arenacam = None
+    try:
+        arenacam = create_arenacam(cam_cfg)
+        arenacam.add_frame_listener(lambda jpeg, ts: rings["raw"].write(jpeg, ts))
+        await arenacam.start()
+        processor = ArenaProcessor(arena_cfg, camera=camera)
+    except Exception as e:
+        conn.send(("error", str(e)))
+        for ring in rings.values():
+            ring.close()
+        return
+
+    threading.Thread(target=_serve_commands, args=(conn, processor, logger), name="vision-cmd", daemon=True).start()
+    conn.send(("ready", os.getpid()))
+
+    detector = RingReader(rings["raw"], "detector", label="raw")
+    governor = None
+    if cfg.governor is not None and cfg.governor.enabled:
+        governor = FrameRateGovernor(cfg.governor, processor, camera, pose_subscribers=lambda: subscribers.value)
+    frame_period = 1.0 / max(1.0, float(cfg.target_fps))
+    try:
+        while not stop_evt.is_set():
+            start = time.perf_counter()
+            # Unlike the in-process loop, an unchanged frame is not processed again
+            if rings["raw"].head_seq > detector.cursor:
+                await run_blocking("vision", _process_and_publish, processor, rings, detector, governor)
+                if governor is not None:
+                    governor.observe(time.perf_counter() - start)
+            if governor is not None:
+                frame_period = 1.0 / max(1.0, governor.target_fps)
+            await asyncio.sleep(max(MIN_LOOP_SLEEP_S, frame_period - (time.perf_counter() - start)))
+    finally:
+        try:
+            await asyncio.wait_for(arenacam.stop(), timeout=2.5)
+        except Exception:
+            pass
+        for ring in rings.values():
+            ring.close()
+
+
+def _worker_main(cam_cfg, arena_cfg, cfg, camera, names, conn, stop_evt, subscribers) -> None:
+    try:
+        asyncio.run(_worker(cam_cfg, arena_cfg, cfg, camera, names, conn, stop_evt, subscribers))
+    except KeyboardInterrupt:
+        pass
+
+
+# -------------------- Main-process side --------------------
+
+
+class SharedArenaCam:
+    """
+    latest_frame / latest_frame_ts of the worker's camera, read from the raw
+    ring. Each new frame is copied out once and shared by every viewer.
+    """
+
+    def __init__(self, ring: ShmRing):
+        self._reader = RingReader(ring, "web", label="raw")
+        self._latest: Optional[Tuple[int, float, bytes]] = None
+
+    def _refresh(self) -> None:
+        msg = self._reader.poll()
+        if msg is not None:
+            self._latest = msg
+
+    @property
+    def latest_frame(self) -> Optional[bytes]:
+        self._refresh()
+        return self._latest[2] if self._latest is not None else None
+
+    @property
+    def latest_frame_ts(self) -> Optional[float]:
+        self._refresh()
+        return self._latest[1] if self._latest is not None else None
+
+    async def start(self) -> None:
+        pass  # the worker owns the camera
+
+    async def stop(self) -> None:
+        pass
+
+
+class SharedArenaProcessor:
+    """The parts of ArenaProcessor that the web page and WifiServer read, backed by the worker's rings."""
+
+    def __init__(self, rings: Dict[str, ShmRing], conn, conn_lock: threading.Lock):
+        self._rings = rings
+        self._conn = conn
+        self._conn_lock = conn_lock
+        self._poses_seq = 0
+        self._seen: set = set()
+        self._poses: Dict[int, Tuple[float, float, float]] = {}
+        self._governor_state: Optional[Dict[str, Any]] = None
+
+    @property
+    def latest_overlay_jpeg(self) -> Optional[bytes]:
+        msg = self._rings["overlay"].latest()
+        return msg[2] if msg is not None else None
+
+    @property
+    def latest_cropped_jpeg(self) -> Optional[bytes]:
+        msg = self._rings["crop"].latest()
+        return msg[2] if msg is not None and msg[2] else None
+
+    def _refresh_poses(self) -> None:
+        msg = self._rings[POSES_CHANNEL].latest()
+        if msg is None or msg[0] == self._poses_seq:
+            return
+        snapshot = json.loads(msg[2])
+        self._seen = {int(mid) for mid in snapshot.get("seen", [])}
+        self._poses = {int(mid): (float(p[0]), float(p[1]), float(p[2])) for mid, p in snapshot.get("poses", {}).items()}
+        self._governor_state = snapshot.get("governor")
+        self._poses_seq = msg[0]
+
+    @property
+    def governor_state(self) -> Optional[Dict[str, Any]]:
+        """The worker's FrameRateGovernor.state() as of the last pose snapshot."""
+        self._refresh_poses()
+        return self._governor_state
+
+    @property
+    def seen_ids(self) -> set:
+        self._refresh_poses()
+        return set(self._seen)
+
+    @property
+    def poses_arena(self) -> Dict[int, Tuple[float, float, float]]:
+        self._refresh_poses()
+        return dict(self._poses)
+
+    def randomize_mission_overlay(self) -> dict:
+        """Blocks for up to 2 s on the worker's answer; call it off the event loop."""
+        with self._conn_lock:
+            # A reply that arrived after an earlier call gave up is not ours
+            while self._conn.poll():
+                self._conn.recv()
+            self._conn.send("randomize")
+            if not self._conn.poll(2.0):
+                raise RuntimeError("Vision worker did not answer")
+            status, result = self._conn.recv()
+        if status != "ok":
+            raise RuntimeError(str(result))
+        return result
+
+
+class VisionWorker:
+    """
+    Owns the vision worker process and its rings.
+
+        worker = VisionWorker(cam_cfg, arena_cfg)
+        await worker.start()
+        worker.camera, worker.processor    # drop-in for arenacam / ArenaProcessor
+        await worker.stop()
+
+    pose_subscribers, if set, is polled every second for the governor. A
+    worker process that dies is started again on the same rings; camera and
+    processor stay valid across restarts.
+    """
+
+    def __init__(
+        self,
+        cam_cfg: ArenaCamConfig,
+        arena_cfg: ArenaConfig,
+        cfg: Optional[VisionWorkerConfig] = None,
+        camera: str = "main",
+    ):
+        self.cam_cfg = cam_cfg
+        self.arena_cfg = arena_cfg
+        self.cfg = cfg or VisionWorkerConfig()
+        self.camera_name = camera
+        self.logger = get_logger("VisionWorker")
+        self.pose_subscribers: Optional[Callable[[], int]] = None
+
+        self._rings: Dict[str, ShmRing] = {}
+        self._proc: Optional[Any] = None
+        self._conn = None
+        self._stop_evt = None
+        self._subscribers = None
+        self._watch_task: Optional[asyncio.Task] = None
+
+        self.camera: Optional[SharedArenaCam] = None
+        self.processor: Optional[SharedArenaProcessor] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._proc.pid if self._proc is not None else None
+
+    async def start(self) -> None:
+        prefix = f"vmv-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        for ch in IMAGE_CHANNELS:
+            self._rings[ch] = ShmRing.create(f"{prefix}-{ch}", self.cfg.slots, self.cfg.slot_bytes)
+        self._rings[POSES_CHANNEL] = ShmRing.create(f"{prefix}-{POSES_CHANNEL}", self.cfg.slots, self.cfg.pose_slot_bytes)
+
+        ctx = process_context()
+        self._stop_evt = ctx.Event()
+        self._subscribers = ctx.Value("i", 0, lock=False)
+        try:
+            pid = await self._spawn()
+        except BaseException:
+            await self.stop()
+            raise
+
+        self.camera = SharedArenaCam(self._rings["raw"])
+        self.processor = SharedArenaProcessor(self._rings, self._conn, threading.Lock())
+        self._watch_task = asyncio.create_task(self._watch())
+        self.logger.info(f"Vision worker running (pid {pid})")
+
+    async def _spawn(self) -> int:
+        """Starts the worker process on the existing rings and waits until it is ready; returns its pid."""
+        names = {ch: ring.name for ch, ring in self._rings.items()}
+        ctx = process_context()
+        parent, child = ctx.Pipe()
+        self._conn = parent
+        self._proc = ctx.Process(
+            target=_worker_main,
+            args=(
+                self.cam_cfg,
+                self.arena_cfg,
+                self.cfg,
+                self.camera_name,
+                names,
+                child,
+                self._stop_evt,
+                self._subscribers,
+            ),
+            name="vision-worker",
+            daemon=True,
+        )
+        self._proc.start()
+        child.close()
+
+        try:
+            if not await run_blocking("io", parent.poll, float(self.cfg.start_timeout_s)):
+                raise RuntimeError("Vision worker did not start in time")
+            status, detail = parent.recv()
+        except EOFError:
+            status, detail = "error", f"exited with code {self._proc.exitcode}"
+        if status != "ready":
+            raise RuntimeError(f"Vision worker failed to start: {detail}")
+        return int(detail)
+
+    def ring_stats(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """channel -> reader -> cursor, lag and dropped-frame counts, for both processes' readers."""
+        return {ch: ring.reader_stats() for ch, ring in self._rings.items()}
+
+    def _export_ring_stats(self) -> None:
+        for ch, readers in self.ring_stats().items():
+            for reader, st in readers.items():
+                gauge("ring_reader_lag_frames", "Frames published but not yet read", ring=ch, reader=reader).set(st["lag"])
+                gauge(
+                    "ring_reader_overwritten_frames", "Frames overwritten before the reader got to them", ring=ch, reader=reader
+                ).set(st["overwritten"])
+                gauge("ring_reader_skipped_frames", "Frames passed over to read a newer one", ring=ch, reader=reader).set(
+                    st["skipped"]
+                )
+
+    def _sync_governor(self) -> None:
+        if self.cfg.governor is None or not self.cfg.governor.enabled:
+            return
+        if self.pose_subscribers is not None and self._subscribers is not None:
+            try:
+                self._subscribers.value = int(self.pose_subscribers())
+            except Exception:
+                pass
+        state = self.processor.governor_state if self.processor is not None else None
+        if state is not None:
+            export_state(self.camera_name, state, tuple(self.cfg.governor.working_widths))
+
+    async def _reap(self) -> None:
+        """Joins the dead worker process (killing it if it hangs) and closes its pipe."""
+        proc, conn = self._proc, self._conn
+        self._proc = None
+        if proc is not None:
+            if proc.is_alive():
+                proc.kill()
+            await run_blocking("io", proc.join, 1.0)
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    async def _restart(self) -> None:
+        delay = float(self.cfg.restart_delay_s)
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                pid = await self._spawn()
+            except Exception as e:
+                self.logger.error(f"Vision worker restart failed: {e}")
+                await self._reap()
+                delay = min(delay * 2.0, float(self.cfg.restart_max_delay_s))
+                continue
+            # The processor keeps its lock; only the pipe behind it changes
+            with self.processor._conn_lock:
+                self.processor._conn = self._conn
+            self.logger.info(f"Vision worker restarted (pid {pid})")
+            web_info(f"Vision worker restarted (pid {pid})")
+            return
+
+    async def _watch(self) -> None:
+        try:
+            while True:
+                while self._proc is not None and self._proc.is_alive():
+                    self._export_ring_stats()
+                    self._sync_governor()
+                    await asyncio.sleep(1.0)
+                code = self._proc.exitcode if self._proc is not None else None
+                self.logger.error(f"Vision worker exited unexpectedly (code {code}); restarting")
+                web_error(f"Vision worker exited unexpectedly (code {code}); restarting")
+                await self._reap()
+                await self._restart()
+        except asyncio.CancelledError:
+            return
+
+    async def stop(self) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+
+        if self._stop_evt is not None:
+            self._stop_evt.set()
+        if self._proc is not None:
+            proc = self._proc
+            await run_blocking("io", proc.join, 4.0)
+            if proc.is_alive():
+                proc.kill()
+                await run_blocking("io", proc.join, 1.0)
+            self._proc = None
+
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+        self.camera = None
+        self.processor = None
+        for ring in self._rings.values():
+            ring.close()
+        self._rings = {}